@@ -1,4 +1,5 @@
 type Argument = {
+  id?: string;
   _type: string;
   statement: string;
   connection_to_hypothesis: string;
@@ -16,6 +17,12 @@ type Argument = {
   };
 };
 
+type UnmatchedFinding = {
+  technique: string;
+  argument_text: string;
+  manipulations: Manipulation[];
+};
+
 type Manipulation = {
   instance: string;
   explanation: string;
@@ -43,4 +50,7 @@ export type ApiArticlesProcessResponseDto = {
   thesis: string;
   arguments: Argument[];
   score: ScoreDetails;
+  not_evaluated_techniques?: string[];
+  unmatched_findings?: UnmatchedFinding[];
+  models?: Record<string, string>;
 };
@@ -0,0 +1,187 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+from logger import get_logger
+
+log = get_logger()
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted, carries the HTTP status and Retry-After hint."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bound the number of analyses running at once. Requests over the limit wait in a
+    priority queue (lower value is served first, FIFO within a priority) for at most
+    max_queue_time seconds. When the queue is full, requests are rejected right away
+    instead of slowing everybody down.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 32,
+        max_queue_time: float = 30.0,
+        max_queued_per_client: Optional[int] = None,
+        client_priorities: Optional[Dict[str, int]] = None,
+        default_priority: int = 10
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+        self.max_queued_per_client = max_queued_per_client
+        self.client_priorities = client_priorities or {}
+        self.default_priority = default_priority
+
+        self.active = 0
+        self._queue = []
+        self._queued_per_client = defaultdict(int)
+        self._sequence = itertools.count()
+        self._wait_times = deque(maxlen=200)
+        self._service_times = deque(maxlen=200)
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionController':
+        """
+        Build the controller from ADMISSION_* environment variables. ADMISSION_CLIENT_PRIORITIES
+        is a comma separated list of client_id:priority pairs.
+        """
+        client_priorities = {}
+        for pair in os.getenv('ADMISSION_CLIENT_PRIORITIES', '').split(','):
+            if ':' in pair:
+                client_id, priority = pair.rsplit(':', 1)
+                client_priorities[client_id.strip()] = int(priority)
+        per_client = int(os.getenv('ADMISSION_MAX_QUEUED_PER_CLIENT', '0'))
+        return cls(
+            max_concurrency=int(os.getenv('ADMISSION_MAX_CONCURRENCY', '4')),
+            max_queue=int(os.getenv('ADMISSION_MAX_QUEUE', '32')),
+            max_queue_time=float(os.getenv('ADMISSION_MAX_QUEUE_TIME', '30')),
+            max_queued_per_client=per_client or None,
+            client_priorities=client_priorities,
+            default_priority=int(os.getenv('ADMISSION_DEFAULT_PRIORITY', '10'))
+        )
+
+    def priority_for(self, client_id: Optional[str]) -> int:
+        return self.client_priorities.get(client_id, self.default_priority)
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def average_wait(self) -> float:
+        """Average seconds the recent requests waited for a slot."""
+        wait_times = list(self._wait_times)
+        return round(sum(wait_times) / len(wait_times), 3) if wait_times else 0.0
+
+    def retry_after(self) -> int:
+        """Rough number of seconds until a slot frees up for a new request."""
+        if not self._service_times:
+            return 1
+        average_service_time = sum(self._service_times) / len(self._service_times)
+        backlog = (self.queue_depth() + 1) / self.max_concurrency
+        return max(1, int(average_service_time * backlog))
+
+    async def acquire(self, client_id: Optional[str] = None) -> float:
+        """Wait for an analysis slot, returns the time it was acquired."""
+        if self.active < self.max_concurrency and not self.queue_depth():
+            return self._admit(0.0)
+
+        if self.queue_depth() >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected('Analysis queue is full', 503, self.retry_after())
+        if self.max_queued_per_client and self._queued_per_client[client_id] >= self.max_queued_per_client:
+            self.rejected += 1
+            raise AdmissionRejected('Too many queued analyses for this client', 429, self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (self.priority_for(client_id), next(self._sequence), client_id, waiter))
+        self._queued_per_client[client_id] += 1
+        enqueued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_queue_time)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self.timed_out += 1
+            self._wait_times.append(time.monotonic() - enqueued_at)
+            raise AdmissionRejected('Timed out waiting in the analysis queue', 503, self.retry_after())
+        except asyncio.CancelledError:
+            # The slot may have been handed over right before the cancellation, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)
+            else:
+                self._discard(waiter)
+            raise
+        finally:
+            self._queued_per_client[client_id] -= 1
+            if not self._queued_per_client[client_id]:
+                del self._queued_per_client[client_id]
+        return self._admit(time.monotonic() - enqueued_at, transferred=True)
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        self._queue = [entry for entry in self._queue if entry[3] is not waiter]
+        heapq.heapify(self._queue)
+
+    def _admit(self, waited: float, transferred: bool = False) -> float:
+        if not transferred:
+            self.active += 1
+        self.admitted += 1
+        self._wait_times.append(waited)
+        return time.monotonic()
+
+    def release(self, acquired_at: Optional[float]) -> None:
+        """Give the slot back, handing it directly to the next queued request if any."""
+        if acquired_at is not None:
+            self._service_times.append(time.monotonic() - acquired_at)
+        while self._queue:
+            _, _, _, waiter = heapq.heappop(self._queue)
+            # Skip waiters that are already being cancelled or timed out
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def releaser(self, acquired_at: Optional[float]) -> Callable[[], None]:
+        """Release of the slot that only gives it back once, however many paths call it."""
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.release(acquired_at)
+        return release
+
+    @asynccontextmanager
+    async def admit(self, client_id: Optional[str] = None):
+        acquired_at = await self.acquire(client_id)
+        try:
+            yield
+        finally:
+            self.release(acquired_at)
+
+    def stats(self) -> dict:
+        wait_times = list(self._wait_times)
+        return {
+            'active': self.active,
+            'queue_depth': self.queue_depth(),
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'average_wait_seconds': self.average_wait(),
+            'max_wait_seconds': round(max(wait_times), 3) if wait_times else 0.0,
+        }
@@ -0,0 +1,167 @@
+import re
+import difflib
+import unicodedata
+from typing import Any, List, Optional
+
+from logger import get_logger
+
+log = get_logger()
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+(?=\S)|\n+')
+WORD = re.compile(r'\w+', re.UNICODE)
+PUNCTUATION = re.compile(r'[^\w\s]', re.UNICODE)
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a text into sentences on terminal punctuation and line breaks."""
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def number_sentences(sentences: List[str]) -> str:
+    """Render sentences as `[id] sentence` lines so the model can reference them."""
+    return '\n'.join(f'[{i}] {sentence}' for i, sentence in enumerate(sentences))
+
+
+def tokenize(text: str) -> set:
+    """Lowercased word set, short words are dropped as a cheap language independent stop list."""
+    return {word for word in WORD.findall(text.lower()) if len(word) > 2}
+
+
+def overlap(fragment: str, statement: str) -> float:
+    """Share of the statement words that also appear in the fragment."""
+    statement_words = tokenize(statement)
+    if not statement_words:
+        return 0.0
+    return len(statement_words & tokenize(fragment)) / len(statement_words)
+
+
+def _anchor_sentence(statement: str, sentences: List[str]) -> Optional[int]:
+    """Index of the sentence the argument most likely comes from."""
+    scores = [overlap(sentence, statement) for sentence in sentences]
+    if not scores or max(scores) == 0:
+        return None
+    return scores.index(max(scores))
+
+
+def align_findings(
+    argument_analysis: dict,
+    span_result: dict,
+    sentences: List[str],
+    min_overlap: float = 0.3,
+    max_distance: int = 2
+) -> dict:
+    """
+    Reconcile findings detected on sentences with the arguments extracted separately.
+
+    A finding is attached to the argument whose statement overlaps most with the
+    finding's instance and sentence. When no statement overlaps enough, it falls back
+    to the argument anchored on the nearest sentence, within max_distance sentences.
+    Returns the same structure as a per-argument manipulation analysis, so it can be
+    merged by raw_data_to_api_format.
+    """
+    if 'error' in span_result:
+        return span_result
+
+    arguments = argument_analysis.get('arguments', []) if isinstance(argument_analysis, dict) else []
+    arguments = [argument for argument in arguments if isinstance(argument, dict)]
+    statements = [argument.get('statement', '') for argument in arguments]
+    ids = {argument.get('statement', ''): argument.get('id') for argument in arguments}
+    anchors = [_anchor_sentence(statement, sentences) for statement in statements]
+    per_argument = {statement: [] for statement in statements}
+    unmatched = []
+
+    findings = span_result.get('findings', [])
+    if not isinstance(findings, list):
+        findings = []
+
+    for finding in findings:
+        if not isinstance(finding, dict):
+            continue
+        sentence_id = finding.get('sentence_id')
+        has_sentence = isinstance(sentence_id, int) and 0 <= sentence_id < len(sentences)
+        fragment = finding.get('instance', '')
+        if has_sentence:
+            fragment = f"{fragment} {sentences[sentence_id]}"
+
+        target = None
+        scores = [overlap(fragment, statement) for statement in statements]
+        if scores and max(scores) >= min_overlap:
+            target = statements[scores.index(max(scores))]
+        elif has_sentence:
+            distances = [
+                (abs(anchor - sentence_id), statement)
+                for anchor, statement in zip(anchors, statements) if anchor is not None
+            ]
+            if distances and min(distances)[0] <= max_distance:
+                target = min(distances)[1]
+
+        manipulation = {
+            'instance': finding.get('instance', ''),
+            'explanation': finding.get('explanation', '')
+        }
+        if target is None:
+            unmatched.append(manipulation)
+        else:
+            per_argument[target].append(manipulation)
+
+    if unmatched:
+        log.debug('%d findings could not be aligned to an argument', len(unmatched))
+
+    return {
+        'arguments': [
+            {
+                'argument_id': ids[statement],
+                'argument_text': statement,
+                'contains_manipulation': bool(manipulations),
+                'manipulations': manipulations
+            }
+            for statement, manipulations in per_argument.items()
+        ],
+        'unmatched': unmatched
+    }
+
+
+def normalize_statement(statement: str) -> str:
+    """Lowercase, unicode normalized, punctuation free form of a statement used for matching."""
+    statement = unicodedata.normalize('NFKC', statement).lower()
+    return ' '.join(PUNCTUATION.sub(' ', statement).split())
+
+
+def assign_argument_ids(argument_analysis: dict) -> dict:
+    """Give each extracted argument a short stable id the technique prompts can refer to."""
+    arguments = argument_analysis.get('arguments') if isinstance(argument_analysis, dict) else None
+    if isinstance(arguments, list):
+        for i, argument in enumerate(arg for arg in arguments if isinstance(arg, dict)):
+            argument['id'] = f'A{i + 1}'
+    return argument_analysis
+
+
+class ArgumentIndex:
+    """
+    Lookup of processed arguments by id and by normalized statement, built once per
+    request. Statements the model slightly rewrote fall back to a fuzzy match.
+    """
+
+    def __init__(self, arguments: List[dict], fuzzy_cutoff: Optional[float] = 0.8):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.by_id = {}
+        self.by_statement = {}
+        for argument in arguments:
+            if argument.get('id'):
+                self.by_id[argument['id']] = argument
+            statement = normalize_statement(argument.get('statement', ''))
+            if statement:
+                self.by_statement.setdefault(statement, argument)
+
+    def find(self, argument_id: Any, argument_text: Any) -> Optional[dict]:
+        """The argument a raw finding refers to, an id or text that is not a string is ignored."""
+        if isinstance(argument_id, str) and argument_id in self.by_id:
+            return self.by_id[argument_id]
+        statement = normalize_statement(argument_text) if isinstance(argument_text, str) else ''
+        if statement in self.by_statement:
+            return self.by_statement[statement]
+        if self.fuzzy_cutoff and statement:
+            matches = difflib.get_close_matches(statement, self.by_statement.keys(), n=1, cutoff=self.fuzzy_cutoff)
+            if matches:
+                return self.by_statement[matches[0]]
+        return None
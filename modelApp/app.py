@@ -1,17 +1,46 @@
+import time
+# Startup is timed from here, before the imports below
+STARTED_AT = time.perf_counter()
+
 import os
 import json
+import random
+import logging
 import asyncio
+import hashlib
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
-from langchain_google_genai import ChatGoogleGenerativeAI
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from langchain_core.prompts import ChatPromptTemplate
 
 from logger import get_logger
 from score import get_score_details
+from cache import AnalysisCache, content_key, normalize_text, stage_key
+from simhash import NearDuplicateIndex, simhash
+from singleflight import SingleFlight
+from alignment import ArgumentIndex, align_findings, assign_argument_ids, number_sentences, split_sentences
+from deadline import Deadline, Hedger, gather_or_cancel
+from admission import AdmissionController, AdmissionRejected
+from ratelimit import ModelRateLimiter, RateLimiterRegistry, estimate_tokens
+from jobs import JobManager
+from chunking import merge_raw_analyses, split_into_chunks, split_paragraphs
+from documents import DocumentStore, plan_regions
+from prefilter import PreFilter
+from techniques import default_techniques, load_techniques, select_techniques
+from disconnect import ClientDisconnected, DisconnectWatcher, tracked_call
+from metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS
+from metrics import ANALYSES, JSON_REPAIRS, PARSE_FAILURES, REASKS, STAGE_SECONDS, TIMEOUTS, current_stage, record_usage, stage
+from metrics import render as render_metrics
+from tracing import setup_tracing, span
+from backends import create_chat_model, with_json_output
+from ingest import FetchError, URLFetcher
+from parsing import ARGUMENT_SCHEMA, SPANS_SCHEMA, TECHNIQUE_SCHEMA, parse_json, validate
+from prompting import PromptBuilder, TokenBudget, TokenBudgetExceeded, charge, token_budget, token_stats, within_budget
+from startup import Startup
 
 
 load_dotenv()
@@ -22,6 +51,19 @@ app = FastAPI()
 # Pydantic models for request/response
 class TextInput(BaseModel):
     text: str
+    # Stable identifier of the document (e.g. its URL), later versions are re-analyzed incrementally
+    document_id: Optional[str] = None
+    # Techniques to evaluate, the default techniques when not given
+    techniques: Optional[List[str]] = None
+
+class URLInput(BaseModel):
+    url: str
+    # Techniques to evaluate, the default techniques when not given
+    techniques: Optional[List[str]] = None
+
+class JobInput(BaseModel):
+    text: Optional[str] = None
+    texts: Optional[List[str]] = None
 
 class Manipulation(BaseModel):
     instance: str
@@ -33,18 +75,6 @@ class MetricsExplanation(BaseModel):
     average_techniques_per_argument: str
     max_techniques_in_single_argument: str
 
-class ArgumentManipulations(BaseModel):
-    ad_populum: List[Manipulation]
-    unspecified_authority_fallacy: List[Manipulation]
-    appeal_to_pride: List[Manipulation]
-    false_dilemma: List[Manipulation]
-    cherry_picking_data: List[Manipulation]
-    stork_fallacy: List[Manipulation]
-    fallacy_of_composition: List[Manipulation]
-    fallacy_of_division: List[Manipulation]
-    hasty_generalization: List[Manipulation]
-    texas_sharpshooter_fallacy: List[Manipulation]
-
 class ScoreDetails(BaseModel):
     overall_score: float | str
     manipulation_density: float | str
@@ -56,26 +86,133 @@ class ScoreDetails(BaseModel):
     metrics_explanation: MetricsExplanation
 
 class Argument(BaseModel):
+    id: str = ''
     _type: str
     statement: str
     connection_to_hypothesis: str
-    manipulations: ArgumentManipulations
+    # Manipulations per technique name, for the techniques of the request
+    manipulations: Dict[str, List[Manipulation]]
+
+class UnmatchedFinding(BaseModel):
+    technique: str
+    argument_text: str
+    manipulations: List[Manipulation]
 
 class AnalysisOutput(BaseModel):
     thesis: str
     arguments: List[Argument]
     score: ScoreDetails
+    not_evaluated_techniques: List[str] = []
+    unmatched_findings: List[UnmatchedFinding] = []
+    # Model that produced each stage: 'arguments' and one entry per technique
+    models: Dict[str, str] = {}
     
 
-class ArgumentAnalysisAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",
-            temperature=0,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2
-        )
+# Follow-up to a prompt whose response could not be used
+REASK_MESSAGES = [
+    ("ai", "{previous_response}"),
+    ("human", """Your answer could not be used: {problem}.
+Answer again with only the JSON object of the requested OUTPUT format, complete and without any other text."""),
+]
+
+
+class LLMAgent:
+    """Shared model client, outbound rate limiting and response parsing of the agents."""
+
+    model = "gemini-1.5-pro"
+
+    def __init__(self, rate_limiter: Optional[ModelRateLimiter] = None, model: Optional[str] = None):
+        self.model = model or self.model
+        # Built on first use, or by the warm-up of the service, so importing the app does not
+        # wait for the provider SDK
+        self._llm = None
+        self.rate_limiter = rate_limiter or ModelRateLimiter(self.model)
+        self.prompt = None
+        # Ask the provider for JSON only responses when it has a native JSON mode
+        self.json_mode = os.getenv('LLM_JSON_MODE', 'true').lower() in ('1', 'true', 'yes')
+        # Calls sent again, with the problem pointed out, when a response cannot be used
+        self.json_reasks = int(os.getenv('LLM_JSON_REASKS', '1'))
+
+    def build_client(self):
+        """The model client, built on the first call."""
+        if self._llm is None:
+            self._llm = create_chat_model(self.model)
+        return self._llm
+
+    @property
+    def llm(self):
+        return self.build_client()
+
+    @llm.setter
+    def llm(self, llm) -> None:
+        self._llm = llm
+
+    def prompts(self) -> List[ChatPromptTemplate]:
+        return [self.prompt]
+
+    def render_prompts(self) -> None:
+        """Format every prompt once with placeholder inputs, so the first request does not pay for it."""
+        for prompt in self.prompts():
+            prompt.format_messages(**{name: '' for name in prompt.input_variables})
+
+    async def warm_up_call(self) -> None:
+        """Send a minimal prompt to open the connection to the model provider."""
+        await self.rate_limiter.call(lambda: self.llm.ainvoke('Reply with OK.'), 4)
+
+    def fingerprint(self) -> str:
+        """Return the model and prompt templates, used to version cached results."""
+        return '\n'.join([self.model] + [message.prompt.template for prompt in self.prompts() for message in prompt.messages])
+
+    async def _invoke(self, prompt: ChatPromptTemplate, inputs: dict):
+        """Call the model through the outbound rate limiter."""
+        chain = prompt | (with_json_output(self.llm) if self.json_mode else self.llm)
+        tokens = estimate_tokens(prompt, inputs)
+        # Counted before sending, a prompt over the request's token budget is never sent
+        charge(tokens)
+        response = await tracked_call(self.rate_limiter.call(lambda: chain.ainvoke(inputs), tokens))
+        record_usage(getattr(response, 'usage_metadata', None))
+        return response
+
+    async def _invoke_json(self, prompt: ChatPromptTemplate, inputs: dict, schema: Any = dict) -> dict:
+        """
+        Call the model and parse its response against the expected schema. A response that
+        cannot be used is asked again, showing the model its answer and what is wrong with it.
+        Returns an error dict when no usable response came back, with the parsed value when
+        the response was JSON of another shape.
+        """
+        response = await self._invoke(prompt, inputs)
+        parsed = self._parse_response(response, schema)
+        for _ in range(self.json_reasks):
+            if 'error' not in parsed:
+                break
+            REASKS.inc(**current_stage())
+            reask_prompt = ChatPromptTemplate.from_messages(prompt.messages + REASK_MESSAGES)
+            response = await self._invoke(reask_prompt, {
+                **inputs, 'previous_response': response.content, 'problem': parsed['error']
+            })
+            parsed = self._parse_response(response, schema)
+        return parsed
+
+    def _parse_response(self, response, schema: Any = dict) -> dict:
+        labels = current_stage()
+        with STAGE_SECONDS.time(stage='parse', technique=labels['technique']):
+            try:
+                parsed, repaired = parse_json(response.content)
+            except ValueError as e:
+                PARSE_FAILURES.inc(**labels)
+                return {"error": f"Failed to parse JSON response: {str(e)}", "raw_response": response.content}
+            if repaired:
+                JSON_REPAIRS.inc(**labels)
+            problem = validate(parsed, schema)
+        if problem:
+            PARSE_FAILURES.inc(**labels)
+            return {"error": f"Unexpected JSON response: {problem}", "raw_response": response.content, "parsed": parsed}
+        return parsed
+
+
+class ArgumentAnalysisAgent(LLMAgent):
+    def __init__(self, rate_limiter: Optional[ModelRateLimiter] = None, model: Optional[str] = None):
+        super().__init__(rate_limiter, model)
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert argument analysis agent. Your task is to:
@@ -108,26 +245,11 @@ Please analyze the provided text and return the results in the following JSON st
 
     async def analyze(self, text: str) -> dict:
         """Run the argument analysis."""
-        chain = self.prompt | self.llm
-        response = await chain.ainvoke({"text": text})
-        
-        try:
-            json_str = response.content.strip()
-            if json_str.startswith("```json"):
-                json_str = json_str[7:-3]
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            return {"error": f"Failed to parse JSON response: {str(e)}", "raw_response": response.content}
-
-class ManipulationAnalysisAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",
-            temperature=0,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2
-        )
+        return assign_argument_ids(await self._invoke_json(self.prompt, {"text": text}, ARGUMENT_SCHEMA))
+
+class ManipulationAnalysisAgent(LLMAgent):
+    def __init__(self, rate_limiter: Optional[ModelRateLimiter] = None, model: Optional[str] = None):
+        super().__init__(rate_limiter, model)
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert in detecting manipulation and persuasion techniques in text. Your task is to:
@@ -170,6 +292,7 @@ class ManipulationAnalysisAgent:
                     "main_thesis": "<str>",
                     "arguments": [
                         {{ 
+                            "argument_id": "<str>", the id of the argument as received in the arguments
                             "argument_text": "<str>", exactly written as received in the arguments
                             "contains_manipulation": <true|false>,
                             "manipulations": [
@@ -183,308 +306,1258 @@ class ManipulationAnalysisAgent:
                 }}""")
         ])
 
+        # Same task as above, but for several techniques in a single call so the
+        # text and arguments are only sent once for the whole group
+        self.group_prompt = ChatPromptTemplate.from_messages([
+            self.prompt.messages[0],
+            ("human", """### 
+             
+                ### TASK
+                Evaluate each of the following manipulation techniques independently:
+                {manipulation_techniques}
+
+                Analysis Request: Generate JSON Analysis of Manipulation Techniques
+
+                For each technique and for each provided argument:
+                IMPORTANT: Focus on HOW the argument is supported, not WHETHER the argument itself is manipulative
+                1. Examine the text surrounding and supporting this argument
+                2. Identify specific instances where the technique is used to:
+                - Support the argument
+                - Strengthen its persuasiveness
+                - Convince readers of its validity
+                3. For each identified instance:
+                - Extract the exact manipulative text
+                - Explain how it uses this manipulation to support the argument
+
+                Example distinction:
+                - Argument: "We should reduce carbon emissions"
+                - Don't analyze: Whether this argument itself is manipulative
+                - Do analyze: Whether manipulation techniques are used to support this argument
+
+                ### TEXT
+                {text}
+
+                The arguments of the text are
+                arguments: {arguments}
+
+                ### OUTPUT
+                One key per technique name listed above ({technique_names}), it is important all keys are included they will be parsed:
+                {{
+                    "<technique_name>": {{
+                        "arguments": [
+                            {{ 
+                                "argument_id": "<str>", the id of the argument as received in the arguments
+                                "argument_text": "<str>", exactly written as received in the arguments
+                                "contains_manipulation": <true|false>,
+                                "manipulations": [
+                                    {{
+                                        "instance": "<str>", keep the instance in the original language of the text
+                                        "explanation": "<str>"
+                                    }}
+                                ]
+                            }}
+                        ]
+                    }}
+                }}""")
+        ])
+
+        # Argument independent variant: detects the technique directly on numbered
+        # sentences, so it can run while the arguments are still being extracted
+        self.span_prompt = ChatPromptTemplate.from_messages([
+            self.prompt.messages[0],
+            ("human", """### 
+             
+                ### TASK
+                Focus only on the following manipulation technique:
+                {manipulation_technique}
+
+                Analysis Request: Generate JSON list of the sentences using this technique
+
+                The text is given as numbered sentences.
+                IMPORTANT: Focus on HOW claims are supported, not WHETHER the claims themselves are manipulative
+                1. Read the whole text to understand the claims it makes
+                2. Identify specific instances where the above stated manipulation technique is used to support a claim
+                3. For each identified instance:
+                - Give the number of the sentence containing it
+                - Extract the exact manipulative text
+                - Explain how it uses this manipulation to support the claim
+
+                ### TEXT
+                {sentences}
+
+                ### OUTPUT
+                {{
+                    "findings": [
+                        {{
+                            "sentence_id": <int>,
+                            "instance": "<str>", keep the instance in the original language of the text
+                            "explanation": "<str>"
+                        }}
+                    ]
+                }}""")
+        ])
+
+        # Screening variant for the cascade: only a verdict per argument, no instances or
+        # explanations, so a cheaper model can answer it quickly
+        self.screen_prompt = ChatPromptTemplate.from_messages([
+            self.prompt.messages[0],
+            ("human", """### 
+                ### TASK
+                Screen the text for each of the following manipulation techniques:
+                {manipulation_techniques}
+                For each technique and for each provided argument, tell whether the technique is used
+                to support the argument. Answer "uncertain" rather than "no" when in doubt.
+                IMPORTANT: Focus on HOW the argument is supported, not WHETHER the argument itself is manipulative
+                ### TEXT
+                {text}
+                The arguments of the text are
+                arguments: {arguments}
+                ### OUTPUT
+                One key per technique name listed above ({technique_names}), it is important all keys are included they will be parsed:
+                {{
+                    "<technique_name>": [
+                        {{
+                            "argument_id": "<str>", the id of the argument as received in the arguments
+                            "verdict": "<yes|no|uncertain>"
+                        }}
+                    ]
+                }}""")
+        ])
+
+    def prompts(self) -> List[ChatPromptTemplate]:
+        return [self.prompt, self.group_prompt, self.span_prompt, self.screen_prompt]
+
     async def analyze(self, manipulation_technique: str, text: str, arguments: str) -> dict:
         """Run the manipulation analysis."""
-        chain = self.prompt | self.llm
-        response = await chain.ainvoke({
+        return await self._invoke_json(self.prompt, {
             "manipulation_technique": manipulation_technique,
             "text": text,
             "arguments": arguments
-        })
-        
+        }, TECHNIQUE_SCHEMA)
+
+    async def analyze_spans(self, manipulation_technique: str, sentences: str) -> dict:
+        """Run the manipulation analysis on numbered sentences, without the arguments."""
+        return await self._invoke_json(self.span_prompt, {
+            "manipulation_technique": manipulation_technique,
+            "sentences": sentences
+        }, SPANS_SCHEMA)
+
+    async def analyze_group(self, manipulation_techniques: Dict[str, str], text: str, arguments: str) -> Dict[str, dict]:
+        """
+        Run the manipulation analysis for several techniques in one call.
+        Returns one result per technique name, shaped like the output of analyze.
+        """
+        parsed = await self._invoke_json(self.group_prompt, {
+            "manipulation_techniques": "\n".join(
+                f"#### {name}\n{definition}" for name, definition in manipulation_techniques.items()
+            ),
+            "technique_names": ", ".join(manipulation_techniques),
+            "text": text,
+            "arguments": arguments
+        }, {name: TECHNIQUE_SCHEMA for name in manipulation_techniques})
+        if "error" not in parsed:
+            partial, raw_response = parsed, None
+        else:
+            # Keep the techniques the response got right, when it was JSON at all
+            partial = parsed.get("parsed") if isinstance(parsed.get("parsed"), dict) else {}
+            raw_response = parsed["raw_response"]
+
+        # Only the requested techniques, other top level keys of the response are dropped
+        results = {}
+        for name in manipulation_techniques:
+            if name in partial and validate(partial[name], TECHNIQUE_SCHEMA) is None:
+                results[name] = partial[name]
+            else:
+                log.error(f'technique {name} missing from grouped response')
+                results[name] = {"error": f"Technique {name} missing from grouped response", "raw_response": raw_response}
+        return results
+
+    async def screen(
+        self,
+        manipulation_techniques: Dict[str, str],
+        text: str,
+        arguments: str,
+        argument_ids: List[str]
+    ) -> Dict[str, Optional[set]]:
+        """
+        Screen several techniques in one call. Returns, per technique name, the ids of the
+        arguments that were not cleared, or None when the screening gave no usable answer.
+        """
         try:
-            json_str = response.content.strip()
-            if json_str.startswith("```json"):
-                json_str = json_str[7:-3]
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            return {"error": f"Failed to parse JSON response: {str(e)}", "raw_response": response.content}
+            parsed = await self._invoke_json(self.screen_prompt, {
+                "manipulation_techniques": "\n".join(
+                    f"#### {name}\n{definition}" for name, definition in manipulation_techniques.items()
+                ),
+                "technique_names": ", ".join(manipulation_techniques),
+                "text": text,
+                "arguments": arguments
+            })
+        except Exception as e:
+            log.error(f'screening of {tuple(manipulation_techniques)} failed: {str(e)}')
+            return {name: None for name in manipulation_techniques}
+
+        results = {}
+        for name in manipulation_techniques:
+            verdicts = parsed.get(name) if isinstance(parsed, dict) else None
+            if not isinstance(verdicts, list):
+                results[name] = None
+                continue
+            cleared = {
+                verdict.get('argument_id') for verdict in verdicts
+                if isinstance(verdict, dict) and str(verdict.get('verdict', '')).lower() == 'no'
+            }
+            # Arguments the model did not answer for are not cleared either
+            results[name] = {argument_id for argument_id in argument_ids if argument_id not in cleared}
+        return results
 
 class TextAnalysisSystem:
     def __init__(self):
-        self.argument_agent = ArgumentAnalysisAgent()
-        self.manipulation_agent = ManipulationAnalysisAgent()
-        
-        # Fallacy definitions
-        self.ad_populum = """
-    - Argumentum ad populum (Appeal to the People): Claims something is true because many/most people believe it.
-            Core concept: Substitutes popular opinion for evidence
-            Examples: 'Most people believe in ghosts, so they must exist'
-                     'Everyone says this restaurant is the best, so it must be'
-            Counter: Popularity doesn't determine truth - many widely held beliefs have been proven wrong"""
-
-        self.unspecified_authority_fallacy = """
-        - Unspecified Authority fallacy: References unnamed or vague authorities to support claims.
-                Core concept: Creates false credibility through anonymous expertise
-                Examples: 'Scientists say this product is revolutionary'
-                        'Research has shown that...' (without citing specific studies)
-                Counter: Ask for specific sources and credentials of the claimed authorities"""
-
-        self.appeal_to_pride = """
-        - Appeal to Pride: Manipulates audience by associating agreement with positive qualities.
-                Core concept: Exploits desire to belong to a "superior" group
-                Examples: 'Sophisticated people understand why this art is valuable'
-                        'Any true patriot would support this policy'
-                Counter: Evaluate claims on their merits, not on implied social status"""
-
-        self.false_dilemma = """
-        - False Dilemma (Black and White Thinking): Reduces complex situations to only two opposing options.
-                Core concept: Artificially limits choices to force a particular conclusion
-                Examples: 'Either support this war or you're against our troops'
-                        'You're either with us or against us'
-                Counter: Identify and explore other possible alternatives"""
-
-        self.cherry_picking_data = """
-        - Cherry-Picking Data: Selectively presents favorable evidence while omitting contradictory data.
-                Core concept: Creates misleading conclusions through incomplete evidence
-                Examples: 'Our product worked for these 10 selected customers' (ignoring 90 failures)
-                        'Crime dropped during my term' (ignoring areas where it increased)
-                Counter: Ask for complete data sets and contrary evidence"""
-
-        self.stork_fallacy = """
-        - Correlation vs. Causality (Stork fallacy): Mistakes correlation for causation.
-                Core concept: Assumes that when two things occur together, one must cause the other
-                Examples: 'Sales increased when we changed the logo, so the logo caused higher sales'
-                        'Violent crime rises with ice cream sales, so ice cream causes violence'
-                Counter: Investigate other potential causes and confounding variables"""
-
-        self.fallacy_of_composition = """
-        - Fallacy of Composition: Incorrectly applies properties of parts to the whole.
-                Core concept: Assumes what's true of components must be true of the entire system
-                Examples: 'Each player on the team is a star, so this must be the best team'
-                        'Every part of this machine is light, so the machine must be light'
-                Counter: Consider how parts interact and combine in the whole"""
-
-        self.fallacy_of_division = """
-        - Fallacy of Division: Wrongly attributes properties of the whole to individual parts.
-                Core concept: Assumes what's true of the whole must be true of all parts
-                Examples: 'This company is rich, so all its employees must be rich'
-                        'Humans are conscious beings, so all human cells must be conscious'
-                Counter: Examine whether the property can logically apply to individual components"""
-
-        self.hasty_generalization = """
-        - Hasty Generalization: Draws broad conclusions from insufficient evidence.
-                Core concept: Makes sweeping claims based on small or unrepresentative samples
-                Examples: 'My friend got food poisoning at a Mexican restaurant, so Mexican food is unsafe'
-                        'It snowed in April, so climate change must be fake'
-                Counter: Ask about sample size and representativeness"""
-
-        self.texas_sharpshooter_fallacy = """
-        - Texas Sharpshooter Fallacy: Cherry-picks data clusters while ignoring scattered data.
-                Core concept: Finds patterns in randomness by focusing only on clustered results
-                Examples: 'Looking at only successful stock trades to prove trading strategy works'
-                        'Noting cancer clusters without considering population density'
-                Counter: Examine all data points and consider broader context"""
-
-
-    async def analyze_text(self, text: str) -> dict:
+        # Every LLM call goes through a limiter shared by all agents using the same model
+        self.rate_limiters = RateLimiterRegistry.from_env()
+        # Model of each stage. SCREENING_MODEL enables the cascade: a cheaper model screens each
+        # technique and only the arguments it does not clear are sent to MANIPULATION_MODEL
+        argument_model = os.getenv('ARGUMENT_MODEL', LLMAgent.model)
+        manipulation_model = os.getenv('MANIPULATION_MODEL', LLMAgent.model)
+        screening_model = os.getenv('SCREENING_MODEL', '')
+        self.argument_agent = ArgumentAnalysisAgent(self.rate_limiters.get(argument_model), argument_model)
+        self.manipulation_agent = ManipulationAnalysisAgent(self.rate_limiters.get(manipulation_model), manipulation_model)
+        self.screening_agent = (
+            ManipulationAnalysisAgent(self.rate_limiters.get(screening_model), screening_model) if screening_model else None
+        )
+        self.screened_techniques = 0
+        self.escalated_techniques = 0
+
+        # Technique names and definitions, and the ones evaluated when a request does not choose
+        self.techniques = load_techniques()
+        self.default_techniques = default_techniques(self.techniques)
+
+        # Technique prompts are sent compact arguments and definitions, and optionally only the
+        # text around the arguments (PROMPT_CONTEXT=relevant), see PromptBuilder
+        self.prompt_builder = PromptBuilder.from_env()
+        self.technique_definitions = self.prompt_builder.compact_definitions(self.techniques)
+        # Estimated input tokens an analysis may send across all its model calls (0 disables it),
+        # each region of a document having its own. Technique calls that would go over are not
+        # sent and their techniques are not evaluated, an argument stage that would go over
+        # fails the request with a 413
+        self.token_budget = int(os.getenv('PROMPT_TOKEN_BUDGET', '0'))
+
+        # Number of techniques evaluated per LLM call: 1 sends one call per technique,
+        # 10 evaluates every technique in a single call
+        self.technique_group_size = max(1, int(os.getenv('TECHNIQUE_GROUP_SIZE', '1')))
+
+        # Pipelined mode runs technique detection on sentences concurrently with argument
+        # extraction, and aligns the findings to the arguments afterwards
+        self.pipelined = os.getenv('ANALYSIS_PIPELINED', 'false').lower() in ('1', 'true', 'yes')
+
+        # Texts longer than this many characters are split into chunks analyzed in parallel (0 disables it)
+        self.chunk_size = int(os.getenv('ANALYSIS_CHUNK_SIZE', '0'))
+
+        # Similarity above which a rewritten argument statement still matches an argument (0 disables fuzzy matching)
+        self.fuzzy_match_cutoff = float(os.getenv('ARGUMENT_FUZZY_MATCH_CUTOFF', '0.8'))
+
+        # Request level time budget in seconds (0 disables it) and the share of it given to the
+        # argument stage, techniques missing the deadline are reported as not evaluated
+        self.deadline_seconds = float(os.getenv('ANALYSIS_DEADLINE_SECONDS', '0'))
+        self.argument_stage_share = float(os.getenv('ARGUMENT_STAGE_BUDGET_SHARE', '0.4'))
+        # Technique calls in flight longer than this latency percentile get a duplicate call (0 disables
+        # it), for at most HEDGE_MAX_RATIO of the calls
+        self.hedger = Hedger(
+            percentile=float(os.getenv('HEDGE_PERCENTILE', '0.95')),
+            min_samples=int(os.getenv('HEDGE_MIN_SAMPLES', '20')),
+            max_ratio=float(os.getenv('HEDGE_MAX_RATIO', '0.05'))
+        )
+
+        # Local screening of the techniques whose cues do not appear in the text, these are
+        # reported without manipulation instead of calling the model (PREFILTER=lexical)
+        self.prefilter = PreFilter.from_env()
+
+        # Results are cached by text and by this version, so any prompt or definition change invalidates them
+        self.prompts_version = self.compute_prompts_version()
+        self.cache = AnalysisCache.from_env()
+        # Each stage is also cached on its own, so a prompt change or a failed call only
+        # costs the stages that are affected: the argument stage is keyed on the text, each
+        # technique on the text, the arguments and that technique's definition
+        self.stage_cache = AnalysisCache.from_env('STAGE_CACHE', table='stage_cache', max_size=2048)
+        self.argument_version = stage_key(self.argument_agent.fingerprint())
+        self.technique_versions = {
+            name: stage_key(
+                self.manipulation_agent.fingerprint(), self._screening_fingerprint(), self.prompt_builder.fingerprint(), name, definition
+            )
+            for name, definition in self.get_manipulation_tasks().items()
+        }
+        # Copies of an already analyzed text with different boilerplate or small edits reuse
+        # its analysis, found by SimHash fingerprint (NEAR_DUPLICATE_MAX_DISTANCE=-1 disables it)
+        self.near_duplicates = NearDuplicateIndex.from_env()
+        # Texts of at least this many characters are fingerprinted off the event loop
+        self.fingerprint_thread_chars = int(os.getenv('SIMHASH_THREAD_CHARS', '20000'))
+        # Versions of a document are analyzed by regions of paragraphs of up to this many
+        # characters, an update only re-analyzes the regions it changed
+        self.documents = DocumentStore(
+            os.getenv('DOCUMENT_STORE_PATH', 'documents.sqlite3'),
+            max_documents=int(os.getenv('DOCUMENT_STORE_MAX_DOCUMENTS', '10000'))
+        )
+        self.document_region_size = int(os.getenv('DOCUMENT_REGION_SIZE', '3000'))
+        # Share of the analyses whose manipulations are logged argument by argument at DEBUG level
+        self.log_sample_rate = float(os.getenv('LOG_ANALYSIS_SAMPLE_RATE', '1.0'))
+        # Concurrent requests for the same text share one in-flight analysis
+        self.inflight = SingleFlight()
+        # Whether the warm-up sends a minimal prompt through each model client to open its connection
+        self.warm_up_model_calls = os.getenv('WARMUP_MODEL_CALLS', 'false').lower() in ('1', 'true', 'yes')
+
+    def agents(self) -> List[LLMAgent]:
+        return [agent for agent in (self.argument_agent, self.manipulation_agent, self.screening_agent) if agent is not None]
+
+    def build_clients(self) -> None:
+        """Build the model clients and render the prompts, blocking, run by the warm-up."""
+        for agent in self.agents():
+            agent.build_client()
+            agent.render_prompts()
+
+    async def warm_up_calls(self) -> None:
+        """Open the connection of each model client, a failed call only costs the first request its latency."""
+        if not self.warm_up_model_calls:
+            return
+        for agent in self.agents():
+            try:
+                await agent.warm_up_call()
+            except Exception as e:
+                log.warning(f'warm-up call to {agent.model} failed: {str(e)}')
+
+    def get_manipulation_tasks(self) -> Dict[str, str]:
+        """Return all manipulation techniques and their corresponding definitions, as sent to the model"""
+        return self.technique_definitions
+
+    def resolve_techniques(self, techniques: Optional[List[str]] = None) -> List[str]:
+        """Techniques to evaluate for a request, in registry order, the defaults when not given"""
+        if techniques is None:
+            return self.default_techniques
+        return select_techniques(self.techniques, techniques)
+
+    def result_key(self, text: str, techniques: List[str]) -> str:
+        """Cache key of the analysis of a text for a set of techniques"""
+        version = self.prompts_version
+        if techniques != self.default_techniques:
+            version = f"{version}:{','.join(techniques)}"
+        return content_key(text, version)
+
+    def document_result_key(self, document_id: str, text: str, techniques: List[str]) -> str:
+        """
+        Cache key of the analysis of a version of a document. It is merged from regions of
+        document_region_size characters, so it is kept apart from the whole text analyses.
+        """
+        version = f"document:{document_id}:{self.document_region_size}:{self.prompts_version}:{','.join(techniques)}"
+        return content_key(text, version)
+
+    def _screening_fingerprint(self) -> str:
+        return self.screening_agent.fingerprint() if self.screening_agent is not None else ''
+
+    def compute_prompts_version(self) -> str:
+        """Hash the prompts and technique definitions that shape an analysis result."""
+        digest = hashlib.sha256()
+        digest.update(self.argument_agent.fingerprint().encode('utf-8'))
+        digest.update(self.manipulation_agent.fingerprint().encode('utf-8'))
+        digest.update(self._screening_fingerprint().encode('utf-8'))
+        for name, definition in self.get_manipulation_tasks().items():
+            digest.update(f'{name}\0{definition}\0'.encode('utf-8'))
+        digest.update(f'group_size={self.technique_group_size}'.encode('utf-8'))
+        digest.update(f'pipelined={self.pipelined}'.encode('utf-8'))
+        digest.update(f'chunk_size={self.chunk_size}'.encode('utf-8'))
+        digest.update(f'prefilter={self.prefilter.spec}'.encode('utf-8'))
+        digest.update(self.prompt_builder.fingerprint().encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    async def analyze_text(self, text: str, techniques: Optional[List[str]] = None) -> dict:
         """Perform analysis and return in API format"""
         try:
-            raw_results = await self._analyze_raw(text)
-            if not raw_results:
-                raise ValueError("Raw analysis returned no results")
-            return self.raw_data_to_api_format(raw_results)
+            techniques = self.resolve_techniques(techniques)
+            cache_key = self.result_key(text, techniques)
+            fingerprint = await self.text_fingerprint(text)
+            cached = await self.cached_result(fingerprint, cache_key, techniques)
+            if cached is not None:
+                return cached
+
+            return await self.inflight.do(
+                cache_key, lambda: self._analyze_and_cache(text, fingerprint, cache_key, techniques)
+            )
+        except TokenBudgetExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Error in analyze_text: {str(e)}")
 
+    async def _analyze_and_cache(self, text: str, fingerprint: int, cache_key: str, techniques: List[str]) -> dict:
+        """Run the full analysis and store the API formatted result in the cache"""
+        raw_results = await self._analyze_raw(text, Deadline(self.deadline_seconds), techniques)
+        if not raw_results:
+            raise ValueError("Raw analysis returned no results")
+        result = self.raw_data_to_api_format(raw_results)
+        ANALYSES.inc(source='model')
+        # Partial results are served but not cached, the next request gets a chance at a full analysis
+        if not result['not_evaluated_techniques']:
+            await self.store_result(fingerprint, cache_key, techniques, result)
+        return result
+
+    async def analyze_document(self, document_id: str, text: str, techniques: Optional[List[str]] = None) -> dict:
+        """
+        Analyze a version of a document, reusing the analysis of the paragraphs that did not
+        change since its previous version, and return it in API format
+        """
+        try:
+            techniques = self.resolve_techniques(techniques)
+            cache_key = self.document_result_key(document_id, text, techniques)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                ANALYSES.inc(source='cache')
+                return cached
+            return await self.inflight.do(
+                f'{document_id}\0{cache_key}', lambda: self._analyze_document(document_id, text, cache_key, techniques)
+            )
+        except TokenBudgetExceeded:
+            raise
+        except Exception as e:
+            raise Exception(f"Error in analyze_document: {str(e)}")
+
+    async def _analyze_document(self, document_id: str, text: str, cache_key: str, techniques: List[str]) -> dict:
+        # The prior regions are only reused for the same prompts and techniques
+        version = f"{self.prompts_version}:{','.join(techniques)}"
+        prior_regions = await asyncio.to_thread(self.documents.get, document_id, version)
+        regions = plan_regions(split_paragraphs(text), prior_regions, self.document_region_size)
+        if not regions:
+            raise ValueError("Document has no text to analyze")
+        # New regions, and prior ones whose analysis failed in part
+        changed = [
+            region for region in regions
+            if region['raw'] is None or region['raw']['not_evaluated'] or 'error' in region['raw']['argument_analysis']
+        ]
+        log.debug('document %s: re-analyzing %d of %d regions', document_id, len(changed), len(regions))
+
+        raw_analyses = await gather_or_cancel(*[
+            self.complete_raw('\n\n'.join(region['paragraphs']), region['raw'], techniques) for region in changed
+        ])
+        for region, raw_analysis in zip(changed, raw_analyses):
+            region['raw'] = raw_analysis
+        failed = [region for region in regions if 'error' in region['raw']['argument_analysis']]
+        # A region whose argument analysis failed is stored without it, the next update analyzes it anew
+        await asyncio.to_thread(self.documents.set, document_id, version, [
+            {**region, 'raw': None} if region in failed else region for region in regions
+        ])
+
+        result = self.raw_data_to_api_format(merge_raw_analyses([region['raw'] for region in regions]))
+        if failed:
+            log.error('document %s: %d of %d regions failed the argument analysis', document_id, len(failed), len(regions))
+        elif not result['not_evaluated_techniques']:
+            # Not indexed for near duplicates, those are looked up by the whole text analyses
+            await self.cache.set(cache_key, result)
+        return result
+
+    async def text_fingerprint(self, text: str) -> int:
+        """SimHash of a text, computed once per request and in a thread for long texts"""
+        if len(text) < self.fingerprint_thread_chars:
+            return simhash(text)
+        return await asyncio.to_thread(simhash, text)
+
+    async def cached_result(self, fingerprint: int, cache_key: str, techniques: List[str]) -> Optional[dict]:
+        """Cached analysis of the text with this fingerprint, or of a near duplicate of it"""
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            log.debug('cache hit for %s', cache_key)
+            ANALYSES.inc(source='cache')
+            return cached
+        near_key = self.near_duplicates.find(fingerprint, ','.join(techniques))
+        if near_key is None:
+            return None
+        cached = await self.cache.get(near_key)
+        if cached is None:
+            # The analysis was evicted from the cache, or computed with other prompts
+            self.near_duplicates.discard_key(near_key)
+            return None
+        log.debug('near duplicate hit for %s, reusing %s', cache_key, near_key)
+        ANALYSES.inc(source='near_duplicate')
+        await self.cache.set(cache_key, cached)
+        return cached
+
+    async def store_result(self, fingerprint: int, cache_key: str, techniques: List[str], result: dict) -> None:
+        """Cache a complete analysis and index the fingerprint of its text for near duplicate lookups"""
+        await self.cache.set(cache_key, result)
+        self.near_duplicates.add(fingerprint, cache_key, ','.join(techniques))
+
+
+    def get_manipulation_groups(self, techniques: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """Split the techniques (all of them by default) into groups, each group is evaluated in a single LLM call"""
+        manipulation_tasks = [
+            (name, definition) for name, definition in self.get_manipulation_tasks().items()
+            if techniques is None or name in techniques
+        ]
+        return [
+            dict(manipulation_tasks[i:i + self.technique_group_size])
+            for i in range(0, len(manipulation_tasks), self.technique_group_size)
+        ]
+
+    async def _analyze_manipulation_group(self, group: Dict[str, str], text: str, argument_analysis: dict) -> Dict[str, dict]:
+        """
+        Run manipulation analysis for a group of techniques and return results keyed by technique
+        name, each tagged with the model that produced it. With a screening model, the strong
+        model only sees the techniques and arguments the screening did not clear.
+        """
+        if self.screening_agent is None:
+            context, arguments = self.prompt_builder.technique_inputs(text, argument_analysis, list(group))
+            return await self._call_manipulation_group(group, context, arguments)
+
+        all_arguments = [
+            argument for argument in argument_analysis.get('arguments', []) if isinstance(argument, dict)
+        ]
+        context, arguments = self.prompt_builder.technique_inputs(text, argument_analysis, list(group))
+        with stage('screening', ','.join(group)):
+            flagged = await self.screening_agent.screen(
+                group, context, arguments, [argument.get('id') for argument in all_arguments]
+            )
+        escalated = {name: definition for name, definition in group.items() if flagged[name] is None or flagged[name]}
+        self.screened_techniques += len(group)
+        self.escalated_techniques += len(escalated)
+        results = {
+            name: {'arguments': [], 'model': self.screening_agent.model} for name in group if name not in escalated
+        }
+        if escalated:
+            if any(flagged[name] is None for name in escalated):
+                escalated_arguments = argument_analysis
+            else:
+                ids = set().union(*(flagged[name] for name in escalated))
+                escalated_arguments = {
+                    **argument_analysis, 'arguments': [argument for argument in all_arguments if argument.get('id') in ids]
+                }
+            context, arguments = self.prompt_builder.technique_inputs(text, escalated_arguments, list(escalated))
+            results.update(await self._call_manipulation_group(escalated, context, arguments))
+        return results
+
+    async def _call_manipulation_group(self, group: Dict[str, str], text: str, arguments: str) -> Dict[str, dict]:
+        with stage('technique', ','.join(group)):
+            if len(group) == 1:
+                (name, definition), = group.items()
+                results = {name: await self.manipulation_agent.analyze(definition, text, arguments)}
+            else:
+                results = await self.manipulation_agent.analyze_group(group, text, arguments)
+        return {name: {**result, 'model': self.manipulation_agent.model} for name, result in results.items()}
+
+    def _hedged_manipulation_group(self, group: Dict[str, str], text: str, argument_analysis: dict) -> Awaitable[Dict[str, dict]]:
+        """Run manipulation analysis for a group, hedged when the call is slower than usual"""
+        return self.hedger.run(','.join(group), lambda: self._analyze_manipulation_group(group, text, argument_analysis))
+
+    async def _gather_until(self, calls: Dict[Any, Awaitable], timeout: Optional[float]) -> Tuple[dict, list]:
+        """
+        Run the calls concurrently until the timeout. Returns the results keyed like the calls,
+        and the keys of the calls that failed or missed the timeout.
+        """
+        tasks = {key: asyncio.ensure_future(call) for key, call in calls.items()}
+        if not tasks:
+            return {}, []
+        try:
+            await asyncio.wait(tasks.values(), timeout=timeout)
+        finally:
+            for task in tasks.values():
+                task.cancel()
 
-    async def _analyze_raw(self, text: str) -> dict:
+        results, missing = {}, []
+        for key, task in tasks.items():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                results[key] = task.result()
+                continue
+            if task.done() and not task.cancelled():
+                log.error(f'{key} failed: {str(task.exception())}')
+            else:
+                log.error(f'{key} missed the deadline')
+                TIMEOUTS.inc(stage='technique')
+            missing.append(key)
+        return results, missing
+
+    async def _analyze_raw(
+        self,
+        text: str,
+        deadline: Optional[Deadline] = None,
+        techniques: Optional[List[str]] = None
+    ) -> dict:
         """Perform both argument and manipulation analysis on the text concurrently."""
+        deadline = deadline or Deadline()
+        techniques = self.resolve_techniques(techniques)
+        with token_budget(self.token_budget):
+            if self.chunk_size and len(text) > self.chunk_size:
+                return await self._analyze_raw_chunked(text, deadline, techniques)
+            return await self._analyze_raw_single(text, deadline, techniques)
+
+    async def _analyze_raw_chunked(self, text: str, deadline: Deadline, techniques: List[str]) -> dict:
+        """
+        Analyze each chunk of a long text in parallel, then merge the chunk analyses into
+        one thesis and a deduplicated argument list, so latency stays flat with length.
+        """
+        chunks = split_into_chunks(text, self.chunk_size)
+        log.debug('text of %d characters split into %d chunks', len(text), len(chunks))
+        # A chunk failing fails the request, the other chunks stop calling the model
+        chunk_analyses = list(await gather_or_cancel(*[
+            self._analyze_raw_single(chunk, deadline, techniques) for chunk in chunks
+        ]))
+        # The chunks whose argument analysis failed get one more try, a chunk failing again leaves
+        # the techniques not evaluated, so the merged analysis is partial and not cached
+        failed = [i for i, analysis in enumerate(chunk_analyses) if 'error' in analysis['argument_analysis']]
+        if failed:
+            log.error('%d of %d chunks failed the argument analysis, retrying them', len(failed), len(chunks))
+            retried = await gather_or_cancel(*[
+                self._analyze_raw_single(chunks[i], deadline, techniques) for i in failed
+            ])
+            for i, analysis in zip(failed, retried):
+                chunk_analyses[i] = analysis
+        return merge_raw_analyses(chunk_analyses)
+
+    async def _analyze_raw_single(self, text: str, deadline: Deadline, techniques: List[str]) -> dict:
+        """Analyze a text, or a chunk of it, in one pass"""
+        if self.pipelined:
+            return await self._analyze_raw_pipelined(text, deadline, techniques)
+
         # First get the argument analysis since other analyses depend on it
-        argument_analysis = await self.argument_agent.analyze(text)
-        
-        # Define all manipulation techniques and their corresponding definitions
-        manipulation_tasks = {
-            "ad_populum": self.ad_populum,
-            "unspecified_authority_fallacy": self.unspecified_authority_fallacy,
-            "appeal_to_pride": self.appeal_to_pride,
-            "false_dilemma": self.false_dilemma,
-            "cherry_picking_data": self.cherry_picking_data,
-            "stork_fallacy": self.stork_fallacy,
-            "fallacy_of_composition": self.fallacy_of_composition,
-            "fallacy_of_division": self.fallacy_of_division,
-            "hasty_generalization": self.hasty_generalization,
-            "texas_sharpshooter_fallacy": self.texas_sharpshooter_fallacy
-        }
-        
-        # Create coroutines for each manipulation analysis
-        async def analyze_manipulation(name: str, definition: str) -> tuple:
-            """Helper function to run manipulation analysis and return result with its name"""
-            result = await self.manipulation_agent.analyze(definition, text, str(argument_analysis))
-            return (name, result)
-        
-        # Gather all manipulation analysis tasks
-        tasks = [
-            analyze_manipulation(name, definition) 
-            for name, definition in manipulation_tasks.items()
-        ]
-        
-        # Run all manipulation analyses concurrently
-        manipulation_results = await asyncio.gather(*tasks)
+        try:
+            argument_analysis = await asyncio.wait_for(
+                self._argument_stage(text),
+                timeout=deadline.share(self.argument_stage_share)
+            )
+        except asyncio.TimeoutError:
+            TIMEOUTS.inc(stage='argument')
+            raise TimeoutError("Argument analysis missed its deadline")
+        if 'error' in argument_analysis:
+            # The technique results could not be attached to any argument, do not pay for their calls
+            return self._argument_failure(argument_analysis, techniques)
+
+        manipulation_results, not_evaluated = await self._analyze_manipulations(
+            text, argument_analysis, deadline, techniques
+        )
         
         # Combine results into final dictionary
-        manipulation_analyses = {
+        return {
             "argument_analysis": argument_analysis,
-            **dict(manipulation_results)
+            "not_evaluated": not_evaluated,
+            **manipulation_results
         }
-        
+
+    @staticmethod
+    def _argument_failure(argument_analysis: dict, techniques: List[str]) -> dict:
+        """Raw analysis of a text whose argument analysis failed, none of its techniques are evaluated"""
+        log.error(f"argument analysis failed, techniques not evaluated: {argument_analysis['error']}")
+        return {"argument_analysis": argument_analysis, "not_evaluated": list(techniques)}
+
+    async def _argument_stage(self, text: str) -> dict:
+        """Argument analysis of the text, served from the stage cache when possible"""
+        key = stage_key('argument', self.argument_version, normalize_text(text))
+        argument_analysis = await self.stage_cache.get(key)
+        if argument_analysis is None:
+            with stage('argument'):
+                argument_analysis = await self.argument_agent.analyze(text)
+            if 'error' not in argument_analysis:
+                await self.stage_cache.set(key, argument_analysis)
+        return argument_analysis
+
+    def _technique_key(self, name: str, text: str, arguments: str) -> str:
+        return stage_key('technique', self.technique_versions[name], normalize_text(text), arguments)
+
+    async def _cached_manipulations(self, text: str, arguments: str, names: List[str]) -> Dict[str, dict]:
+        """Technique results already in the stage cache, keyed by technique name"""
+        cached = await asyncio.gather(*[
+            self.stage_cache.get(self._technique_key(name, text, arguments)) for name in names
+        ])
+        return {name: result for name, result in zip(names, cached) if result is not None}
+
+    @staticmethod
+    def _split_failures(results: Dict[str, dict]) -> Tuple[Dict[str, dict], List[str]]:
+        """Technique results that can be merged, and the techniques whose call returned an error"""
+        failed = [name for name, result in results.items() if isinstance(result, dict) and 'error' in result]
+        for name in failed:
+            log.error(f"technique {name} not evaluated: {results[name]['error']}")
+        return {name: result for name, result in results.items() if name not in failed}, failed
+
+    async def _store_manipulations(self, text: str, arguments: str, results: Dict[str, dict]) -> None:
+        for name, result in results.items():
+            if isinstance(result, dict) and 'error' not in result:
+                await self.stage_cache.set(self._technique_key(name, text, arguments), result)
+
+    async def _analyze_manipulations(
+        self,
+        text: str,
+        argument_analysis: dict,
+        deadline: Deadline,
+        techniques: Optional[List[str]] = None
+    ) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Run the manipulation analyses concurrently, within what is left of the budget.
+        Returns the results keyed by technique and the techniques that were not evaluated.
+        """
+        arguments = str(argument_analysis)
+        names, skipped = self.prefilter.screen(text, self.resolve_techniques(techniques))
+        cached_results = await self._cached_manipulations(text, arguments, names)
+        cached_results.update({name: {'arguments': [], 'model': 'prefilter'} for name in skipped})
+
+        # Only the techniques missing from the stage cache are sent to the model
+        group_results, missing_groups = await self._gather_until(
+            {
+                tuple(group): self._hedged_manipulation_group(group, text, argument_analysis)
+                for group in self.get_manipulation_groups([name for name in names if name not in cached_results])
+            },
+            timeout=deadline.remaining()
+        )
+
+        manipulation_results = {}
+        for group_result in group_results.values():
+            manipulation_results.update(group_result)
+        manipulation_results, failed = self._split_failures(manipulation_results)
+        await self._store_manipulations(text, arguments, manipulation_results)
+        return {**cached_results, **manipulation_results}, [name for group in missing_groups for name in group] + failed
+
+    async def complete_raw(
+        self,
+        text: str,
+        raw_analysis: Optional[dict] = None,
+        techniques: Optional[List[str]] = None
+    ) -> dict:
+        """
+        Run the raw analysis, or when a previous raw analysis is given, re-run only its
+        techniques that were not evaluated, e.g. after a failed call
+        """
+        if not raw_analysis or 'error' in raw_analysis['argument_analysis']:
+            return await self._analyze_raw(text, Deadline(self.deadline_seconds), techniques)
+
+        not_evaluated = raw_analysis.get('not_evaluated', [])
+        if not not_evaluated:
+            return raw_analysis
+        with token_budget(self.token_budget):
+            manipulation_results, still_not_evaluated = await self._analyze_manipulations(
+                text, raw_analysis['argument_analysis'], Deadline(self.deadline_seconds), not_evaluated
+            )
+        return {**raw_analysis, **manipulation_results, 'not_evaluated': still_not_evaluated}
+
+    async def _analyze_raw_pipelined(self, text: str, deadline: Deadline, techniques: List[str]) -> dict:
+        """
+        Run argument extraction and sentence level technique detection at the same time,
+        then reconcile the findings with the extracted arguments.
+        """
+        sentences = split_sentences(text)
+        numbered_sentences = number_sentences(sentences)
+
+        argument_task = asyncio.ensure_future(
+            asyncio.wait_for(self._argument_stage(text), timeout=deadline.remaining())
+        )
+        spans = None
+        try:
+            # Span results do not depend on the arguments
+            names, skipped = self.prefilter.screen(text, techniques)
+            cached_results = await self._cached_manipulations(text, 'spans', names)
+            cached_results.update({name: {'findings': []} for name in skipped})
+            spans = asyncio.ensure_future(self._gather_until(
+                {
+                    name: self.hedger.run(
+                        f'span:{name}',
+                        lambda name=name, definition=definition: self._analyze_spans(name, definition, numbered_sentences)
+                    )
+                    for name, definition in self.get_manipulation_tasks().items() if name in names and name not in cached_results
+                },
+                timeout=deadline.remaining()
+            ))
+            done, _ = await asyncio.wait({spans, argument_task}, return_when=asyncio.FIRST_COMPLETED)
+            if argument_task in done and (argument_task.exception() is not None or 'error' in argument_task.result()):
+                # The findings could not be aligned to any argument, the span calls still running are cancelled
+                return self._argument_failure(await argument_task, techniques)
+            span_results, not_evaluated = await spans
+            span_results, failed = self._split_failures(span_results)
+            not_evaluated += failed
+            await self._store_manipulations(text, 'spans', span_results)
+            span_results.update(cached_results)
+            argument_analysis = await argument_task
+            if 'error' in argument_analysis:
+                # The span results stay in the stage cache, they do not depend on the arguments
+                return self._argument_failure(argument_analysis, techniques)
+        except asyncio.TimeoutError:
+            TIMEOUTS.inc(stage='argument')
+            raise TimeoutError("Argument analysis missed its deadline")
+        finally:
+            argument_task.cancel()
+            if spans is not None:
+                spans.cancel()
+
+        manipulation_analyses = {"argument_analysis": argument_analysis, "not_evaluated": not_evaluated}
+        for name, span_result in span_results.items():
+            manipulation_analyses[name] = {
+                **align_findings(argument_analysis, span_result, sentences),
+                'model': 'prefilter' if name in skipped else self.manipulation_agent.model
+            }
         return manipulation_analyses
 
+    async def _analyze_spans(self, name: str, definition: str, numbered_sentences: str) -> dict:
+        with stage('technique', name):
+            return await self.manipulation_agent.analyze_spans(definition, numbered_sentences)
+
+    async def analyze_text_stream(self, text: str, techniques: Optional[List[str]] = None) -> AsyncIterator[dict]:
+        """
+        Perform analysis and yield the API format progressively: first the thesis and
+        the argument skeleton, then the manipulations of each technique as soon as its
+        call completes, and finally the score. The chunked and pipelined analyses only
+        know the arguments once all their calls are back, their result is replayed as
+        events once complete.
+        """
+        techniques = self.resolve_techniques(techniques)
+        cache_key = self.result_key(text, techniques)
+        fingerprint = await self.text_fingerprint(text)
+        cached = await self.cached_result(fingerprint, cache_key, techniques)
+        if cached is None and (self.pipelined or (self.chunk_size and len(text) > self.chunk_size)):
+            cached = await self.inflight.do(
+                cache_key, lambda: self._analyze_and_cache(text, fingerprint, cache_key, techniques)
+            )
+        if cached is not None:
+            for event in self._analysis_to_events(cached, techniques):
+                yield event
+            return
+
+        deadline = Deadline(self.deadline_seconds)
+        # The stages run in tasks of their own, a generator cannot hold the budget across its yields
+        budget = TokenBudget(self.token_budget) if self.token_budget else None
+        try:
+            argument_analysis = await asyncio.wait_for(
+                within_budget(budget, self._argument_stage(text)),
+                timeout=deadline.share(self.argument_stage_share)
+            )
+        except asyncio.TimeoutError:
+            TIMEOUTS.inc(stage='argument')
+            raise TimeoutError("Argument analysis missed its deadline")
+        analysis = self._build_analysis_skeleton(argument_analysis, techniques)
+        yield {
+            'event': 'arguments',
+            'thesis': analysis['thesis'],
+            'arguments': analysis['arguments'],
+        }
+
+        arguments = str(argument_analysis)
+
+        async def run_group(group: Dict[str, str]) -> Optional[Dict[str, dict]]:
+            try:
+                group_result = await self._hedged_manipulation_group(group, text, argument_analysis)
+            except Exception as e:
+                log.error(f'{tuple(group)} failed: {str(e)}')
+                return None
+            await self._store_manipulations(text, arguments, group_result)
+            return group_result
+
+        async def stage_cached_results() -> Dict[str, dict]:
+            return stage_cached
+
+        index = ArgumentIndex(analysis['arguments'], self.fuzzy_match_cutoff)
+        not_evaluated = list(techniques)
+        names, skipped = self.prefilter.screen(text, not_evaluated)
+        stage_cached = await self._cached_manipulations(text, arguments, names)
+        stage_cached.update({name: {'arguments': [], 'model': 'prefilter'} for name in skipped})
+        tasks = [asyncio.ensure_future(stage_cached_results())] + [
+            asyncio.ensure_future(within_budget(budget, run_group(group)))
+            for group in self.get_manipulation_groups([name for name in not_evaluated if name not in stage_cached])
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks, timeout=deadline.remaining()):
+                group_result = await next_result
+                if group_result is None:
+                    continue
+                # A technique whose call returned an error stays not evaluated
+                group_result, _ = self._split_failures(group_result)
+                for manipulation_name, manipulation_details in group_result.items():
+                    not_evaluated.remove(manipulation_name)
+                    unmatched = self._merge_manipulation(index, manipulation_name, manipulation_details)
+                    analysis['unmatched_findings'].extend(unmatched)
+                    if isinstance(manipulation_details, dict) and manipulation_details.get('model'):
+                        analysis['models'][manipulation_name] = manipulation_details['model']
+                    yield {
+                        'event': 'technique',
+                        'technique': manipulation_name,
+                        'model': analysis['models'].get(manipulation_name),
+                        'manipulations': [
+                            argument['manipulations'][manipulation_name] for argument in analysis['arguments']
+                        ],
+                        'unmatched_findings': unmatched,
+                    }
+        except asyncio.TimeoutError:
+            log.error(f'{not_evaluated} missed the deadline')
+            TIMEOUTS.inc(len(not_evaluated), stage='technique')
+        finally:
+            # Also reached when the consumer closes the stream
+            for task in tasks:
+                task.cancel()
+
+        analysis['not_evaluated_techniques'] = not_evaluated
+        analysis['score'] = get_score_details(analysis)
+        if not not_evaluated:
+            await self.store_result(fingerprint, cache_key, techniques, analysis)
+        yield {'event': 'score', 'score': analysis['score'], 'not_evaluated_techniques': not_evaluated}
+
+    def _analysis_to_events(self, analysis: dict, techniques: List[str]) -> List[dict]:
+        """Replay a complete API formatted analysis as stream events"""
+        skeleton = [
+            {**argument, 'manipulations': {name: [] for name in argument['manipulations']}}
+            for argument in analysis['arguments']
+        ]
+        events = [{'event': 'arguments', 'thesis': analysis['thesis'], 'arguments': skeleton}]
+        for manipulation_name in techniques:
+            events.append({
+                'event': 'technique',
+                'technique': manipulation_name,
+                'model': analysis.get('models', {}).get(manipulation_name),
+                'manipulations': [
+                    argument['manipulations'].get(manipulation_name, []) for argument in analysis['arguments']
+                ],
+                'unmatched_findings': [
+                    finding for finding in analysis.get('unmatched_findings', [])
+                    if finding['technique'] == manipulation_name
+                ],
+            })
+        events.append({
+            'event': 'score',
+            'score': analysis['score'],
+            'not_evaluated_techniques': analysis.get('not_evaluated_techniques', [])
+        })
+        return events
+
     def raw_data_to_api_format(self, raw_analysis_dict: dict) -> dict:
         """Convert raw analysis data to API format"""
         try:
+            with stage('format'):
+                argument_analysis = raw_analysis_dict.pop('argument_analysis')
+                not_evaluated = raw_analysis_dict.pop('not_evaluated', [])
+                # Error results from older raw analyses, e.g. of a job, count as not evaluated too
+                raw_analysis_dict, failed = self._split_failures(raw_analysis_dict)
+                not_evaluated = not_evaluated + [name for name in failed if name not in not_evaluated]
+                # The raw analysis has a result, or is missing one, for each technique of the request
+                techniques = [name for name in self.techniques if name in raw_analysis_dict or name in not_evaluated]
+                analysis = self._build_analysis_skeleton(argument_analysis, techniques)
+                # Index the arguments once, each raw finding is then matched in constant time
+                index = ArgumentIndex(analysis['arguments'], self.fuzzy_match_cutoff)
 
-            argument_analysis = raw_analysis_dict.pop('argument_analysis')
-            if not argument_analysis:
-                raise ValueError("Missing argument_analysis in raw data")
+                # Loop over raw manipulations data, meaning first ad_populum, then unspecified authority fallacy, etc
+                for manipulation_name, manipulation_details in raw_analysis_dict.items():
+                    if manipulation_name not in techniques:
+                        log.error(f'{manipulation_name} is not a registered technique')
+                        continue
+                    analysis['unmatched_findings'].extend(
+                        self._merge_manipulation(index, manipulation_name, manipulation_details)
+                    )
+                    if isinstance(manipulation_details, dict) and manipulation_details.get('model'):
+                        analysis['models'][manipulation_name] = manipulation_details['model']
 
-            # Extract and validate thesis
-            main_hypothesis = argument_analysis.get('main_hypothesis', {})
-            if not main_hypothesis:
-                log.error(f'argument_analysis :{argument_analysis}')
-                raise ValueError("Missing main_hypothesis")
+                # Techniques that failed or missed the deadline are excluded from the score
+                analysis['not_evaluated_techniques'] = not_evaluated
+                analysis['score'] = get_score_details(analysis)
+                self.print_anaysis(analysis)
 
-            # Initialize analysis structure
-            analysis = {
-                'thesis': main_hypothesis,
-                'arguments': []
-            }
-            # Construct the main frame of the analaysis dictionary response
-            arguments = argument_analysis.get('arguments', [])
-            if not isinstance(arguments, list):
-                raise ValueError("Arguments must be a list")
-            
-            # Build arguments structure
-            for argument in arguments:
-                if not isinstance(argument, dict):
-                    log.error(f'argument {argument} is not a dictionary')
-                    continue  # Skip invalid arguments
-                arg_object = {
-                    '_type': argument.get('_type', ''),
-                    'statement': argument.get('statement', ''),
-                    'connection_to_hypothesis': argument.get('connection_to_hypothesis', ''),
-                    'manipulations': {
-                        'ad_populum': [],
-                        'unspecified_authority_fallacy': [],
-                        'appeal_to_pride': [],
-                        'false_dilemma': [],
-                        'cherry_picking_data': [],
-                        'stork_fallacy': [],
-                        'fallacy_of_composition': [],
-                        'fallacy_of_division': [],
-                        'hasty_generalization': [],
-                        'texas_sharpshooter_fallacy': [],
-                    }
-                }
-                analysis["arguments"].append(arg_object)            
-
-            arguments_processed = analysis.get('arguments')
-
-            # Loop over raw manipulations data, meaning first ad_populum, then unspecified authority fallacy, etc
-            for manipulation_name, manipulation_details in raw_analysis_dict.items():
-                if not isinstance(manipulation_details, dict):
-                    log.error(f'manipulation details are not a dict: {manipulation_details}')
-                    continue  # Skip invalid manipulation details
-
-                raw_manipulations_per_argument = manipulation_details.get('arguments')
-                if not isinstance(raw_manipulations_per_argument, list):
-                    continue  # Skip if not a valid list
-
-                # Loop over constructed arguments response, meaning in the fnal analysis go over each argument 
-                for processed_argument in arguments_processed:
-                    # Find current argument in the raw manipulation data
-                    # these are all the arguments
-                    # text of current proccessed argument 
-                    current_processed_argument_text = processed_argument.get('statement', '')
-                    if not current_processed_argument_text:
-                        log.error(f'no current_processed_argument_text: {current_processed_argument_text}')
-                        continue 
-
-                    for raw_argument in raw_manipulations_per_argument:
-                        if not isinstance(raw_argument, dict):
-                            log.error(f'raw_argument is not a dict: {raw_argument}')
-                            continue  # Skip invalid raw arguments
-                        #get the text of the raw argument
-                        raw_arg_text = raw_argument.get('argument_text', '')
-                        contains_manipulation = raw_argument.get('contains_manipulation', False)
-                        # check if the raw_arguments is the same as the current processed argument
-                        if raw_arg_text == current_processed_argument_text and contains_manipulation:                        
-                            processed_argument_manipulations = processed_argument.get('manipulations', {})
-                            current_manipulation_processed = processed_argument_manipulations.get(manipulation_name, [])
-                            
-                            raw_argument_manipulations = raw_argument.get('manipulations', [])
-                            if isinstance(raw_argument_manipulations, list):
-                                current_manipulation_processed.extend(
-                                    manip for manip in raw_argument_manipulations 
-                                    if isinstance(manip, (dict, str))  # Validate manipulation items
-                                )
-                            # for raw_argument_manipulation in raw_argument_manipulations:
-                                # current_manipulation_processed.append(raw_argument_manipulation)
-                            break
-                        else:
-                            continue
-
-            analysis['score'] = get_score_details(analysis)
-            self.print_anaysis(analysis)
-
-
-            return analysis
+
+                return analysis
         
         except Exception as e:
             raise Exception(f"Error in raw_data_to_api_format: {str(e)}")
 
+    def _build_analysis_skeleton(self, argument_analysis: dict, techniques: List[str]) -> dict:
+        """Build the API format thesis and arguments, with empty manipulations"""
+        if not argument_analysis:
+            raise ValueError("Missing argument_analysis in raw data")
+        if 'error' in argument_analysis:
+            raise ValueError(f"Argument analysis failed: {argument_analysis['error']}")
+
+        # Extract and validate thesis
+        main_hypothesis = argument_analysis.get('main_hypothesis', {})
+        if not main_hypothesis:
+            log.error(f'argument_analysis :{argument_analysis}')
+            raise ValueError("Missing main_hypothesis")
+
+        # Initialize analysis structure
+        analysis = {
+            'thesis': main_hypothesis,
+            'arguments': [],
+            'unmatched_findings': [],
+            'models': {'arguments': self.argument_agent.model}
+        }
+        # Construct the main frame of the analaysis dictionary response
+        arguments = argument_analysis.get('arguments', [])
+        if not isinstance(arguments, list):
+            raise ValueError("Arguments must be a list")
+        
+        # Build arguments structure
+        for argument in arguments:
+            if not isinstance(argument, dict):
+                log.error(f'argument {argument} is not a dictionary')
+                continue  # Skip invalid arguments
+            arg_object = {
+                'id': argument.get('id', ''),
+                '_type': argument.get('_type', ''),
+                'statement': argument.get('statement', ''),
+                'connection_to_hypothesis': argument.get('connection_to_hypothesis', ''),
+                'manipulations': {name: [] for name in techniques}
+            }
+            analysis["arguments"].append(arg_object)
+
+        return analysis
+
+    def _merge_manipulation(self, index: ArgumentIndex, manipulation_name: str, manipulation_details: dict) -> List[dict]:
+        """
+        Attach the raw result of one technique to the matching processed arguments.
+        Returns the findings that could not be matched to any argument, instead of dropping them.
+        """
+        if not isinstance(manipulation_details, dict):
+            log.error(f'manipulation details are not a dict: {manipulation_details}')
+            return []  # Skip invalid manipulation details
+
+        raw_manipulations_per_argument = manipulation_details.get('arguments')
+        if not isinstance(raw_manipulations_per_argument, list):
+            return []  # Skip if not a valid list
+
+        unmatched = []
+        for raw_argument in raw_manipulations_per_argument:
+            if not isinstance(raw_argument, dict):
+                log.error(f'raw_argument is not a dict: {raw_argument}')
+                continue  # Skip invalid raw arguments
+            if not raw_argument.get('contains_manipulation', False):
+                continue
+
+            raw_argument_manipulations = raw_argument.get('manipulations', [])
+            if not isinstance(raw_argument_manipulations, list):
+                continue
+            # Validate manipulation items
+            raw_argument_manipulations = [manip for manip in raw_argument_manipulations if isinstance(manip, dict)]
+
+            raw_arg_text = raw_argument.get('argument_text', '')
+            if not isinstance(raw_arg_text, str):
+                raw_arg_text = ''
+            processed_argument = index.find(raw_argument.get('argument_id'), raw_arg_text)
+            if processed_argument is None:
+                log.debug('%s finding for unknown argument: %s', manipulation_name, raw_arg_text)
+                unmatched.append({
+                    'technique': manipulation_name,
+                    'argument_text': raw_arg_text,
+                    'manipulations': raw_argument_manipulations
+                })
+                continue
+            # The same finding can come back more than once, e.g. from overlapping chunks
+            current_manipulation_processed = processed_argument['manipulations'][manipulation_name]
+            current_manipulation_processed.extend(
+                manip for manip in raw_argument_manipulations if manip not in current_manipulation_processed
+            )
+
+        # Findings the pipelined mode could not align to an argument
+        for manipulation in manipulation_details.get('unmatched', []):
+            unmatched.append({'technique': manipulation_name, 'argument_text': '', 'manipulations': [manipulation]})
+        return unmatched
+
     def print_anaysis(self, analysis: dict) -> None:
-        thesis = analysis.get('thesis')
-        log.debug(f'Thesis: {thesis}')
-
-        an_args = analysis.get('arguments')
-
-        for arg in an_args:
-            statement = arg.get('statement')
-            _type = arg.get('_type')
-            manipulations = arg.get('manipulations')
-            ad_populum = manipulations.get('ad_populum')
-            unspecified_authority_fallacy = manipulations.get('unspecified_authority_fallacy')
-            appeal_to_pride = manipulations.get('appeal_to_pride')
-            false_dilemma = manipulations.get('false_dilemma')
-            cherry_picking_data = manipulations.get('cherry_picking_data')
-            stork_fallacy = manipulations.get('stork_fallacy')
-            fallacy_of_composition = manipulations.get('fallacy_of_composition')
-            fallacy_of_division = manipulations.get('fallacy_of_division')
-            hasty_generalization = manipulations.get('hasty_generalization')
-            texas_sharpshooter_fallacy = manipulations.get('texas_sharpshooter_fallacy')
-            log.trace(f'argument: {statement}')
-            log.trace(f'type: {_type}')
-            log.info(f'ad_populum: {ad_populum}')
-            log.info(f'unspecified_authority_fallacy: {unspecified_authority_fallacy}')
-            log.info(f'appeal_to_pride: {appeal_to_pride}')
-            log.info(f'false_dilemma: {false_dilemma}')
-            log.info(f'cherry_picking_data: {cherry_picking_data}')
-            log.info(f'stork_fallacy: {stork_fallacy}')
-            log.info(f'fallacy_of_composition: {fallacy_of_composition}')
-            log.info(f'fallacy_of_division: {fallacy_of_division}')
-            log.info(f'hasty_generalization: {hasty_generalization}')
-            log.info(f'texas_sharpshooter_fallacy: {texas_sharpshooter_fallacy}')
-            print('\n')
-
-        score = analysis.get('score')
-        log.debug(f'score: {score}')
+        """
+        Log a one line summary of the analysis, and for a sample of the analyses
+        (LOG_ANALYSIS_SAMPLE_RATE) the manipulations of each argument at DEBUG level.
+        """
+        arguments = analysis.get('arguments', [])
+        if log.isEnabledFor(logging.INFO):
+            # Number of arguments each technique was found in
+            found = {}
+            for arg in arguments:
+                for name, manipulations in arg.get('manipulations', {}).items():
+                    if manipulations:
+                        found[name] = found.get(name, 0) + 1
+            score = analysis.get('score', {}).get('overall_score')
+            log.info(
+                'analysis of %d arguments, score %s, techniques found %s', len(arguments), score, found,
+                extra={'fields': {'arguments': len(arguments), 'score': score, 'techniques_found': found}}
+            )
+
+        if not log.isEnabledFor(logging.DEBUG) or random.random() >= self.log_sample_rate:
+            return
+        log.debug('Thesis: %s', analysis.get('thesis'))
+        for arg in arguments:
+            log.trace('argument: %s', arg.get('statement'))
+            log.trace('type: %s', arg.get('_type'))
+            for name, manipulations in arg.get('manipulations', {}).items():
+                log.debug('%s: %s', name, manipulations)
+        log.debug('score: %s', analysis.get('score'))
 
 # Initialize the analysis system
+setup_tracing()
 analysis_system = TextAnalysisSystem()
+# Bounds the number of analyses running at once, extra requests wait in a priority queue
+admission = AdmissionController.from_env()
+ADMISSION_ACTIVE.set_function(lambda: admission.active)
+ADMISSION_QUEUE_DEPTH.set_function(admission.queue_depth)
+ADMISSION_WAIT_SECONDS.set_function(admission.average_wait)
 
-@app.post("/analyze", response_model=AnalysisOutput)
-async def analyze_text_route(input_data: TextInput):
-    """
-    Analyze text for arguments and manipulation techniques
-    """
+# Background analysis jobs, run by a pool of workers started with the service
+jobs = JobManager.from_env(analysis_system)
+
+# Cancels the analysis of clients that went away, checked every DISCONNECT_POLL_INTERVAL seconds
+disconnects = DisconnectWatcher(float(os.getenv('DISCONNECT_POLL_INTERVAL', '0.5')))
+# Articles submitted by URL are fetched here, their extracted text is cached by URL
+url_fetcher = URLFetcher.from_env()
+
+# Warm-up run once the service accepts connections, /ready answers 503 until it completed
+startup = Startup(STARTED_AT)
+startup.imported()
+
+@app.on_event("startup")
+async def start_jobs():
+    await jobs.start()
+
+@app.on_event("startup")
+async def start_warm_up():
+    startup.start([
+        ("model_clients", lambda: asyncio.to_thread(analysis_system.build_clients)),
+        ("model_calls", analysis_system.warm_up_calls),
+    ])
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    # Stop taking traffic from the load balancer first
+    await startup.stop()
+    await jobs.stop()
+    await url_fetcher.close()
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Streaming response holding an admission slot, released however the response ends."""
+
+    def __init__(self, content: AsyncIterator[str], release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+def rejection_to_http(e: AdmissionRejected) -> HTTPException:
+    log.error(f"Request rejected: {str(e)}")
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def requested_techniques(techniques: Optional[List[str]]) -> List[str]:
     try:
-        result = await analysis_system.analyze_text(input_data.text)
-        return result
+        return analysis_system.resolve_techniques(techniques)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+async def run_analysis(request: Request, x_client_id: Optional[str], fn: Callable[[], Awaitable[dict]]) -> dict:
+    """Run an analysis once admitted, cancelled if the client disconnects before it is done."""
+    try:
+        with span('analyze'):
+            async with admission.admit(x_client_id):
+                return await disconnects.run(request, fn)
+    except AdmissionRejected as e:
+        raise rejection_to_http(e)
+    except ClientDisconnected:
+        # Nobody is left to read the response
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except TokenBudgetExceeded as e:
+        log.error(f"Request over the token budget: {str(e)}")
+        raise HTTPException(status_code=413, detail=f"Text too large for the token budget: {str(e)}")
     except Exception as e:
         log.error(f"Analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
 
+@app.post("/analyze", response_model=AnalysisOutput)
+async def analyze_text_route(input_data: TextInput, request: Request, x_client_id: Optional[str] = Header(None)):
+    """
+    Analyze text for arguments and manipulation techniques.
+    The analysis is cancelled if the client disconnects before it is done.
+    """
+    techniques = requested_techniques(input_data.techniques)
+    if input_data.document_id:
+        return await run_analysis(request, x_client_id, lambda: analysis_system.analyze_document(
+            input_data.document_id, input_data.text, techniques
+        ))
+    return await run_analysis(request, x_client_id, lambda: analysis_system.analyze_text(input_data.text, techniques))
+
+@app.post("/analyze/url", response_model=AnalysisOutput)
+async def analyze_url_route(input_data: URLInput, request: Request, x_client_id: Optional[str] = Header(None)):
+    """
+    Fetch an article, extract its main text and analyze it. The article is analyzed as a
+    document identified by its URL, so a new version only re-analyzes what changed.
+    """
+    techniques = requested_techniques(input_data.techniques)
+    try:
+        page = await url_fetcher.get_text(input_data.url)
+    except FetchError as e:
+        log.error(f"Fetch error: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return await run_analysis(request, x_client_id, lambda: analysis_system.analyze_document(
+        page['url'], page['text'], techniques
+    ))
+
+@app.post("/analyze/stream")
+async def analyze_text_stream_route(input_data: TextInput, request: Request, x_client_id: Optional[str] = Header(None)):
+    """
+    Analyze text and stream progressive results, one JSON event per line.
+    Clients sending `Accept: text/event-stream` receive Server-Sent Events instead.
+    """
+    use_sse = 'text/event-stream' in request.headers.get('accept', '')
+    techniques = requested_techniques(input_data.techniques)
+    # Admit before the response starts so rejections are still plain HTTP errors
+    try:
+        acquired_at = await admission.acquire(x_client_id)
+    except AdmissionRejected as e:
+        raise rejection_to_http(e)
+    # The generator does not run when the client goes away before the body starts, the
+    # response releases the slot then
+    release = admission.releaser(acquired_at)
+
+    async def event_stream():
+        try:
+            async for event in analysis_system.analyze_text_stream(input_data.text, techniques):
+                payload = json.dumps(event)
+                yield f"data: {payload}\n\n" if use_sse else f"{payload}\n"
+        except Exception as e:
+            log.error(f"Analysis error: {str(e)}")
+            payload = json.dumps({'event': 'error', 'detail': f"Analysis error: {str(e)}"})
+            yield f"data: {payload}\n\n" if use_sse else f"{payload}\n"
+        finally:
+            release()
+
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return AdmittedStreamingResponse(event_stream(), release, media_type=media_type)
+
+@app.post("/jobs")
+async def create_jobs(input_data: JobInput):
+    """
+    Queue one text or a batch of texts for analysis, returns one job id per text
+    """
+    texts = ([input_data.text] if input_data.text is not None else []) + (input_data.texts or [])
+    if not texts:
+        raise HTTPException(status_code=422, detail="Provide text or texts")
+    return {"job_ids": await jobs.submit(texts)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status of a job, and its analysis once done
+    """
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job
+    """
+    job = await jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/techniques")
+async def list_techniques():
+    """
+    Techniques that can be requested, and the ones evaluated by default
+    """
+    return {
+        "techniques": list(analysis_system.techniques),
+        "default": analysis_system.default_techniques,
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Latency, token, failure and admission queue metrics in the Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """
@@ -492,6 +1565,38 @@ async def health_check():
     """
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness endpoint, answers 503 until the model clients are built and warm, and while shutting down
+    """
+    if not startup.is_ready():
+        raise HTTPException(status_code=503, detail=startup.stats())
+    return {"status": "ready", **startup.stats()}
+
+@app.get("/stats")
+async def stats():
+    """
+    Internal counters and gauges of the service
+    """
+    return {
+        "startup": startup.stats(),
+        "admission": admission.stats(),
+        "url_fetcher": url_fetcher.stats(),
+        "cache": analysis_system.cache.stats(),
+        "near_duplicates": analysis_system.near_duplicates.stats(),
+        "prefilter": analysis_system.prefilter.stats(),
+        "prompts": token_stats(),
+        "hedging": analysis_system.hedger.stats(),
+        "cascade": {
+            "screened_techniques": analysis_system.screened_techniques,
+            "escalated_techniques": analysis_system.escalated_techniques,
+        },
+        "rate_limits": analysis_system.rate_limiters.stats(),
+        "jobs": jobs.stats(),
+        "disconnects": disconnects.stats(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8081)
\ No newline at end of file
@@ -0,0 +1,253 @@
+import os
+import re
+import ast
+import json
+import random
+import asyncio
+import hashlib
+import importlib
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from alignment import split_sentences
+from logger import get_logger
+
+log = get_logger()
+
+
+def create_chat_model(model: str) -> BaseChatModel:
+    """
+    Chat model client for a model name. LLM_BACKEND selects the backend: 'gemini' (default),
+    'fake' for the offline FakeChatModel, or the 'module:Class' path of a custom chat model
+    built with the model name.
+    """
+    backend = os.getenv('LLM_BACKEND', 'gemini')
+    if backend == 'gemini':
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model=model,
+            temperature=0,
+            max_tokens=None,
+            timeout=None,
+            # Retries are paced by the rate limiter instead
+            max_retries=0
+        )
+    if backend == 'fake':
+        return FakeChatModel.from_env(model)
+    module_name, _, class_name = backend.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)(model=model)
+
+
+def with_json_output(llm: BaseChatModel):
+    """The model asked for JSON only responses, when its backend has a native JSON mode."""
+    if type(llm).__name__ == 'ChatGoogleGenerativeAI':
+        return llm.bind(generation_config={'response_mime_type': 'application/json'})
+    return llm
+
+
+# Named like the provider errors so the rate limiter throttles and retries on them the same way
+class ResourceExhausted(Exception):
+    code = 429
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """
+    Draw a latency in seconds from a distribution spec: 'constant:s', 'uniform:low,high',
+    'normal:mean,stddev' or 'lognormal:median,sigma'.
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',') if value]
+    if kind == 'constant':
+        return values[0]
+    if kind == 'uniform':
+        return rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return values[0] * rng.lognormvariate(0, values[1])
+    raise ValueError(f'Unknown latency distribution: {spec}')
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for the model, for load tests and benchmarks. It recognizes the
+    prompts of the agents and answers them with canned JSON shaped like real responses,
+    after a latency drawn from a distribution. A share of the calls fail with throttling
+    or transient errors, and a share of the responses are malformed.
+
+    Everything is derived from the prompt and the number of times it was sent, so runs
+    are reproducible whatever the order of the concurrent calls.
+    """
+
+    model: str = 'fake'
+    latency: str = 'lognormal:2.0,0.5'
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    # Share of the responses sent with a preamble and cut short, as models sometimes do
+    malformed_rate: float = 0.0
+    # Share of the (argument, technique) pairs reported as manipulative
+    hit_rate: float = 0.3
+    # Output tokens reported in the usage metadata, 0 estimates them from the response
+    output_tokens: int = 0
+    max_arguments: int = 8
+    seed: int = 0
+    calls: int = 0
+    _attempts: dict = {}
+
+    @classmethod
+    def from_env(cls, model: str) -> 'FakeChatModel':
+        """Configured by the FAKE_LLM_* variables."""
+        return cls(
+            model=model,
+            latency=os.getenv('FAKE_LLM_LATENCY', 'lognormal:2.0,0.5'),
+            throttle_rate=float(os.getenv('FAKE_LLM_THROTTLE_RATE', '0')),
+            error_rate=float(os.getenv('FAKE_LLM_ERROR_RATE', '0')),
+            malformed_rate=float(os.getenv('FAKE_LLM_MALFORMED_RATE', '0')),
+            hit_rate=float(os.getenv('FAKE_LLM_HIT_RATE', '0.3')),
+            output_tokens=int(os.getenv('FAKE_LLM_OUTPUT_TOKENS', '0')),
+            max_arguments=int(os.getenv('FAKE_LLM_MAX_ARGUMENTS', '8')),
+            seed=int(os.getenv('FAKE_LLM_SEED', '0')),
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake'
+
+    def _rng(self, prompt: str) -> random.Random:
+        """Random generator of this attempt at the prompt, retries get a new draw."""
+        digest = hashlib.blake2b(f'{self.seed}\n{self.model}\n{prompt}'.encode('utf-8'), digest_size=8).hexdigest()
+        attempt = self._attempts.get(digest, 0)
+        self._attempts[digest] = attempt + 1
+        return random.Random(f'{digest}:{attempt}')
+
+    def _prepare(self, messages: List[BaseMessage]):
+        prompt = '\n'.join(str(message.content) for message in messages)
+        rng = self._rng(prompt)
+        self.calls += 1
+        return prompt, rng, sample_latency(self.latency, rng)
+
+    def _result(self, prompt: str, rng: random.Random) -> ChatResult:
+        draw = rng.random()
+        if draw < self.throttle_rate:
+            raise ResourceExhausted('429 fake quota exceeded')
+        if draw < self.throttle_rate + self.error_rate:
+            raise ServiceUnavailable('503 fake service unavailable')
+
+        content = '```json\n' + json.dumps(self._respond(prompt, rng), ensure_ascii=False) + '\n```'
+        if rng.random() < self.malformed_rate:
+            content = 'Here is the analysis:\n' + content[:int(len(content) * rng.uniform(0.5, 0.95))]
+        input_tokens = len(prompt) // 4
+        output_tokens = self.output_tokens or len(content) // 4
+        message = AIMessage(content=content, usage_metadata={
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt, rng, latency = self._prepare(messages)
+        time.sleep(latency)
+        return self._result(prompt, rng)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt, rng, latency = self._prepare(messages)
+        await asyncio.sleep(latency)
+        return self._result(prompt, rng)
+
+    def _respond(self, prompt: str, rng: random.Random) -> dict:
+        """Canned answer to the agent prompt recognized in the text sent."""
+        if 'expert argument analysis agent' in prompt:
+            return self._arguments(_section(prompt, '### TEXT', '### OUTPUT'))
+        if 'numbered sentences' in prompt:
+            return self._findings(_section(prompt, '### TEXT', '### OUTPUT'), rng)
+
+        arguments = _arguments_of(prompt)
+        names = re.search(r'technique name listed above \(([^)]*)\)', prompt)
+        if 'Screen the text for each' in prompt and names:
+            return {
+                name.strip(): [
+                    {'argument_id': argument.get('id'), 'verdict': rng.choice(['yes', 'no', 'no', 'uncertain'])}
+                    for argument in arguments
+                ]
+                for name in names.group(1).split(',')
+            }
+        if names:
+            return {name.strip(): self._technique(arguments, rng) for name in names.group(1).split(',')}
+        return self._technique(arguments, rng)
+
+    def _arguments(self, text: str) -> dict:
+        sentences = split_sentences(text) or [text.strip()]
+        return {
+            'main_hypothesis': sentences[0][:200],
+            'arguments': [
+                {
+                    '_type': 'primary' if i == 0 else 'secondary',
+                    'statement': sentence[:200],
+                    'connection_to_hypothesis': 'Supports the main hypothesis'
+                }
+                for i, sentence in enumerate(sentences[1:self.max_arguments + 1] or sentences[:1])
+            ]
+        }
+
+    def _technique(self, arguments: List[dict], rng: random.Random) -> dict:
+        results = []
+        for argument in arguments:
+            found = rng.random() < self.hit_rate
+            statement = str(argument.get('statement', ''))
+            results.append({
+                'argument_id': argument.get('id'),
+                'argument_text': statement,
+                'contains_manipulation': found,
+                'manipulations': [{
+                    'instance': ' '.join(statement.split()[:6]),
+                    'explanation': 'The statement relies on this technique to convince the reader.'
+                }] if found else []
+            })
+        return {'main_thesis': '', 'arguments': results}
+
+    def _findings(self, sentences: str, rng: random.Random) -> dict:
+        findings = []
+        for line in sentences.splitlines():
+            match = re.match(r'\s*\[(\d+)\]\s*(.*)', line)
+            if match and rng.random() < self.hit_rate:
+                findings.append({
+                    'sentence_id': int(match.group(1)),
+                    'instance': ' '.join(match.group(2).split()[:6]),
+                    'explanation': 'The sentence relies on this technique to convince the reader.'
+                })
+        return {'findings': findings}
+
+
+def _section(prompt: str, start: str, end: str) -> str:
+    _, _, rest = prompt.partition(start)
+    return rest.partition(end)[0].strip()
+
+
+def _arguments_of(prompt: str) -> List[dict]:
+    """
+    Arguments sent to a technique prompt, as `A1: statement` lines or rendered from the
+    argument analysis dict.
+    """
+    match = re.search(r'arguments: (.*?)\s*### OUTPUT', prompt, re.DOTALL)
+    if match is None:
+        return []
+    if not match.group(1).startswith('{'):
+        return [
+            {'id': line.group(1), 'statement': line.group(2)}
+            for line in re.finditer(r'^\s*(A\d+): (.*)$', match.group(1), re.MULTILINE)
+        ]
+    try:
+        argument_analysis = ast.literal_eval(match.group(1))
+    except (ValueError, SyntaxError):
+        log.error('fake model could not read the arguments of the prompt')
+        return []
+    return [argument for argument in argument_analysis.get('arguments', []) if isinstance(argument, dict)]
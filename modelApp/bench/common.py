@@ -0,0 +1,87 @@
+"""Shared setup of the benchmarks: offline configuration, synthetic texts and result files."""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import resource
+import subprocess
+from typing import Optional
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Words of the synthetic articles, with cues of the techniques so the pre-filter has something to find
+WORDS = (
+    'the government experts say taxes growth everyone knows percent data because therefore always '
+    'never people economy studies show majority proud nation either choice results trend policy '
+    'citizens research numbers figures leads to future jobs families cities reform budget crisis'
+).split()
+
+
+def setup_offline() -> None:
+    """
+    Configure the service for an offline run before it is imported: the fake model backend
+    and in-memory stores, unless the environment already sets them.
+    """
+    sys.path.insert(0, SERVICE_DIR)
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('GOOGLE_API_KEY', 'offline')
+    os.environ.setdefault('ANALYSIS_CACHE_PATH', '')
+    os.environ.setdefault('DOCUMENT_STORE_PATH', ':memory:')
+    os.environ.setdefault('JOB_STORE_PATH', ':memory:')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def synthetic_text(seed: int, sentences: int = 20) -> str:
+    """A reproducible article of the given number of sentences, distinct for each seed."""
+    rng = random.Random(seed)
+    return ' '.join(
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+        for _ in range(sentences)
+    )
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of the process so far (ru_maxrss is in kilobytes on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(values: list, share: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVICE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(benchmark: str, results: list, output: Optional[str], config: dict) -> None:
+    """
+    Print the results and save them as JSON with the commit and configuration they were
+    measured with, to bench/results/<benchmark>-<commit>.json unless an output path is given.
+    """
+    commit = git_commit()
+    report = {
+        'benchmark': benchmark,
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'config': config,
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(os.path.join(SERVICE_DIR, 'bench', 'results'), exist_ok=True)
+        output = os.path.join(SERVICE_DIR, 'bench', 'results', f'{benchmark}-{commit or "unknown"}.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f'results saved to {output}')
@@ -0,0 +1,68 @@
+"""
+Compare two result files of the same benchmark, e.g. measured on two commits, and
+exit with status 1 when a metric regressed by more than the threshold.
+
+    python bench/compare.py bench/results/load-abc123.json bench/results/load-def456.json
+"""
+import sys
+import json
+import argparse
+
+# Metrics where a higher value is better, every other numeric metric is better lower
+HIGHER_IS_BETTER = ('throughput_rps',)
+# Fields identifying a result within a file rather than measuring it
+KEYS = ('benchmark', 'backend', 'concurrency', 'arguments', 'requests')
+# Fields reported for information only
+IGNORED = ('statuses',)
+
+
+def flatten(result: dict, prefix: str = '') -> dict:
+    values = {}
+    for name, value in result.items():
+        if name in IGNORED:
+            continue
+        if isinstance(value, dict):
+            values.update(flatten(value, f'{prefix}{name}.'))
+        elif isinstance(value, (int, float)) and name not in KEYS:
+            values[f'{prefix}{name}'] = value
+    return values
+
+
+def result_key(result: dict) -> tuple:
+    return tuple((name, result[name]) for name in KEYS if name in result)
+
+
+def main(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f'{baseline["benchmark"]}: {baseline.get("commit")} -> {candidate.get("commit")}')
+    baseline_results = {result_key(result): flatten(result) for result in baseline['results']}
+    regressions = 0
+    for result in candidate['results']:
+        key = result_key(result)
+        before = baseline_results.get(key)
+        if before is None:
+            continue
+        label = ' '.join(f'{name}={value}' for name, value in key)
+        for metric, value in flatten(result).items():
+            if metric not in before or not before[metric]:
+                continue
+            change = (value - before[metric]) / before[metric]
+            worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+            flag = ''
+            if worse > args.threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f'{label:40} {metric:28} {before[metric]:>12} -> {value:>12} {change:+8.1%}{flag}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,89 @@
+"""
+Load test of /analyze against the fake model backend, in process.
+
+Drives the endpoint at fixed concurrency levels and reports per level the throughput,
+the latency percentiles, the LLM calls per request and the peak memory. Every request
+sends a distinct text, so caches and single-flight do not hide the analysis cost.
+The service is configured by the usual environment variables, and the fake model by
+FAKE_LLM_LATENCY, FAKE_LLM_ERROR_RATE, FAKE_LLM_THROTTLE_RATE, FAKE_LLM_HIT_RATE...
+
+    python bench/load.py --concurrency 1,4,16 --requests 50
+"""
+import os
+import time
+import asyncio
+import argparse
+
+from common import peak_rss_mb, percentile, setup_offline, synthetic_text, write_results
+
+
+def llm_calls(system) -> int:
+    agents = [system.argument_agent, system.manipulation_agent, system.screening_agent]
+    # Agents of the same model may share a client, count each one once
+    clients = {id(agent.llm): agent.llm for agent in agents if agent is not None}
+    return sum(getattr(client, 'calls', 0) for client in clients.values())
+
+
+async def run_level(client, system, concurrency: int, requests: int, sentences: int, seed: int) -> dict:
+    latencies, statuses = [], {}
+    pending = iter(range(requests))
+    calls_before = llm_calls(system)
+
+    async def worker():
+        for i in pending:
+            start = time.perf_counter()
+            response = await client.post('/analyze', json={'text': synthetic_text(seed + i, sentences)})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(requests / elapsed, 3),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99': round(percentile(latencies, 0.99) * 1000, 1),
+            'max': round(max(latencies) * 1000, 1),
+        },
+        'llm_calls_per_request': round((llm_calls(system) - calls_before) / requests, 2),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+async def main(args) -> list:
+    import httpx
+    import app
+
+    results = []
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        for level, concurrency in enumerate(args.concurrency):
+            # Each level gets its own texts, none of them is cached by a previous level
+            seed = args.seed + level * args.requests
+            results.append(await run_level(client, app.analysis_system, concurrency, args.requests, args.sentences, seed))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=lambda value: [int(level) for level in value.split(',')], default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=50, help='requests per concurrency level')
+    parser.add_argument('--sentences', type=int, default=20, help='sentences of the synthetic texts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON result file, bench/results/load-<commit>.json by default')
+    args = parser.parse_args()
+
+    setup_offline()
+    results = asyncio.run(main(args))
+    config = {
+        name: value for name, value in sorted(os.environ.items())
+        if name.startswith(('LLM_', 'FAKE_LLM_', 'ANALYSIS_', 'ADMISSION_', 'TECHNIQUE_', 'PREFILTER', 'SCREENING_'))
+    }
+    config.update(requests=args.requests, sentences=args.sentences, seed=args.seed)
+    write_results('load', results, args.output, config)
@@ -0,0 +1,89 @@
+"""
+Microbenchmarks of the CPU bound steps of an analysis, raw_data_to_api_format and
+get_score_details, on synthetic analyses with many arguments.
+
+    python bench/micro.py --arguments 10,100,1000
+"""
+import copy
+import time
+import random
+import argparse
+import statistics
+
+from common import setup_offline, write_results
+
+
+def synthetic_raw_analysis(techniques: list, arguments: int, hit_rate: float, seed: int) -> dict:
+    """A raw analysis, as merged from the model responses, of the given number of arguments."""
+    rng = random.Random(seed)
+    statements = [f'Argument {i} states that policy {rng.randint(0, 10 ** 6)} has effects' for i in range(arguments)]
+    raw = {
+        'argument_analysis': {
+            'main_hypothesis': 'The policy should be adopted',
+            'arguments': [
+                {'id': f'A{i + 1}', '_type': 'primary', 'statement': statement, 'connection_to_hypothesis': 'supports'}
+                for i, statement in enumerate(statements)
+            ]
+        }
+    }
+    for name in techniques:
+        raw[name] = {'model': 'fake', 'arguments': [
+            {
+                'argument_id': f'A{i + 1}',
+                'argument_text': statement,
+                'contains_manipulation': True,
+                'manipulations': [{'instance': statement[:20], 'explanation': 'synthetic'}]
+            }
+            for i, statement in enumerate(statements) if rng.random() < hit_rate
+        ]}
+    return raw
+
+
+def measure(fn, inputs: list) -> dict:
+    """Time fn on each input, in milliseconds per call."""
+    timings = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def main(args) -> list:
+    import app
+    from score import get_score_details
+
+    system = app.analysis_system
+    results = []
+    for arguments in args.arguments:
+        raw = synthetic_raw_analysis(system.default_techniques, arguments, args.hit_rate, args.seed)
+        # raw_data_to_api_format consumes its input, every run gets a copy made beforehand
+        format_inputs = [copy.deepcopy(raw) for _ in range(args.repeat)]
+        analysis = system.raw_data_to_api_format(copy.deepcopy(raw))
+        results.append({
+            'benchmark': 'raw_data_to_api_format', 'arguments': arguments,
+            **measure(system.raw_data_to_api_format, format_inputs)
+        })
+        results.append({
+            'benchmark': 'get_score_details', 'arguments': arguments,
+            **measure(get_score_details, [analysis] * args.repeat)
+        })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arguments', type=lambda value: [int(count) for count in value.split(',')], default=[10, 100, 1000])
+    parser.add_argument('--hit-rate', type=float, default=0.3, help='share of the arguments each technique is found in')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON result file, bench/results/micro-<commit>.json by default')
+    args = parser.parse_args()
+
+    setup_offline()
+    results = main(args)
+    write_results('micro', results, args.output, {'hit_rate': args.hit_rate, 'repeat': args.repeat, 'seed': args.seed})
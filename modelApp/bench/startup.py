@@ -0,0 +1,93 @@
+"""
+Startup benchmark: how long a fresh replica takes to import the service, to report
+ready once warmed up, and to serve its first request compared to the next ones.
+
+Each run starts a new interpreter, so module imports and client construction are
+measured cold. Requests are only sent with the fake backend, the others are measured
+up to readiness, without network calls unless WARMUP_MODEL_CALLS is set.
+
+    python bench/startup.py --backends fake,gemini --runs 5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+from common import peak_rss_mb, setup_offline, synthetic_text, write_results
+
+
+async def child(backend: str) -> dict:
+    """Measured in the fresh interpreter: import, warm-up through the lifespan, first requests."""
+    os.environ['LLM_BACKEND'] = backend
+    os.environ.setdefault('FAKE_LLM_LATENCY', 'constant:0')
+    setup_offline()
+    import httpx
+    import app
+
+    measures = {'import_seconds': app.startup.import_seconds}
+    async with app.app.router.lifespan_context(app.app):
+        while not app.startup.is_ready():
+            if app.startup.error:
+                raise RuntimeError(f'warm-up failed: {app.startup.error}')
+            await asyncio.sleep(0.005)
+        measures['ready_at'] = time.time()
+        measures['ready_seconds'] = app.startup.ready_seconds
+        measures['warm_up_seconds'] = round(app.startup.ready_seconds - app.startup.import_seconds, 3)
+
+        if backend == 'fake':
+            transport = httpx.ASGITransport(app=app.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+                latencies = []
+                for i in range(3):
+                    start = time.perf_counter()
+                    response = await client.post('/analyze', json={'text': synthetic_text(i)})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+            measures['first_request_ms'] = round(latencies[0] * 1000, 1)
+            measures['warm_request_ms'] = round(statistics.median(latencies[1:]) * 1000, 1)
+    measures['peak_rss_mb'] = peak_rss_mb()
+    return measures
+
+
+def run_once(backend: str) -> dict:
+    started_at = time.time()
+    completed = subprocess.run(
+        [sys.executable, __file__, '--child', backend], capture_output=True, text=True, check=True
+    )
+    measures = json.loads(completed.stdout.strip().splitlines()[-1])
+    # From the process start, interpreter startup included
+    measures['process_to_ready_seconds'] = round(measures.pop('ready_at') - started_at, 3)
+    return measures
+
+
+def main(args) -> list:
+    results = []
+    for backend in args.backends:
+        runs = [run_once(backend) for _ in range(args.runs)]
+        results.append({
+            'backend': backend,
+            **{name: round(statistics.median(run[name] for run in runs), 3) for name in runs[0]}
+        })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', type=lambda value: value.split(','), default=['fake', 'gemini'])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per backend, the median is reported')
+    parser.add_argument('--output', help='JSON result file, bench/results/startup-<commit>.json by default')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child(args.child))))
+        sys.exit(0)
+    setup_offline()
+    results = main(args)
+    config = {name: value for name, value in sorted(os.environ.items()) if name.startswith(('WARMUP_', 'FAKE_LLM_'))}
+    config.update(runs=args.runs)
+    write_results('startup', results, args.output, config)
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from logger import get_logger
+
+log = get_logger()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text before hashing so that trivially different copies of the
+    same article (unicode forms, whitespace, line endings) share a cache key.
+    """
+    text = unicodedata.normalize('NFC', text)
+    return ' '.join(text.split())
+
+
+def content_key(text: str, version: str) -> str:
+    """Build a content-addressed key from the normalized text and the prompts version."""
+    digest = hashlib.sha256()
+    digest.update(version.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def stage_key(*parts: str) -> str:
+    """Build a key for one stage of the analysis from everything its result depends on."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """In-memory LRU cache with a maximum size and a time to live per entry."""
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, created_at: Optional[float] = None) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, created_at if created_at is not None else time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Persistent cache tier stored in a local SQLite file, survives restarts."""
+
+    def __init__(self, path: str, ttl: Optional[float] = None, table: str = 'cache'):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT value, created_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and time.time() - row[1] > self.ttl:
+                with self._conn:
+                    self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                return None
+            return row
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)',
+                (key, value, time.time())
+            )
+
+
+class AnalysisCache:
+    """
+    Two tier cache for analysis results: an in-memory LRU in front of an
+    optional SQLite file. Values are stored as JSON so callers always get
+    a fresh copy they are free to mutate.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = None, path: Optional[str] = None, table: str = 'cache'):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.disk = SQLiteCache(path, ttl=ttl, table=table) if path else None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, prefix: str = 'ANALYSIS_CACHE', table: str = 'cache', max_size: int = 256) -> 'AnalysisCache':
+        """
+        Build the cache from <prefix>_MAX_SIZE and <prefix>_TTL environment variables.
+        All caches share the SQLite file of ANALYSIS_CACHE_PATH, each in its own table.
+        """
+        ttl = float(os.getenv(f'{prefix}_TTL', os.getenv('ANALYSIS_CACHE_TTL', '86400')))
+        return cls(
+            max_size=int(os.getenv(f'{prefix}_MAX_SIZE', str(max_size))),
+            ttl=ttl if ttl > 0 else None,
+            path=os.getenv('ANALYSIS_CACHE_PATH', 'analysis_cache.sqlite3') or None,
+            table=table,
+        )
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            row = await asyncio.to_thread(self.disk.get, key)
+            if row is not None:
+                value = row[0]
+                self.memory.set(key, value, created_at=row[1])
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def set(self, key: str, result: dict) -> None:
+        value = json.dumps(result)
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value)
+            except sqlite3.Error as e:
+                log.error(f'Failed to persist cache entry {key}: {str(e)}')
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_entries': len(self.memory),
+        }
@@ -0,0 +1,126 @@
+import re
+from typing import Dict, List
+
+from logger import get_logger
+from alignment import split_sentences, tokenize
+
+log = get_logger()
+
+PARAGRAPH_BOUNDARY = re.compile(r'\n\s*\n')
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Non empty paragraphs of a text, separated by blank lines."""
+    return [paragraph.strip() for paragraph in PARAGRAPH_BOUNDARY.split(text) if paragraph.strip()]
+
+
+def split_into_chunks(text: str, max_chars: int) -> List[str]:
+    """
+    Split a text into chunks of at most max_chars characters, on paragraph boundaries,
+    falling back to sentence boundaries for paragraphs that are too long on their own.
+    """
+    pieces = []
+    for paragraph in split_paragraphs(text):
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(split_sentences(paragraph))
+
+    chunks, current = [], ''
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f'{current}\n\n{piece}' if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _similarity(first: set, second: set) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def merge_raw_analyses(chunk_analyses: List[dict], duplicate_threshold: float = 0.8) -> dict:
+    """
+    Merge the raw analyses of the chunks of a text into a single raw analysis.
+
+    The thesis is taken from the first chunk that has one (usually the lede), arguments
+    are deduplicated across chunks by word overlap and renumbered, and the technique
+    results of a dropped duplicate are attached to the argument that was kept.
+    """
+    valid = [
+        analysis for analysis in chunk_analyses
+        if isinstance(analysis.get('argument_analysis'), dict) and 'error' not in analysis['argument_analysis']
+    ]
+    if not valid:
+        # Nothing usable, surface the first failure as is
+        return chunk_analyses[0]
+    if len(valid) < len(chunk_analyses):
+        log.error(f'{len(chunk_analyses) - len(valid)} chunks failed the argument analysis')
+
+    main_hypothesis = next(
+        (analysis['argument_analysis'].get('main_hypothesis') for analysis in valid
+         if analysis['argument_analysis'].get('main_hypothesis')),
+        ''
+    )
+
+    arguments, kept_words = [], []
+    # Per chunk, maps the argument ids of the chunk to the merged argument
+    chunk_ids: List[Dict[str, dict]] = []
+    for analysis in valid:
+        ids = {}
+        for argument in analysis['argument_analysis'].get('arguments', []):
+            if not isinstance(argument, dict):
+                continue
+            words = tokenize(argument.get('statement', ''))
+            duplicate_of = next(
+                (index for index, kept in enumerate(kept_words) if _similarity(words, kept) >= duplicate_threshold),
+                None
+            )
+            if duplicate_of is None:
+                merged_argument = {**argument, 'id': f'A{len(arguments) + 1}'}
+                arguments.append(merged_argument)
+                kept_words.append(words)
+            else:
+                merged_argument = arguments[duplicate_of]
+            ids[argument.get('id')] = merged_argument
+        chunk_ids.append(ids)
+
+    merged = {
+        'argument_analysis': {'main_hypothesis': main_hypothesis, 'arguments': arguments},
+        # A failed chunk reports its techniques as not evaluated, the merged analysis is partial
+        'not_evaluated': sorted({name for analysis in chunk_analyses for name in analysis.get('not_evaluated', [])}),
+    }
+    techniques = {
+        name for analysis in valid for name in analysis
+        if name not in ('argument_analysis', 'not_evaluated')
+    }
+    for name in techniques:
+        technique_arguments, unmatched, models = [], [], set()
+        for analysis, ids in zip(valid, chunk_ids):
+            result = analysis.get(name)
+            if not isinstance(result, dict) or not isinstance(result.get('arguments'), list):
+                continue
+            unmatched.extend(result.get('unmatched', []))
+            if result.get('model'):
+                models.add(result['model'])
+            for raw_argument in result['arguments']:
+                if not isinstance(raw_argument, dict):
+                    continue
+                argument_id = raw_argument.get('argument_id')
+                merged_argument = ids.get(argument_id) if isinstance(argument_id, str) else None
+                if merged_argument is not None:
+                    raw_argument = {
+                        **raw_argument,
+                        'argument_id': merged_argument['id'],
+                        'argument_text': merged_argument.get('statement', '')
+                    }
+                else:
+                    # Ids are only unique within a chunk, fall back to matching on the statement
+                    raw_argument = {key: value for key, value in raw_argument.items() if key != 'argument_id'}
+                technique_arguments.append(raw_argument)
+        merged[name] = {'arguments': technique_arguments, 'unmatched': unmatched, 'model': ', '.join(sorted(models))}
+    return merged
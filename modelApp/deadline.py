@@ -0,0 +1,171 @@
+import time
+import asyncio
+from contextvars import ContextVar
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class Deadline:
+    """A request level time budget, None means no deadline."""
+
+    def __init__(self, budget: Optional[float] = None):
+        self.expires_at = time.monotonic() + budget if budget else None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def share(self, fraction: float) -> Optional[float]:
+        """Part of the remaining budget allotted to a stage."""
+        remaining = self.remaining()
+        return None if remaining is None else remaining * fraction
+
+
+async def gather_or_cancel(*calls: Awaitable[Any]) -> List[Any]:
+    """
+    Run the calls concurrently like asyncio.gather, except that the first failure cancels
+    the calls still running.
+    """
+    tasks = [asyncio.ensure_future(call) for call in calls]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class CallTimer:
+    """
+    Time the provider calls of an attempt spent in flight, without the time they waited
+    in the rate limiter. The rate limiter reports to the timer of the current context.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._started_at: Optional[float] = None
+
+    def start(self) -> None:
+        self._started_at = time.monotonic()
+
+    def stop(self) -> None:
+        if self._started_at is not None:
+            self.seconds += time.monotonic() - self._started_at
+            self._started_at = None
+
+    def elapsed(self) -> float:
+        running = time.monotonic() - self._started_at if self._started_at is not None else 0.0
+        return self.seconds + running
+
+
+_call_timer: ContextVar[Optional[CallTimer]] = ContextVar('call_timer', default=None)
+
+
+async def in_flight(fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Run a provider call, counting its time on the call timer of the current context, if any."""
+    timer = _call_timer.get()
+    if timer is None:
+        return await fn()
+    timer.start()
+    try:
+        return await fn()
+    finally:
+        timer.stop()
+
+
+class Hedger:
+    """
+    Issue a duplicate call when the first one has been in flight longer than a latency
+    percentile of the previous calls for the same key, and keep whichever finishes first.
+    Only provider latency counts, so queueing under load does not trigger hedges, and
+    hedges are paced by a budget of max_ratio of the calls so they cannot double the load.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 200,
+        max_ratio: float = 0.05,
+        burst: float = 5
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        # Hedges allowed, earned at max_ratio per call up to burst
+        self._budget = burst
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_denied = 0
+
+    def record(self, key: str, seconds: float) -> None:
+        self._latencies[key].append(seconds)
+
+    def delay(self, key: str) -> Optional[float]:
+        """In-flight time after which a call for this key is hedged, None until enough samples are known."""
+        if not self.percentile:
+            return None
+        latencies = self._latencies[key]
+        if len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    def _take_hedge(self) -> bool:
+        if self._budget < 1:
+            self.hedges_denied += 1
+            return False
+        self._budget -= 1
+        self.hedges += 1
+        return True
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        async def attempt(timer: CallTimer):
+            _call_timer.set(timer)
+            result = await fn()
+            self.record(key, timer.elapsed())
+            return result
+
+        self.calls += 1
+        self._budget = min(self.burst, self._budget + self.max_ratio)
+        timer = CallTimer()
+        first = asyncio.ensure_future(attempt(timer))
+        attempts = [first]
+        try:
+            delay = self.delay(key)
+            while delay is not None and not first.done():
+                # Time waiting for the rate limiter does not count, wait again for what is left
+                remaining = delay - timer.elapsed()
+                if remaining <= 0:
+                    if self._take_hedge():
+                        attempts.append(asyncio.ensure_future(attempt(CallTimer())))
+                    break
+                await asyncio.wait(attempts, timeout=remaining)
+
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedges_denied': self.hedges_denied,
+        }
@@ -0,0 +1,94 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request
+
+from logger import get_logger
+
+log = get_logger()
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its analysis was done."""
+
+
+class _CallTally:
+    """LLM calls made on behalf of one request, shared by all the tasks it spawns."""
+
+    def __init__(self, watcher: 'DisconnectWatcher'):
+        self.watcher = watcher
+        self.completed = 0
+        self.disconnected = False
+
+
+_current_tally: ContextVar[Optional[_CallTally]] = ContextVar('current_tally', default=None)
+
+
+async def tracked_call(call: Awaitable[Any]) -> Any:
+    """Await an LLM call, counting it against the request it is made for."""
+    tally = _current_tally.get()
+    if tally is None:
+        return await call
+    try:
+        result = await call
+    except asyncio.CancelledError:
+        if tally.disconnected:
+            tally.watcher.saved_calls += 1
+        raise
+    except Exception:
+        tally.completed += 1
+        raise
+    tally.completed += 1
+    return result
+
+
+class DisconnectWatcher:
+    """
+    Run a request's work as a task and cancel it when the client disconnects, which
+    cancels its whole task tree. Work shared through the single-flight layer keeps
+    running as long as other requests wait for it.
+
+    Calls that completed before the disconnect are counted as wasted, calls cancelled
+    because of it as saved.
+    """
+
+    def __init__(self, poll_interval: float = 0.5):
+        self.poll_interval = poll_interval
+        self.disconnects = 0
+        self.wasted_calls = 0
+        self.saved_calls = 0
+
+    async def run(self, request: Request, fn: Callable[[], Awaitable[Any]]) -> Any:
+        tally = _CallTally(self)
+        token = _current_tally.set(tally)
+        try:
+            task = asyncio.ensure_future(fn())
+        finally:
+            _current_tally.reset(token)
+
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.poll_interval)
+                if done:
+                    return task.result()
+                if await request.is_disconnected():
+                    break
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        self.disconnects += 1
+        self.wasted_calls += tally.completed
+        tally.disconnected = True
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        log.debug('client disconnected after %d calls, analysis cancelled', tally.completed)
+        raise ClientDisconnected()
+
+    def stats(self) -> dict:
+        return {
+            'disconnects': self.disconnects,
+            'wasted_calls': self.wasted_calls,
+            'saved_calls': self.saved_calls,
+        }
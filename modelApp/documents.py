@@ -0,0 +1,98 @@
+import json
+import time
+import sqlite3
+import threading
+from typing import List
+
+from cache import normalize_text
+
+
+class DocumentStore:
+    """
+    Last analyzed version of each document (e.g. an article URL) in a local SQLite file:
+    its paragraphs grouped in regions, with the raw analysis of each region. Only the
+    max_documents most recently analyzed documents are kept.
+    """
+
+    def __init__(self, path: str, max_documents: int = 10000):
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                'id TEXT PRIMARY KEY, version TEXT NOT NULL, regions TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS documents_updated_at ON documents (updated_at)')
+
+    def get(self, document_id: str, version: str) -> List[dict]:
+        """Regions of the document, empty when unknown or analyzed with other prompts."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT version, regions FROM documents WHERE id = ?', (document_id,)
+            ).fetchone()
+        if row is None or row[0] != version:
+            return []
+        return json.loads(row[1])
+
+    def set(self, document_id: str, version: str, regions: List[dict]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO documents (id, version, regions, updated_at) VALUES (?, ?, ?, ?)',
+                (document_id, version, json.dumps(regions), time.time())
+            )
+            # Evict the least recently analyzed documents beyond the cap
+            self._conn.execute(
+                'DELETE FROM documents WHERE updated_at < ('
+                'SELECT updated_at FROM documents ORDER BY updated_at DESC LIMIT 1 OFFSET ?)',
+                (self.max_documents - 1,)
+            )
+
+
+def _group_paragraphs(paragraphs: List[str], max_chars: int) -> List[List[str]]:
+    groups, size = [], 0
+    for paragraph in paragraphs:
+        if groups and size + len(paragraph) <= max_chars:
+            groups[-1].append(paragraph)
+            size += len(paragraph)
+        else:
+            groups.append([paragraph])
+            size = len(paragraph)
+    return groups
+
+
+def plan_regions(paragraphs: List[str], prior_regions: List[dict], max_chars: int) -> List[dict]:
+    """
+    Split the paragraphs of a new version of a document into regions. Runs of paragraphs
+    identical to a region of the prior version keep that region and its raw analysis,
+    the remaining paragraphs are grouped in new regions of up to max_chars characters
+    with no analysis yet. An edit only invalidates the region it falls in.
+    """
+    normalized = [normalize_text(paragraph) for paragraph in paragraphs]
+    by_first_paragraph = {}
+    for region in prior_regions:
+        key = [normalize_text(paragraph) for paragraph in region['paragraphs']]
+        by_first_paragraph.setdefault(key[0], []).append((key, region))
+
+    regions, changed = [], []
+
+    def flush_changed():
+        regions.extend({'paragraphs': group, 'raw': None} for group in _group_paragraphs(changed, max_chars))
+        changed.clear()
+
+    i = 0
+    while i < len(paragraphs):
+        match = next(
+            (region for key, region in by_first_paragraph.get(normalized[i], [])
+             if normalized[i:i + len(key)] == key),
+            None
+        )
+        if match is None:
+            changed.append(paragraphs[i])
+            i += 1
+        else:
+            flush_changed()
+            regions.append(match)
+            i += len(match['paragraphs'])
+    flush_changed()
+    return regions
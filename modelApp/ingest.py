@@ -0,0 +1,325 @@
+import os
+import re
+import time
+import socket
+import asyncio
+import ipaddress
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import httpx
+
+from cache import AnalysisCache, stage_key
+from singleflight import SingleFlight
+from logger import get_logger
+
+log = get_logger()
+
+# Elements that never hold article text
+SKIP_TAGS = {
+    'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'object',
+    'nav', 'header', 'footer', 'aside', 'form', 'button', 'select', 'menu', 'dialog',
+}
+# Class or id of the page furniture around the article
+BOILERPLATE = re.compile(
+    r'nav|menu|footer|header|sidebar|comment|share|social|promo|advert|\bads?\b|sponsor|cookie|consent|'
+    r'banner|related|recommend|subscribe|newsletter|breadcrumb|popup|modal|paywall|signup|widget',
+    re.IGNORECASE
+)
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'blockquote', 'pre', 'table', 'tr', 'td',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'br', 'hr', 'figcaption', 'dd', 'dt',
+}
+HEADINGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class _Block:
+    def __init__(self, tag: str, in_main: bool):
+        self.tag = tag
+        self.in_main = in_main
+        self.parts: List[str] = []
+        self.link_chars = 0
+
+
+class MainTextExtractor(HTMLParser):
+    """
+    Split a page into text blocks, leaving out the elements that hold navigation, ads,
+    footers and other page furniture. Blocks inside <article> or <main> are flagged.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Tuple[str, str, float, bool]] = []
+        # Tag of the skipped element being read and how many of that tag are open in it
+        self._skip: Optional[Tuple[str, int]] = None
+        self._main_depth = 0
+        self._link_depth = 0
+        self._block = _Block('', False)
+
+    def _flush(self, tag: str) -> None:
+        text = ' '.join(''.join(self._block.parts).split())
+        if text:
+            link_density = min(1.0, self._block.link_chars / len(text))
+            self.blocks.append((self._block.tag, text, link_density, self._block.in_main))
+        self._block = _Block(tag, self._main_depth > 0)
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if self._skip is not None:
+            if tag == self._skip[0]:
+                self._skip = (tag, self._skip[1] + 1)
+            return
+        names = ' '.join(value for name, value in attrs if name in ('class', 'id') and value)
+        furniture = tag in SKIP_TAGS or bool(names and BOILERPLATE.search(names))
+        # The header of the article itself holds its headline
+        if self._main_depth and (tag == 'header' or 'header' in names.lower()):
+            furniture = tag in SKIP_TAGS - {'header'}
+        if furniture and tag not in ('html', 'body', 'article', 'main'):
+            if tag not in VOID_TAGS:
+                self._skip = (tag, 1)
+            return
+        if tag in ('article', 'main'):
+            self._main_depth += 1
+        elif tag == 'a':
+            self._link_depth += 1
+        if tag in BLOCK_TAGS:
+            self._flush(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._skip is not None:
+            if tag == self._skip[0]:
+                depth = self._skip[1] - 1
+                self._skip = (tag, depth) if depth else None
+            return
+        if tag == 'a':
+            self._link_depth = max(0, self._link_depth - 1)
+        if tag in BLOCK_TAGS:
+            self._flush('')
+        if tag in ('article', 'main'):
+            self._main_depth = max(0, self._main_depth - 1)
+
+    def handle_data(self, data: str) -> None:
+        if self._skip is not None:
+            return
+        self._block.parts.append(data)
+        if self._link_depth:
+            self._block.link_chars += len(data.strip())
+
+    def close(self) -> None:
+        super().close()
+        self._flush('')
+
+
+def extract_main_text(html: str, min_words: int = 5, max_link_density: float = 0.5) -> str:
+    """
+    Main content of an HTML page as paragraphs separated by blank lines. Page furniture is
+    dropped by element, class and id, then the text of <article> or <main> is preferred when
+    the page has one, and blocks that are mostly links or too short to be prose are dropped.
+    """
+    parser = MainTextExtractor()
+    parser.feed(html)
+    parser.close()
+
+    blocks = parser.blocks
+    if any(in_main for _, _, _, in_main in blocks):
+        blocks = [block for block in blocks if block[3]]
+
+    paragraphs = []
+    for tag, text, link_density, _ in blocks:
+        if link_density > max_link_density:
+            continue
+        if tag not in HEADINGS and len(text.split()) < min_words:
+            continue
+        if paragraphs and paragraphs[-1] == text:
+            continue
+        paragraphs.append(text)
+    return '\n\n'.join(paragraphs)
+
+
+class FetchError(Exception):
+    """Raised when a URL cannot be turned into article text, carries the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_networks(spec: str) -> List[Network]:
+    """Networks of a comma separated list of addresses or CIDR blocks."""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(',') if part.strip()]
+
+
+class URLFetcher:
+    """
+    Fetch articles with a pooled HTTP client and cache their extracted text by URL.
+    A cached page is served as is for fresh_seconds, after that it is revalidated with
+    a conditional GET (ETag, Last-Modified) and only extracted again when it changed.
+    Concurrent requests for the same URL share one fetch.
+
+    URLs come from clients, so only public addresses are fetched: the host of the URL and
+    of every redirect is resolved and rejected when any of its addresses is private,
+    loopback, link-local (e.g. cloud metadata at 169.254.169.254) or otherwise not global,
+    unless it is in allowed_networks. The address actually connected to is checked too,
+    in case the name resolved differently for the connection.
+    """
+
+    def __init__(
+        self,
+        cache: AnalysisCache,
+        fresh_seconds: float = 300,
+        timeout: float = 10,
+        max_bytes: int = 5_000_000,
+        max_connections: int = 20,
+        max_redirects: int = 5,
+        allowed_networks: Optional[List[Network]] = None
+    ):
+        self.cache = cache
+        self.fresh_seconds = fresh_seconds
+        self.max_bytes = max_bytes
+        self.max_redirects = max_redirects
+        self.allowed_networks = allowed_networks or []
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            # Redirects are followed by _open, which checks the address of each hop
+            follow_redirects=False,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={'User-Agent': 'Mozilla/5.0 (compatible; model-service article fetcher)'}
+        )
+        self.inflight = SingleFlight()
+        self.fetches = 0
+        self.fresh_hits = 0
+        self.not_modified = 0
+        self.blocked = 0
+
+    @classmethod
+    def from_env(cls) -> 'URLFetcher':
+        return cls(
+            AnalysisCache.from_env('URL_CACHE', table='url_cache', max_size=1024),
+            fresh_seconds=float(os.getenv('URL_CACHE_FRESH_SECONDS', '300')),
+            timeout=float(os.getenv('URL_FETCH_TIMEOUT', '10')),
+            max_bytes=int(os.getenv('URL_FETCH_MAX_BYTES', '5000000')),
+            max_connections=int(os.getenv('URL_FETCH_MAX_CONNECTIONS', '20')),
+            max_redirects=int(os.getenv('URL_FETCH_MAX_REDIRECTS', '5')),
+            # e.g. an intranet or the egress proxy, fetched although not public
+            allowed_networks=parse_networks(os.getenv('URL_FETCH_ALLOWED_NETWORKS', ''))
+        )
+
+    def _allowed(self, address: str) -> bool:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if any(ip in network for network in self.allowed_networks):
+            return True
+        return ip.is_global and not ip.is_multicast
+
+    async def _check_host(self, url: httpx.URL) -> None:
+        """Reject a URL whose host resolves to an address that is not public."""
+        if url.scheme not in ('http', 'https') or not url.host:
+            raise FetchError(f'Unsupported URL: {url}', 422)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                url.host, url.port or (443 if url.scheme == 'https' else 80), type=socket.SOCK_STREAM
+            )
+        except socket.gaierror as e:
+            raise FetchError(f'Could not resolve {url.host}: {str(e)}')
+        blocked = [info[4][0] for info in infos if not self._allowed(info[4][0])]
+        if blocked:
+            self.blocked += 1
+            log.error(f'{url} blocked, {url.host} resolves to {", ".join(blocked)}')
+            raise FetchError(f'{url} does not resolve to a public address', 422)
+
+    async def _open(self, url: str, headers: dict) -> httpx.Response:
+        """Send the GET and follow its redirects, checking each hop, returns the streamed response."""
+        request = self.client.build_request('GET', url, headers=headers)
+        for _ in range(self.max_redirects + 1):
+            await self._check_host(request.url)
+            response = await self.client.send(request, stream=True)
+            network_stream = response.extensions.get('network_stream')
+            peer = network_stream.get_extra_info('server_addr') if network_stream is not None else None
+            if peer and not self._allowed(peer[0]):
+                await response.aclose()
+                self.blocked += 1
+                log.error(f'{request.url} blocked, connected to {peer[0]}')
+                raise FetchError(f'{request.url} does not resolve to a public address', 422)
+            if response.next_request is None:
+                return response
+            await response.aclose()
+            request = response.next_request
+        raise FetchError(f'{url} redirected more than {self.max_redirects} times')
+
+    async def get_text(self, url: str) -> dict:
+        """The page of the URL: its url after redirects, extracted text and validators."""
+        if urlparse(url).scheme not in ('http', 'https'):
+            raise FetchError(f'Unsupported URL: {url}', 422)
+        return await self.inflight.do(url, lambda: self._get_text(url))
+
+    async def _get_text(self, url: str) -> dict:
+        key = stage_key('url', url)
+        cached = await self.cache.get(key)
+        if cached is not None and time.time() - cached['fetched_at'] < self.fresh_seconds:
+            self.fresh_hits += 1
+            return cached
+
+        headers = {}
+        if cached is not None and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached is not None and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        self.fetches += 1
+        try:
+            response = await self._open(url, headers)
+            try:
+                if response.status_code == 304 and cached is not None:
+                    log.debug('%s not modified', url)
+                    self.not_modified += 1
+                    cached['fetched_at'] = time.time()
+                    await self.cache.set(key, cached)
+                    return cached
+                if response.status_code >= 400:
+                    raise FetchError(f'{url} answered {response.status_code}')
+                content_type = response.headers.get('content-type', 'text/html').split(';')[0].strip().lower()
+                if content_type not in ('text/html', 'application/xhtml+xml', 'text/plain'):
+                    raise FetchError(f'{url} is {content_type}, not an article', 415)
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body.extend(chunk)
+                    if len(body) > self.max_bytes:
+                        raise FetchError(f'{url} is larger than {self.max_bytes} bytes', 413)
+                content = body.decode(response.encoding or 'utf-8', errors='replace')
+                page = {
+                    'url': str(response.url),
+                    'etag': response.headers.get('etag'),
+                    'last_modified': response.headers.get('last-modified'),
+                }
+            finally:
+                await response.aclose()
+        except httpx.InvalidURL as e:
+            raise FetchError(f'Unsupported URL: {url}: {str(e)}', 422)
+        except httpx.HTTPError as e:
+            raise FetchError(f'Could not fetch {url}: {str(e)}')
+
+        if content_type == 'text/plain':
+            page['text'] = content.strip()
+        else:
+            page['text'] = await asyncio.to_thread(extract_main_text, content)
+        if not page['text']:
+            raise FetchError(f'No article text found at {url}', 422)
+        log.debug('%s: %d characters of page, %d of text', url, len(content), len(page['text']))
+        page['fetched_at'] = time.time()
+        await self.cache.set(key, page)
+        return page
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            'fetches': self.fetches,
+            'fresh_hits': self.fresh_hits,
+            'not_modified': self.not_modified,
+            'blocked': self.blocked,
+            'cache': self.cache.stats(),
+        }
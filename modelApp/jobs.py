@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from logger import get_logger
+
+log = get_logger()
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+JSON_FIELDS = ('result', 'partial')
+
+
+class JobStore:
+    """Persistent job records in a local SQLite file, so queued jobs survive restarts."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, text TEXT NOT NULL, '
+                'result TEXT, partial TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def create(self, texts: List[str]) -> List[str]:
+        now = time.time()
+        ids = [uuid.uuid4().hex for _ in texts]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO jobs (id, status, text, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(job_id, QUEUED, text, now, now) for job_id, text in zip(ids, texts)]
+            )
+        return ids
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            cursor = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([column[0] for column in cursor.description], row))
+        for field in JSON_FIELDS:
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def update(self, job_id: str, **fields) -> None:
+        for field in JSON_FIELDS:
+            if field in fields and fields[field] is not None:
+                fields[field] = json.dumps(fields[field])
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{field} = ?' for field in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def unfinished(self) -> List[str]:
+        """Jobs that were queued or running when the service stopped."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at', (QUEUED, RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+# Analysis system of a worker process, built once per process by _init_process
+_process_system = None
+_process_loop = None
+
+
+def _init_process() -> None:
+    global _process_system, _process_loop
+    from app import analysis_system
+    _process_system = analysis_system
+    _process_loop = asyncio.new_event_loop()
+
+
+def _complete_raw_in_process(text: str, raw_analysis: Optional[dict]) -> dict:
+    return _process_loop.run_until_complete(_process_system.complete_raw(text, raw_analysis))
+
+
+class JobManager:
+    """
+    Run analysis jobs on a bounded pool of workers. Workers run in the event loop by
+    default, or in separate processes with mode='process' (a running job can then only
+    be cancelled between attempts). A job whose technique calls fail is retried for the
+    failed techniques only, the argument stage and successful techniques are kept. A failed
+    argument stage, or an attempt raising, is retried from the start, up to max_attempts.
+    """
+
+    def __init__(self, analysis_system, store: JobStore, workers: int = 4, max_attempts: int = 3, mode: str = 'async'):
+        self.analysis_system = analysis_system
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.mode = mode
+        self._queue: asyncio.Queue = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls, analysis_system) -> 'JobManager':
+        return cls(
+            analysis_system,
+            JobStore(os.getenv('JOB_STORE_PATH', 'jobs.sqlite3')),
+            workers=int(os.getenv('JOB_WORKERS', '4')),
+            max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3')),
+            mode=os.getenv('JOB_WORKER_MODE', 'async')
+        )
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        if self.mode == 'process':
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_process)
+        for job_id in await asyncio.to_thread(self.store.unfinished):
+            await asyncio.to_thread(self.store.update, job_id, status=QUEUED)
+            self._queue.put_nowait(job_id)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    async def submit(self, texts: List[str]) -> List[str]:
+        job_ids = await asyncio.to_thread(self.store.create, texts)
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        return job_ids
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None:
+            # Internal state needed to resume the job, not part of the API
+            job.pop('partial')
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[dict]:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return None
+        if job['status'] in (QUEUED, RUNNING):
+            await asyncio.to_thread(self.store.update, job_id, status=CANCELLED)
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+        return await self.get(job_id)
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'running': len(self._running),
+            'workers': self.workers,
+        }
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            task = asyncio.create_task(self._run(job_id))
+            self._running[job_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                # Only the job was cancelled, the worker carries on
+                if not task.cancelled():
+                    raise
+            except Exception as e:
+                log.error(f'job {job_id} crashed: {str(e)}')
+            finally:
+                self._running.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job['status'] != QUEUED:
+            return
+        await asyncio.to_thread(self.store.update, job_id, status=RUNNING)
+
+        system = self.analysis_system
+        text = job['text']
+        techniques = system.default_techniques
+        cache_key = system.result_key(text, techniques)
+        fingerprint = await system.text_fingerprint(text)
+        result = await system.cached_result(fingerprint, cache_key, techniques)
+        raw_analysis = job['partial']
+        attempts = job['attempts']
+        try:
+            while result is None and attempts < self.max_attempts:
+                attempts += 1
+                try:
+                    raw_analysis = await self._complete_raw(text, raw_analysis)
+                except Exception as e:
+                    # e.g. the argument stage missed its deadline, the next attempt runs it again
+                    if attempts == self.max_attempts:
+                        raise
+                    log.error(f'job {job_id} attempt {attempts} failed: {str(e)}')
+                    await asyncio.to_thread(self.store.update, job_id, attempts=attempts)
+                    continue
+                await asyncio.to_thread(self.store.update, job_id, partial=raw_analysis, attempts=attempts)
+                incomplete = raw_analysis['not_evaluated'] or 'error' in raw_analysis['argument_analysis']
+                if not incomplete or attempts == self.max_attempts:
+                    result = system.raw_data_to_api_format(dict(raw_analysis))
+                    if not result['not_evaluated_techniques']:
+                        await system.store_result(fingerprint, cache_key, techniques, result)
+                else:
+                    log.debug('job %s retrying %s', job_id, raw_analysis['not_evaluated'] or 'the argument analysis')
+
+            if (await asyncio.to_thread(self.store.get, job_id))['status'] == CANCELLED:
+                return
+            await asyncio.to_thread(self.store.update, job_id, status=DONE, result=result)
+        except Exception as e:
+            log.error(f'job {job_id} failed: {str(e)}')
+            await asyncio.to_thread(self.store.update, job_id, status=FAILED, error=str(e), attempts=attempts)
+
+    async def _complete_raw(self, text: str, raw_analysis: Optional[dict]) -> dict:
+        if self._pool is None:
+            return await self.analysis_system.complete_raw(text, raw_analysis)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _complete_raw_in_process, text, raw_analysis)
@@ -1,5 +1,11 @@
-import colorlog
+import os
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
+
+import colorlog
 
 def safely_add_trace_level():
     """
@@ -25,9 +31,70 @@ def safely_add_trace_level():
     
     return getattr(logging, TRACE_LEVEL_NAME)
 
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with the fields passed in `extra={'fields': {...}}`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, "%Y-%m-%dT%H:%M:%SZ"),
+            'level': record.levelname,
+            'file': f'{record.filename}:{record.lineno}',
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _colored_formatter() -> logging.Formatter:
+    return colorlog.ColoredFormatter(
+        "%(log_color)s%(asctime)s | %(levelname)s | %(filename)s:%(lineno)s | >>> %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%SZ",
+        log_colors={
+            'TRACE': 'purple',
+            'DEBUG': 'cyan',
+            'INFO': 'green',
+            'WARNING': 'yellow',
+            'ERROR': 'red',
+            'CRITICAL': 'red,bg_white',
+        }
+    )
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler leaving the formatting to the listener thread. The message is rendered
+    with its arguments right away though, so later changes to them do not leak in.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+
+
+def _queue_handler(handler: logging.Handler) -> logging.Handler:
+    """Put the handler behind a queue drained by a background thread, off the event loop."""
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _DeferredQueueHandler(log_queue)
+
+
 def get_logger(name=None):
     """
     Creates and configures a logger with colored output and TRACE level support.
+
+    Configured by environment variables:
+        LOG_LEVEL: minimum level, TRACE by default
+        LOG_FORMAT: 'color' (default, for development) or 'json'
+        LOG_QUEUE: write the logs from a background thread, on by default with LOG_FORMAT=json
     
     Args:
         name (str, optional): Logger name. Defaults to __name__ of calling module.
@@ -49,23 +116,14 @@ def get_logger(name=None):
         
         # Add TRACE level safely
         trace_level = safely_add_trace_level()
-        logger.setLevel(trace_level)
+        level = logging.getLevelName(os.getenv('LOG_LEVEL', 'TRACE').upper())
+        logger.setLevel(level if isinstance(level, int) else trace_level)
 
         # Create and configure handler
+        log_format = os.getenv('LOG_FORMAT', 'color')
         handler = logging.StreamHandler()
-        formatter = colorlog.ColoredFormatter(
-            "%(log_color)s%(asctime)s | %(levelname)s | %(filename)s:%(lineno)s | >>> %(message)s",
-            datefmt="%Y-%m-%dT%H:%M:%SZ",
-            log_colors={
-                'TRACE': 'purple',
-                'DEBUG': 'cyan',
-                'INFO': 'green',
-                'WARNING': 'yellow',
-                'ERROR': 'red',
-                'CRITICAL': 'red,bg_white',
-            }
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        handler.setFormatter(JSONFormatter() if log_format == 'json' else _colored_formatter())
+        use_queue = os.getenv('LOG_QUEUE', 'true' if log_format == 'json' else 'false').lower() in ('1', 'true', 'yes')
+        logger.addHandler(_queue_handler(handler) if use_queue else handler)
     
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,165 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from tracing import span
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _render_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f'{self.name}{_render_labels(dict(zip(self.labelnames, key)))} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # Per label set: count per bucket, sum and count
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.setdefault(key, [[0] * len(self.buckets), [0.0, 0]])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            total[0] += value
+            total[1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, (total, count)) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{_render_labels({**labels, "le": str(bound)})} {bucket_count}')
+                lines.append(f'{self.name}_bucket{_render_labels({**labels, "le": "+Inf"})} {count}')
+                lines.append(f'{self.name}_sum{_render_labels(labels)} {total}')
+                lines.append(f'{self.name}_count{_render_labels(labels)} {count}')
+        return lines
+
+
+class Gauge:
+    """Value read from its source when the metrics are rendered, in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._read: Optional[Callable[[], float]] = None
+
+    def set_function(self, read: Callable[[], float]) -> None:
+        self._read = read
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        if self._read is not None:
+            lines.append(f'{self.name} {self._read()}')
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'analysis_stage_seconds',
+    'Latency of the analysis stages: argument, technique (one LLM call), parse, format and score',
+    ('stage', 'technique')
+)
+LLM_TOKENS = Counter('llm_tokens_total', 'Tokens sent to and received from the model', ('direction', 'stage', 'technique'))
+PARSE_FAILURES = Counter(
+    'llm_parse_failures_total', 'Model responses that were not valid JSON of the expected shape', ('stage', 'technique')
+)
+JSON_REPAIRS = Counter('llm_json_repairs_total', 'Model responses whose JSON had to be repaired', ('stage', 'technique'))
+PROMPT_TOKENS_SAVED = Counter(
+    'llm_prompt_tokens_saved_total', 'Input tokens saved by prompt compaction, estimated', ('stage',)
+)
+REASKS = Counter('llm_reasks_total', 'Calls sent again because the response could not be used', ('stage', 'technique'))
+LLM_RETRIES = Counter('llm_retries_total', 'LLM calls retried after a throttling or transient error', ('model',))
+TIMEOUTS = Counter('analysis_timeouts_total', 'Stages that missed the request deadline', ('stage',))
+ANALYSES = Counter('analyses_total', 'Analyses served, by where the result came from', ('source',))
+
+ADMISSION_ACTIVE = Gauge('admission_active', 'Analyses holding an admission slot')
+ADMISSION_QUEUE_DEPTH = Gauge('admission_queue_depth', 'Analyses waiting in the admission queue')
+ADMISSION_WAIT_SECONDS = Gauge(
+    'admission_average_wait_seconds', 'Average time the last 200 admitted or timed out analyses waited in the queue'
+)
+
+METRICS = [
+    STAGE_SECONDS, LLM_TOKENS, PARSE_FAILURES, JSON_REPAIRS, REASKS, PROMPT_TOKENS_SAVED, LLM_RETRIES, TIMEOUTS, ANALYSES,
+    ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS
+]
+
+# Stage and technique the current task works for, used to label tokens and parse failures
+_current_stage: ContextVar[Tuple[str, str]] = ContextVar('current_stage', default=('', ''))
+
+
+@contextmanager
+def stage(name: str, technique: str = '') -> Iterator[None]:
+    """Time a stage of the analysis, in a tracing span, and label the LLM calls made within it."""
+    token = _current_stage.set((name, technique))
+    try:
+        with span(f'analysis.{name}', technique=technique), STAGE_SECONDS.time(stage=name, technique=technique):
+            yield
+    finally:
+        _current_stage.reset(token)
+
+
+def current_stage() -> Dict[str, str]:
+    name, technique = _current_stage.get()
+    return {'stage': name, 'technique': technique}
+
+
+def record_usage(usage: Optional[dict]) -> None:
+    """Count the tokens of an LLM response against the current stage."""
+    if not usage:
+        return
+    labels = current_stage()
+    LLM_TOKENS.inc(usage.get('input_tokens', 0), direction='input', **labels)
+    LLM_TOKENS.inc(usage.get('output_tokens', 0), direction='output', **labels)
+
+
+def render() -> str:
+    return '\n'.join(line for metric in METRICS for line in metric.render()) + '\n'
@@ -0,0 +1,172 @@
+import re
+import json
+from typing import Any, List, Optional, Tuple
+
+# Expected shape of the agents' responses: a type, a list holding the shape of its items,
+# or a dict of the keys and their shapes, optional when suffixed with '?'. Extra keys are allowed.
+ARGUMENT_SCHEMA = {'main_hypothesis': str, 'arguments': [{'statement': str}]}
+MANIPULATION_SCHEMA = {'instance': str, 'explanation': str}
+TECHNIQUE_SCHEMA = {'arguments': [{'manipulations?': [MANIPULATION_SCHEMA]}]}
+SPANS_SCHEMA = {'findings': [{'sentence_id?': int, **MANIPULATION_SCHEMA}]}
+
+FENCE = re.compile(r'```(?:json)?[ \t]*\n?(.*?)(?:```|$)', re.DOTALL | re.IGNORECASE)
+LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+JSON_TYPES = {str: 'a string', int: 'a number', float: 'a number', bool: 'a boolean', dict: 'an object', list: 'a list'}
+
+
+def _matching_close(text: str, start: int) -> Optional[int]:
+    """Index of the bracket closing the one at start, None when the text ends first."""
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+def extract_json(text: str) -> str:
+    """
+    The JSON document of a model response: the content of its code fence when there is one
+    (closed or not), from the first brace or bracket to the matching one, or to the end of
+    the response when it was cut short. Preambles and trailing comments are dropped.
+    """
+    match = FENCE.search(text)
+    if match:
+        text = match.group(1)
+    start = next((i for i, char in enumerate(text) if char in '{['), None)
+    if start is None:
+        return text.strip()
+    end = _matching_close(text, start)
+    return text[start:end + 1] if end is not None else text[start:]
+
+
+def _strip_trailing_comma(out: List[str]) -> None:
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ',':
+        del out[i]
+
+
+def _close(out: str, stack: List[str]) -> str:
+    return out.rstrip().rstrip(',') + ''.join(reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix the usual defects of model written JSON: trailing commas, Python literals, and
+    truncation. A truncated document is closed where it was cut, or when that is not
+    valid, cut back to its last complete value.
+    """
+    out, stack = [], []
+    in_string = escaped = False
+    # Position in out after the last complete value, with the brackets open there
+    safe = (0, [])
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            out.append(char)
+            safe = (len(out), list(stack))
+        elif char in '}]':
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(char)
+            safe = (len(out), list(stack))
+        elif char == ',':
+            safe = (len(out), list(stack))
+            out.append(char)
+        elif char.isalpha():
+            end = i
+            while end < len(text) and text[end].isalpha():
+                end += 1
+            out.append(LITERALS.get(text[i:end], text[i:end]))
+            i = end
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    if not stack and not in_string:
+        return ''.join(out)
+
+    # The response was cut short
+    closed = ''.join(out)
+    if in_string:
+        closed = (closed[:-1] if escaped else closed) + '"'
+    candidates = [_close(closed, stack), _close(''.join(out[:safe[0]]), safe[1])]
+    for candidate in candidates:
+        try:
+            json.loads(candidate, strict=False)
+            return candidate
+        except ValueError:
+            continue
+    return candidates[-1]
+
+
+def parse_json(text: str) -> Tuple[Any, bool]:
+    """
+    Parse the JSON document of a model response, repairing it when needed. Returns the
+    value and whether it had to be repaired, raises ValueError when it cannot be parsed.
+    """
+    document = extract_json(text)
+    try:
+        return json.loads(document, strict=False), False
+    except ValueError:
+        pass
+    return json.loads(repair_json(document), strict=False), True
+
+
+def validate(value: Any, schema: Any, path: str = '$') -> Optional[str]:
+    """First mismatch between a parsed response and its expected shape, None when it matches."""
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            return f'{path} should be an object'
+        for key, key_schema in schema.items():
+            optional = key.endswith('?')
+            key = key.rstrip('?')
+            if key not in value:
+                if optional:
+                    continue
+                return f'{path}.{key} is missing'
+            problem = validate(value[key], key_schema, f'{path}.{key}')
+            if problem:
+                return problem
+        return None
+    if isinstance(schema, list):
+        if not isinstance(value, list):
+            return f'{path} should be a list'
+        for i, item in enumerate(value):
+            problem = validate(item, schema[0], f'{path}[{i}]')
+            if problem:
+                return problem
+        return None
+    if not isinstance(value, schema):
+        return f'{path} should be {JSON_TYPES.get(schema, schema.__name__)}'
+    return None
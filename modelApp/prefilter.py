@@ -0,0 +1,142 @@
+import os
+import re
+import importlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from cache import stage_key
+from logger import get_logger
+
+log = get_logger()
+
+# Surface cues a technique can hardly be used without, in English, French, Spanish and German.
+# Techniques missing from this table (no reliable cue) are always sent to the model, e.g. a hasty
+# generalization, an appeal to pride or a texas sharpshooter can be worded with no telltale word.
+TECHNIQUE_CUES: Dict[str, List[str]] = {
+    "ad_populum": [
+        r"every(?:one|body)", r"most people", r"millions? of", r"the majority", r"nobody", r"popular",
+        r"tout le monde", r"la plupart des gens", r"des millions", r"la majorit[ée]", r"personne ne",
+        r"todo el mundo", r"la mayor[ií]a", r"millones de", r"nadie",
+        r"jede[rn]?", r"alle wissen", r"die meisten", r"millionen", r"niemand",
+    ],
+    "unspecified_authority_fallacy": [
+        r"experts?", r"stud(?:y|ies)", r"research(?:ers)?", r"scientists?", r"doctors?", r"specialists?",
+        r"according to", r"sources?", r"officials?", r"it is (?:known|said|believed)",
+        r"[ée]tudes?", r"selon", r"sp[ée]cialistes?", r"scientifiques?", r"chercheurs?", r"on dit",
+        r"expertos?", r"estudios?", r"seg[uú]n", r"cient[ií]ficos?", r"fuentes",
+        r"experten", r"studien", r"laut", r"wissenschaftler", r"quellen", r"man sagt",
+    ],
+    "false_dilemma": [
+        r"either", r"or else", r"only (?:two|option|choice|way|alternative|solution)",
+        r"no (?:other )?(?:choice|alternative|option)", r"with us or against",
+        r"soit", r"ou bien", r"seule? (?:option|solution|alternative|choix)", r"pas d'autre (?:choix|solution)",
+        r"o bien", r"[uú]nica (?:opci[oó]n|alternativa|soluci[oó]n)", r"no hay otra",
+        r"entweder", r"keine (?:andere )?(?:wahl|alternative)", r"einzige",
+    ],
+    "cherry_picking_data": [
+        r"\d\w*", r"percent", r"data", r"statistics?", r"figures?", r"numbers?", r"surveys?", r"polls?", r"records?",
+        r"(?:drop|fall|fell|rise|rose|increase|decrease|decline|grow|grew|double|halve)\w*",
+        r"pour ?cent", r"donn[ée]es", r"statistiques?", r"chiffres?", r"sondages?",
+        r"(?:baiss|augment|diminu|chut|recul|doubl)\w*",
+        r"por ciento", r"datos", r"estad[ií]sticas?", r"cifras", r"encuestas?",
+        r"(?:baj|aument|disminu|subi|cay|cae|crec)\w*",
+        r"prozent", r"daten", r"statistik\w*", r"zahlen", r"umfragen?",
+        r"(?:gesunken|gestiegen|gefallen|fiel|stieg|sinkt|steigt|wuchs|verdoppel)\w*",
+    ],
+    "stork_fallacy": [
+        r"because", r"caus\w*", r"leads? to", r"led to", r"results? in", r"due to", r"therefore", r"thus",
+        r"responsible for", r"linked to", r"correlat\w*", r"effects?",
+        r"parce que", r"provoqu\w*", r"entra[iî]n\w*", r"[àa] cause de", r"donc", r"gr[âa]ce [àa]", r"li[ée]e?s? [àa]",
+        r"porque", r"causa\w*", r"provoca\w*", r"debido a", r"por lo tanto", r"gracias a",
+        r"weil", r"verursach\w*", r"f[üu]hrt zu", r"deshalb", r"wegen", r"daher",
+    ],
+}
+
+
+class LexicalScreener:
+    """
+    Screen techniques on lexical cues: a technique is worth a model call when the text
+    contains at least `threshold` distinct cues of it. Keep the threshold low, a skipped
+    call is a missed finding while an extra call only costs money.
+    """
+
+    def __init__(self, cues: Dict[str, List[str]] = TECHNIQUE_CUES, threshold: int = 1):
+        self.threshold = threshold
+        self.patterns = {
+            name: re.compile(r'\b(?:' + '|'.join(patterns) + r')\b', re.IGNORECASE | re.UNICODE)
+            for name, patterns in cues.items()
+        }
+
+    def fingerprint(self) -> str:
+        """Identifies the cues, results screened with other cues are not reused."""
+        return stage_key(str(self.threshold), *(pattern.pattern for pattern in self.patterns.values()))[:16]
+
+    def worth_calling(self, technique: str, text: str) -> bool:
+        pattern = self.patterns.get(technique)
+        if pattern is None:
+            return True
+        found = set()
+        for match in pattern.finditer(text):
+            found.add(match.group(0).lower())
+            if len(found) >= self.threshold:
+                return True
+        return False
+
+
+class PreFilter:
+    """
+    Local screening stage deciding, per technique, whether the model call is worth making.
+    The screener is pluggable:
+    any object with a worth_calling(technique, text) method.
+    """
+
+    def __init__(self, screener=None, spec: str = 'off'):
+        self.screener = screener
+        # Identifies the screening configuration in the prompts version of cached results
+        self.spec = spec
+        self.screened = Counter()
+        self.skipped = Counter()
+
+    @classmethod
+    def from_env(cls) -> 'PreFilter':
+        """
+        PREFILTER selects the screener: 'off' (default), 'lexical', or the 'module:Class'
+        path of a custom screener built without arguments. PREFILTER_THRESHOLD is the
+        number of distinct cues the lexical screener needs.
+        """
+        spec = os.getenv('PREFILTER', 'off')
+        if spec == 'off':
+            return cls()
+        if spec == 'lexical':
+            screener = LexicalScreener(threshold=int(os.getenv('PREFILTER_THRESHOLD', '1')))
+            return cls(screener, f'{spec}:{screener.fingerprint()}')
+        module_name, _, class_name = spec.partition(':')
+        return cls(getattr(importlib.import_module(module_name), class_name)(), spec)
+
+    def screen(self, text: str, techniques: List[str]) -> Tuple[List[str], List[str]]:
+        """Split techniques into the ones to send to the model and the ones to skip"""
+        if self.screener is None:
+            return techniques, []
+        to_call, skipped = [], []
+        for name in techniques:
+            self.screened[name] += 1
+            if self.screener.worth_calling(name, text):
+                to_call.append(name)
+            else:
+                self.skipped[name] += 1
+                skipped.append(name)
+        if skipped:
+            log.debug('pre-filter skipped %s', skipped)
+        return to_call, skipped
+
+    def stats(self) -> Optional[dict]:
+        if self.screener is None:
+            return None
+        return {
+            name: {
+                'screened': self.screened[name],
+                'skipped': self.skipped[name],
+                'skip_rate': round(self.skipped[name] / self.screened[name], 3),
+            }
+            for name in self.screened
+        }
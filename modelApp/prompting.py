@@ -0,0 +1,193 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, Tuple
+
+from alignment import overlap, split_sentences
+from metrics import PROMPT_TOKENS_SAVED, current_stage
+
+
+class TokenBudgetExceeded(Exception):
+    """The prompt does not fit in what is left of the input token budget of the request."""
+
+
+class TokenBudget:
+    """Input tokens an analysis may send to the models, across all its calls."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+
+    def charge(self, tokens: int) -> None:
+        if self.used + tokens > self.limit:
+            raise TokenBudgetExceeded(
+                f'prompt of {tokens} tokens exceeds the token budget, {self.limit - self.used} of {self.limit} left'
+            )
+        self.used += tokens
+
+
+_current_budget: ContextVar[Optional[TokenBudget]] = ContextVar('current_budget', default=None)
+# Tokens saved by compaction on the prompt about to be sent, counted once it is
+_pending_saved: ContextVar[int] = ContextVar('pending_saved', default=0)
+
+# Estimated input tokens per stage: prompts sent, tokens sent and tokens saved by compaction
+_stage_tokens: Dict[str, Dict[str, int]] = {}
+
+
+@contextmanager
+def token_budget(limit: int) -> Iterator[Optional[TokenBudget]]:
+    """Give the calls made in the block a budget of input tokens (0 is unlimited), unless they already have one."""
+    budget = _current_budget.get()
+    if not limit or budget is not None:
+        yield budget
+        return
+    budget = TokenBudget(limit)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+async def within_budget(budget: Optional[TokenBudget], call: Awaitable[Any]) -> Any:
+    """Await a call, in a task of its own, against the given budget."""
+    _current_budget.set(budget)
+    return await call
+
+
+def _stage_entry(stage: str) -> Dict[str, int]:
+    return _stage_tokens.setdefault(stage or 'other', {'prompts': 0, 'sent': 0, 'saved': 0})
+
+
+def charge(tokens: int) -> None:
+    """Count a prompt about to be sent against the request's budget and its stage."""
+    budget = _current_budget.get()
+    if budget is not None:
+        budget.charge(tokens)
+    stage = current_stage()['stage']
+    entry = _stage_entry(stage)
+    entry['prompts'] += 1
+    entry['sent'] += tokens
+    saved = _pending_saved.get()
+    if saved:
+        _pending_saved.set(0)
+        entry['saved'] += saved
+        PROMPT_TOKENS_SAVED.inc(saved, stage=stage)
+
+
+def token_stats() -> Dict[str, dict]:
+    return {
+        stage: {**entry, 'saved_ratio': round(entry['saved'] / (entry['sent'] + entry['saved']), 3)}
+        for stage, entry in _stage_tokens.items() if entry['sent'] + entry['saved']
+    }
+
+
+class PromptBuilder:
+    """
+    Inputs of the technique prompts, compacted to cut the tokens sent on every call:
+    arguments as `A1: statement` lines instead of the dict of the argument analysis,
+    definitions without indentation or counter-arguments, and optionally only the
+    sentences relevant to the arguments instead of the whole text.
+    """
+
+    def __init__(
+        self,
+        arguments: str = 'compact',
+        definitions: str = 'compact',
+        context: str = 'full',
+        context_window: int = 1,
+        min_overlap: float = 0.5
+    ):
+        self.arguments_mode = arguments
+        self.definitions_mode = definitions
+        self.context_mode = context
+        self.context_window = context_window
+        self.min_overlap = min_overlap
+        # Characters saved by compaction on the definition of each technique
+        self._definition_savings: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> 'PromptBuilder':
+        """
+        PROMPT_ARGUMENTS and PROMPT_DEFINITIONS are 'compact' (default) or 'full'. PROMPT_CONTEXT
+        is 'full' (default) or 'relevant' to send only the sentences matching an argument, with
+        PROMPT_CONTEXT_WINDOW sentences around each.
+        """
+        return cls(
+            arguments=os.getenv('PROMPT_ARGUMENTS', 'compact'),
+            definitions=os.getenv('PROMPT_DEFINITIONS', 'compact'),
+            context=os.getenv('PROMPT_CONTEXT', 'full'),
+            context_window=int(os.getenv('PROMPT_CONTEXT_WINDOW', '1'))
+        )
+
+    def fingerprint(self) -> str:
+        """Identifies the compaction in the version of cached results."""
+        return f'arguments={self.arguments_mode} definitions={self.definitions_mode} context={self.context_mode}:{self.context_window}'
+
+    def definition(self, definition: str) -> str:
+        if self.definitions_mode != 'compact':
+            return definition
+        lines = [line.strip() for line in definition.strip().splitlines()]
+        return '\n'.join(line for line in lines if line and not line.startswith('Counter:'))
+
+    def compact_definitions(self, techniques: Dict[str, str]) -> Dict[str, str]:
+        """Definitions as sent to the model, by technique name."""
+        compacted = {name: self.definition(definition) for name, definition in techniques.items()}
+        self._definition_savings = {name: len(techniques[name]) - len(compacted[name]) for name in techniques}
+        return compacted
+
+    def encode_arguments(self, argument_analysis: dict) -> str:
+        if self.arguments_mode != 'compact':
+            return str(argument_analysis)
+        lines = [f"Thesis: {argument_analysis.get('main_hypothesis', '')}"]
+        lines.extend(
+            f"{argument.get('id', '')}: {' '.join(str(argument.get('statement', '')).split())}"
+            for argument in argument_analysis.get('arguments', []) if isinstance(argument, dict)
+        )
+        return '\n'.join(lines)
+
+    def relevant_context(self, text: str, argument_analysis: dict) -> str:
+        """
+        The sentences of the text the arguments come from, with context_window sentences
+        around each, gaps marked with [...]. The whole text when no sentence matches.
+        """
+        sentences = split_sentences(text)
+        statements = [argument_analysis.get('main_hypothesis', '')] + [
+            argument.get('statement', '') for argument in argument_analysis.get('arguments', [])
+            if isinstance(argument, dict)
+        ]
+        kept = set()
+        for statement in statements:
+            scores = [overlap(sentence, statement) for sentence in sentences]
+            matches = [i for i, score in enumerate(scores) if score >= self.min_overlap]
+            if not matches and scores and max(scores) > 0:
+                matches = [scores.index(max(scores))]
+            for i in matches:
+                kept.update(range(max(0, i - self.context_window), min(len(sentences), i + self.context_window + 1)))
+        if not kept:
+            return text
+
+        pieces, previous = [], -1
+        for i in sorted(kept):
+            if i != previous + 1:
+                pieces.append('[...]')
+            pieces.append(sentences[i])
+            previous = i
+        if previous != len(sentences) - 1:
+            pieces.append('[...]')
+        return ' '.join(pieces)
+
+    def technique_inputs(self, text: str, argument_analysis: dict, names: List[str]) -> Tuple[str, str]:
+        """
+        Text and arguments to send in the next call for the named techniques, recording for
+        it the tokens saved against the whole text, the argument analysis dict and full definitions.
+        """
+        arguments = self.encode_arguments(argument_analysis)
+        context = self.relevant_context(text, argument_analysis) if self.context_mode == 'relevant' else text
+        saved_chars = (
+            len(text) - len(context)
+            + len(str(argument_analysis)) - len(arguments)
+            + sum(self._definition_savings.get(name, 0) for name in names)
+        )
+        _pending_saved.set(max(0, saved_chars) // 4)
+        return context, arguments
@@ -0,0 +1,271 @@
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from logger import get_logger
+from metrics import LLM_RETRIES, current_stage
+from deadline import in_flight
+
+log = get_logger()
+
+THROTTLE_ERRORS = ('ResourceExhausted', 'TooManyRequests', 'RateLimitError')
+TRANSIENT_ERRORS = ('ServiceUnavailable', 'InternalServerError', 'DeadlineExceeded')
+
+
+def is_throttle(error: Exception) -> bool:
+    """Whether the provider rejected the call because of quota or rate limits."""
+    return (
+        type(error).__name__ in THROTTLE_ERRORS
+        or getattr(error, 'code', None) == 429
+        or getattr(error, 'status_code', None) == 429
+    )
+
+
+def is_transient(error: Exception) -> bool:
+    return type(error).__name__ in TRANSIENT_ERRORS
+
+
+def call_kind(estimated_tokens: int) -> str:
+    """Stage of the call and order of magnitude of its prompt, calls of a kind have comparable latencies."""
+    size = 0
+    while estimated_tokens >= 1000 * 4 ** size:
+        size += 1
+    return f"{current_stage()['stage']}:{size}"
+
+
+class TokenBucket:
+    """Token bucket refilled continuously, sized by a per minute allowance."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        # The lock keeps callers in arrival order while they wait for the bucket to refill
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund) the difference between the estimated and the actual usage."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+    def drain(self) -> None:
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit, capped at the configured maximum. It grows by about one slot
+    per window of successful calls, and is cut by decrease_factor when the provider
+    throttles or when the median latency of calls of the same kind (stage and prompt
+    size) stays beyond latency_tolerance times its usual value for sustained_windows
+    windows in a row, so a single stall of the event loop is not taken for congestion.
+    It is cut at most once per round trip: signals from calls started before the last
+    cut are ignored, they were sent under the previous limit.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        latency_window: int = 20,
+        sustained_windows: int = 2
+    ):
+        self.maximum = maximum
+        self.limit = float(min(initial, maximum))
+        self.minimum = minimum
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_window = latency_window
+        self.sustained_windows = sustained_windows
+        self.in_flight = 0
+        self.decreases = 0
+        self._decreased_at = float('-inf')
+        # Latencies of the current window and usual median latency, by kind of call
+        self._latencies: Dict[str, List[float]] = {}
+        self._baselines: Dict[str, float] = {}
+        self._slow_windows: Dict[str, int] = {}
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(
+        self,
+        started_at: float,
+        latency: Optional[float] = None,
+        throttled: bool = False,
+        kind: str = ''
+    ) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease(started_at)
+            elif latency is not None:
+                if self._latency_shifted(kind, latency):
+                    self._decrease(started_at)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def _latency_shifted(self, kind: str, latency: float) -> bool:
+        """Whether the window of calls of this kind just completed a sustained latency rise."""
+        window = self._latencies.setdefault(kind, [])
+        window.append(latency)
+        if len(window) < self.latency_window:
+            return False
+        median = sorted(window)[len(window) // 2]
+        window.clear()
+        baseline = self._baselines.get(kind)
+        self._baselines[kind] = median if baseline is None else 0.8 * baseline + 0.2 * median
+        if baseline is None or median <= baseline * self.latency_tolerance:
+            self._slow_windows[kind] = 0
+            return False
+        self._slow_windows[kind] = self._slow_windows.get(kind, 0) + 1
+        return self._slow_windows[kind] >= self.sustained_windows
+
+    def _decrease(self, started_at: float) -> None:
+        if started_at < self._decreased_at:
+            return
+        self._decreased_at = time.monotonic()
+        self.decreases += 1
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+
+
+class ModelRateLimiter:
+    """
+    Outbound limiter for one model: requests per minute and tokens per minute buckets,
+    plus an adaptive concurrency limit. Throttled and transient failures are retried
+    here, paced by the buckets, instead of being hammered by client side retries.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        requests_per_minute: float = 360,
+        tokens_per_minute: float = 4_000_000,
+        max_concurrency: int = 16,
+        max_retries: int = 2,
+        backoff: float = 1.0
+    ):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(initial=max_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int = 0) -> Any:
+        attempt = 0
+        while True:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+            await self.concurrency.acquire()
+            self.calls += 1
+            start = time.monotonic()
+            try:
+                result = await in_flight(fn)
+            except asyncio.CancelledError:
+                await self.concurrency.release(start)
+                raise
+            except Exception as e:
+                throttled = is_throttle(e)
+                await self.concurrency.release(start, throttled=throttled)
+                if throttled:
+                    self.throttled += 1
+                    self.requests.drain()
+                if attempt >= self.max_retries or not (throttled or is_transient(e)):
+                    raise
+                attempt += 1
+                self.retries += 1
+                LLM_RETRIES.inc(model=self.model)
+                log.debug('%s call failed with %s, retry %d/%d', self.model, type(e).__name__, attempt, self.max_retries)
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+                continue
+
+            await self.concurrency.release(start, latency=time.monotonic() - start, kind=call_kind(estimated_tokens))
+            usage = getattr(result, 'usage_metadata', None)
+            if usage and usage.get('total_tokens'):
+                self.tokens.adjust(usage['total_tokens'] - estimated_tokens)
+            return result
+
+    def stats(self) -> dict:
+        return {
+            'concurrency_limit': round(self.concurrency.limit, 2),
+            'concurrency_decreases': self.concurrency.decreases,
+            'in_flight': self.concurrency.in_flight,
+            'calls': self.calls,
+            'throttled': self.throttled,
+            'retries': self.retries,
+        }
+
+
+class RateLimiterRegistry:
+    """One limiter per model, shared by every agent calling that model."""
+
+    def __init__(self, defaults: Optional[dict] = None, overrides: Optional[Dict[str, dict]] = None):
+        self.defaults = defaults or {}
+        self.overrides = overrides or {}
+        self._limiters: Dict[str, ModelRateLimiter] = {}
+
+    @classmethod
+    def from_env(cls) -> 'RateLimiterRegistry':
+        """
+        Defaults come from LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY and LLM_MAX_RETRIES.
+        LLM_RATE_LIMITS overrides them per model, e.g.
+        `gemini-1.5-pro:rpm=360,tpm=4000000;gemini-1.5-flash:rpm=2000`.
+        """
+        keys = {'rpm': 'requests_per_minute', 'tpm': 'tokens_per_minute', 'concurrency': 'max_concurrency'}
+        defaults = {
+            'requests_per_minute': float(os.getenv('LLM_RPM', '360')),
+            'tokens_per_minute': float(os.getenv('LLM_TPM', '4000000')),
+            'max_concurrency': int(os.getenv('LLM_MAX_CONCURRENCY', '16')),
+            'max_retries': int(os.getenv('LLM_MAX_RETRIES', '2')),
+        }
+        overrides = {}
+        for entry in os.getenv('LLM_RATE_LIMITS', '').split(';'):
+            if ':' not in entry:
+                continue
+            model, settings = entry.split(':', 1)
+            overrides[model.strip()] = {
+                keys[key.strip()]: float(value) if key.strip() != 'concurrency' else int(value)
+                for key, value in (setting.split('=') for setting in settings.split(',') if '=' in setting)
+            }
+        return cls(defaults, overrides)
+
+    def get(self, model: str) -> ModelRateLimiter:
+        if model not in self._limiters:
+            self._limiters[model] = ModelRateLimiter(model, **{**self.defaults, **self.overrides.get(model, {})})
+        return self._limiters[model]
+
+    def stats(self) -> dict:
+        return {model: limiter.stats() for model, limiter in self._limiters.items()}
+
+
+def estimate_tokens(prompt, inputs: dict) -> int:
+    """Rough prompt size in tokens (about four characters per token), used to pace the tokens bucket."""
+    return len(prompt.format(**inputs)) // 4
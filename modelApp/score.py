@@ -1,10 +1,12 @@
 from logger import get_logger
+from metrics import STAGE_SECONDS
 
 log = get_logger()
 
 def get_score_details(text_analysis: dict) -> dict:
-   manipulation_score = calculate_manipulation_score(text_analysis)
-   interpreted_score = interpret_score(manipulation_score)
+   with STAGE_SECONDS.time(stage='score'):
+       manipulation_score = calculate_manipulation_score(text_analysis)
+       interpreted_score = interpret_score(manipulation_score)
    
    return {
        # Metrics from manipulation_score
@@ -35,6 +37,8 @@ def calculate_manipulation_score(text_analysis: dict) -> dict:
         - 'arguments': list of dicts, each containing:
             - 'content': str
             - 'manipulations': list of detected manipulation techniques
+        - 'not_evaluated_techniques': optional list of techniques that could not be evaluated,
+          they are left out of the maximum possible techniques
         
     Returns:
     dict with various scoring metrics and an overall score
@@ -50,16 +54,25 @@ def calculate_manipulation_score(text_analysis: dict) -> dict:
             'max_techniques_in_single_argument': 0
         }
     
+    not_evaluated = set(text_analysis.get('not_evaluated_techniques', []))
+    evaluated_techniques = [
+        name for name in arguments[0].get('manipulations', {}) if name not in not_evaluated
+    ]
+    max_possible_techniques = len(evaluated_techniques)
+    if max_possible_techniques == 0:
+        log.error('no manipulation technique was evaluated, score cannot be calculated')
+        return {}
+
     manipulation_counts = {
-        f'argument_{i+1}': len([m for m in arg.get('manipulations', {}).values() if m])
+        f'argument_{i+1}': len([m for name, m in arg.get('manipulations', {}).items() if m and name not in not_evaluated])
         for i, arg in enumerate(arguments)
     }
     
     # Extract statistics in one pass
     techniques_per_argument = list(manipulation_counts.values())
     manipulated_arguments = sum(1 for count in techniques_per_argument if count > 0)
-    log.trace(f'manipulated arguments: {manipulated_arguments}')
-    log.trace(f'techniques_per_argument: {techniques_per_argument}')
+    log.trace('manipulated arguments: %s', manipulated_arguments)
+    log.trace('techniques_per_argument: %s', techniques_per_argument)
 
 
     
@@ -71,14 +84,14 @@ def calculate_manipulation_score(text_analysis: dict) -> dict:
         
     # # Calculate manipulation density
     # # This considers both how many arguments are affected and how many techniques are used
-    manipulation_density = sum(techniques_per_argument) / (total_arguments * 10)  # 10 being max possible techniques
+    manipulation_density = sum(techniques_per_argument) / (total_arguments * max_possible_techniques)
     
     # # Calculate overall score (0-100)
     # # Weighted combination of different factors
     overall_score = (
         (affected_arguments_ratio * 0.4) +  # 40% weight for breadth of manipulation
         (manipulation_density * 0.4) +      # 40% weight for density of techniques
-        (max_techniques / 10 * 0.2)         # 20% weight for maximum manipulation in a single argument
+        (max_techniques / max_possible_techniques * 0.2)  # 20% weight for maximum manipulation in a single argument
     ) * 100
     
     return {
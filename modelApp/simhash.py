@@ -0,0 +1,149 @@
+import os
+import hashlib
+import itertools
+from collections import OrderedDict, defaultdict
+from typing import List, Optional
+
+from cache import normalize_text
+from alignment import WORD
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64 bit SimHash of the word shingles of a text, close texts get close fingerprints."""
+    words = WORD.findall(normalize_text(text).lower())
+    shingles = range(max(1, len(words) - shingle_size + 1))
+    # Bit sliced counters: planes[i] holds bit i of the number of shingles having each bit set,
+    # so a shingle is counted in all 64 columns at once with a few integer operations
+    planes = []
+    for i in shingles:
+        carry = int.from_bytes(
+            hashlib.blake2b(' '.join(words[i:i + shingle_size]).encode('utf-8'), digest_size=8).digest(), 'big'
+        )
+        for plane, value in enumerate(planes):
+            if not carry:
+                break
+            planes[plane], carry = value ^ carry, value & carry
+        if carry:
+            planes.append(carry)
+
+    # A bit of the fingerprint is set when most shingles have it set, i.e. its count is above half,
+    # compared for all the columns at once from the most significant bit of the counts down
+    half = len(shingles) // 2
+    above, equal = 0, (1 << BITS) - 1
+    for plane in reversed(range(max(len(planes), half.bit_length()))):
+        counts = planes[plane] if plane < len(planes) else 0
+        if half >> plane & 1:
+            equal &= counts
+        else:
+            above |= equal & counts
+            equal &= ~counts
+    return above
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count('1')
+
+
+def flip_masks(bits: int, radius: int) -> List[int]:
+    """Every mask of the given width with at most radius bits set."""
+    return [
+        sum(1 << bit for bit in flipped)
+        for count in range(radius + 1) for flipped in itertools.combinations(range(bits), count)
+    ]
+
+
+class NearDuplicateIndex:
+    """
+    Bounded LRU index of the SimHash fingerprints of analyzed texts, pointing at their
+    cached analysis. Fingerprints are split in BANDS bands: a text within max_distance bits
+    has a band within max_distance // BANDS bits of the same band of the query, so only the
+    texts in the bands that close are compared.
+    Texts are only matched within the same scope, e.g. the same set of techniques.
+
+    The default distance comes from copies of a story with a few edited words and another
+    header and footer: most of them land within 12 bits, unrelated articles over 20 bits apart.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_distance: int = 12):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._masks = flip_masks(BAND_BITS, max(0, max_distance) // BANDS)
+        self._entries = OrderedDict()
+        # (scope, band) -> band value -> entries
+        self._bands = defaultdict(dict)
+        self.lookups = 0
+        self.hits = 0
+
+    @classmethod
+    def from_env(cls) -> 'NearDuplicateIndex':
+        return cls(
+            max_entries=int(os.getenv('NEAR_DUPLICATE_INDEX_SIZE', '10000')),
+            max_distance=int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', '12'))
+        )
+
+    @staticmethod
+    def _band_keys(entry: tuple):
+        scope, fingerprint = entry
+        mask = (1 << BAND_BITS) - 1
+        return [((scope, band), (fingerprint >> (band * BAND_BITS)) & mask) for band in range(BANDS)]
+
+    def add(self, fingerprint: int, cache_key: str, scope: str = '') -> None:
+        if self.max_entries <= 0:
+            return
+        entry = (scope, fingerprint)
+        if entry in self._entries:
+            self._entries.move_to_end(entry)
+        else:
+            for scope_band, value in self._band_keys(entry):
+                self._bands[scope_band].setdefault(value, set()).add(entry)
+        self._entries[entry] = cache_key
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def find(self, fingerprint: int, scope: str = '') -> Optional[str]:
+        """Cache key of the closest indexed text of the scope within max_distance bits, if any."""
+        if self.max_distance < 0:
+            return None
+        self.lookups += 1
+        candidates = set()
+        for scope_band, value in self._band_keys((scope, fingerprint)):
+            values = self._bands.get(scope_band)
+            if not values:
+                continue
+            for mask in self._masks:
+                entries = values.get(value ^ mask)
+                if entries:
+                    candidates.update(entries)
+        best = min(candidates, key=lambda candidate: hamming_distance(candidate[1], fingerprint), default=None)
+        if best is None or hamming_distance(best[1], fingerprint) > self.max_distance:
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best)
+        return self._entries[best]
+
+    def discard_key(self, cache_key: str) -> None:
+        """Forget the fingerprints pointing at an analysis that is no longer cached."""
+        for entry in [entry for entry, key in self._entries.items() if key == cache_key]:
+            self._discard(entry)
+
+    def _discard(self, entry: tuple) -> None:
+        del self._entries[entry]
+        for scope_band, value in self._band_keys(entry):
+            values = self._bands[scope_band]
+            values[value].discard(entry)
+            if not values[value]:
+                del values[value]
+            if not values:
+                del self._bands[scope_band]
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+        }
@@ -0,0 +1,64 @@
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from logger import get_logger
+
+log = get_logger()
+
+
+class Startup:
+    """
+    Warm-up phase of the service, run in the background once it accepts connections, so
+    liveness checks answer meanwhile. The service is ready once every step completed, it
+    stays unready when a step fails and becomes unready again while shutting down.
+    """
+
+    def __init__(self, started_at: float):
+        # perf_counter when the service started importing, startup times are measured from it
+        self.started_at = started_at
+        self.import_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.ready = False
+        self.stopping = False
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def imported(self) -> None:
+        self.import_seconds = round(time.perf_counter() - self.started_at, 3)
+
+    def start(self, steps: List[Tuple[str, Callable[[], Awaitable]]]) -> None:
+        self._task = asyncio.ensure_future(self._run(steps))
+
+    async def _run(self, steps: List[Tuple[str, Callable[[], Awaitable]]]) -> None:
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                await step()
+            except Exception as e:
+                self.error = f'{name}: {str(e)}'
+                log.error(f'warm-up step {name} failed, the service stays unready: {str(e)}')
+                return
+            self.steps[name] = round(time.perf_counter() - start, 3)
+        self.ready_seconds = round(time.perf_counter() - self.started_at, 3)
+        self.ready = True
+        log.info(f'ready {self.ready_seconds}s after start, warm-up steps {self.steps}')
+
+    async def stop(self) -> None:
+        self.stopping = True
+        if self._task is not None:
+            self._task.cancel()
+
+    def is_ready(self) -> bool:
+        return self.ready and not self.stopping
+
+    def stats(self) -> dict:
+        return {
+            'ready': self.is_ready(),
+            'stopping': self.stopping,
+            'import_seconds': self.import_seconds,
+            'ready_seconds': self.ready_seconds,
+            'steps': self.steps,
+            'error': self.error,
+        }
@@ -0,0 +1,100 @@
+import os
+import json
+from typing import Dict, List, Optional
+
+# Registry of the manipulation techniques: name and definition given to the model.
+# Everything else (prompts, result template, score) is derived from it.
+TECHNIQUES: Dict[str, str] = {
+    "ad_populum": """
+    - Argumentum ad populum (Appeal to the People): Claims something is true because many/most people believe it.
+            Core concept: Substitutes popular opinion for evidence
+            Examples: 'Most people believe in ghosts, so they must exist'
+                     'Everyone says this restaurant is the best, so it must be'
+            Counter: Popularity doesn't determine truth - many widely held beliefs have been proven wrong""",
+    "unspecified_authority_fallacy": """
+        - Unspecified Authority fallacy: References unnamed or vague authorities to support claims.
+                Core concept: Creates false credibility through anonymous expertise
+                Examples: 'Scientists say this product is revolutionary'
+                        'Research has shown that...' (without citing specific studies)
+                Counter: Ask for specific sources and credentials of the claimed authorities""",
+    "appeal_to_pride": """
+        - Appeal to Pride: Manipulates audience by associating agreement with positive qualities.
+                Core concept: Exploits desire to belong to a "superior" group
+                Examples: 'Sophisticated people understand why this art is valuable'
+                        'Any true patriot would support this policy'
+                Counter: Evaluate claims on their merits, not on implied social status""",
+    "false_dilemma": """
+        - False Dilemma (Black and White Thinking): Reduces complex situations to only two opposing options.
+                Core concept: Artificially limits choices to force a particular conclusion
+                Examples: 'Either support this war or you're against our troops'
+                        'You're either with us or against us'
+                Counter: Identify and explore other possible alternatives""",
+    "cherry_picking_data": """
+        - Cherry-Picking Data: Selectively presents favorable evidence while omitting contradictory data.
+                Core concept: Creates misleading conclusions through incomplete evidence
+                Examples: 'Our product worked for these 10 selected customers' (ignoring 90 failures)
+                        'Crime dropped during my term' (ignoring areas where it increased)
+                Counter: Ask for complete data sets and contrary evidence""",
+    "stork_fallacy": """
+        - Correlation vs. Causality (Stork fallacy): Mistakes correlation for causation.
+                Core concept: Assumes that when two things occur together, one must cause the other
+                Examples: 'Sales increased when we changed the logo, so the logo caused higher sales'
+                        'Violent crime rises with ice cream sales, so ice cream causes violence'
+                Counter: Investigate other potential causes and confounding variables""",
+    "fallacy_of_composition": """
+        - Fallacy of Composition: Incorrectly applies properties of parts to the whole.
+                Core concept: Assumes what's true of components must be true of the entire system
+                Examples: 'Each player on the team is a star, so this must be the best team'
+                        'Every part of this machine is light, so the machine must be light'
+                Counter: Consider how parts interact and combine in the whole""",
+    "fallacy_of_division": """
+        - Fallacy of Division: Wrongly attributes properties of the whole to individual parts.
+                Core concept: Assumes what's true of the whole must be true of all parts
+                Examples: 'This company is rich, so all its employees must be rich'
+                        'Humans are conscious beings, so all human cells must be conscious'
+                Counter: Examine whether the property can logically apply to individual components""",
+    "hasty_generalization": """
+        - Hasty Generalization: Draws broad conclusions from insufficient evidence.
+                Core concept: Makes sweeping claims based on small or unrepresentative samples
+                Examples: 'My friend got food poisoning at a Mexican restaurant, so Mexican food is unsafe'
+                        'It snowed in April, so climate change must be fake'
+                Counter: Ask about sample size and representativeness""",
+    "texas_sharpshooter_fallacy": """
+        - Texas Sharpshooter Fallacy: Cherry-picks data clusters while ignoring scattered data.
+                Core concept: Finds patterns in randomness by focusing only on clustered results
+                Examples: 'Looking at only successful stock trades to prove trading strategy works'
+                        'Noting cancer clusters without considering population density'
+                Counter: Examine all data points and consider broader context""",
+}
+
+
+def load_techniques() -> Dict[str, str]:
+    """
+    The built-in techniques, extended or overridden by the JSON object {name: definition}
+    of the TECHNIQUES_PATH file when set.
+    """
+    techniques = dict(TECHNIQUES)
+    path = os.getenv('TECHNIQUES_PATH')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            techniques.update(json.load(f))
+    return techniques
+
+
+def default_techniques(techniques: Dict[str, str]) -> List[str]:
+    """
+    Techniques evaluated when a request does not choose, all of them unless DEFAULT_TECHNIQUES
+    lists some, so adding a technique to the registry does not make every request pay for it.
+    """
+    names = [name.strip() for name in os.getenv('DEFAULT_TECHNIQUES', '').split(',') if name.strip()]
+    return select_techniques(techniques, names) if names else list(techniques)
+
+
+def select_techniques(techniques: Dict[str, str], names: Optional[List[str]]) -> List[str]:
+    """Requested technique names in registry order, unknown names or none at all raise a ValueError."""
+    if not names:
+        raise ValueError("At least one technique must be requested")
+    unknown = [name for name in names if name not in techniques]
+    if unknown:
+        raise ValueError(f"Unknown techniques: {', '.join(unknown)}")
+    return [name for name in techniques if name in names]
@@ -0,0 +1,36 @@
+"""
+Offline test setup: the service runs on the fake model backend with in-memory stores.
+
+    cd modelApp && python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+# Set before the service modules are imported, they read their configuration at import
+os.environ.update({
+    'LLM_BACKEND': 'fake',
+    'GOOGLE_API_KEY': 'offline',
+    'FAKE_LLM_LATENCY': 'constant:0',
+    'ANALYSIS_CACHE_PATH': '',
+    'DOCUMENT_STORE_PATH': ':memory:',
+    'JOB_STORE_PATH': ':memory:',
+    'LOG_LEVEL': 'WARNING',
+    'LOG_FORMAT': 'color',
+})
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+def system():
+    """A fresh analysis system on the fake model, without caches shared with other tests."""
+    from app import TextAnalysisSystem
+    return TextAnalysisSystem()
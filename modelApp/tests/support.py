@@ -0,0 +1,13 @@
+from backends import FakeChatModel
+
+# An article with a few manipulative arguments
+TEXT = (
+    'Taxes should be lowered for every family. Experts say growth will follow within a year. '
+    'Everyone agrees that the current system is broken. Either we act now or the economy collapses.'
+)
+
+
+def fake_model(model: str = 'fake', **settings) -> FakeChatModel:
+    """Fake model with the given FakeChatModel settings, answering at once unless a latency is given."""
+    return FakeChatModel(model=model, **{'latency': 'constant:0', **settings})
+
@@ -0,0 +1,132 @@
+import asyncio
+
+import httpx
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+from app import admission, app
+
+pytestmark = pytest.mark.anyio
+
+
+async def queued(controller: AdmissionController, client_id: str = None) -> asyncio.Task:
+    """Start an acquire that has to wait, once it is in the queue."""
+    depth = controller.queue_depth()
+    task = asyncio.ensure_future(controller.acquire(client_id))
+    while controller.queue_depth() == depth:
+        await asyncio.sleep(0)
+    return task
+
+
+async def test_queued_requests_are_served_by_priority_then_arrival():
+    controller = AdmissionController(max_concurrency=1, client_priorities={'premium': 0})
+    acquired_at = await controller.acquire('first')
+    served = []
+
+    async def request(client_id: str):
+        async with controller.admit(client_id):
+            served.append(client_id)
+
+    tasks = []
+    for client_id in ['free-1', 'free-2', 'premium']:
+        tasks.append(asyncio.ensure_future(request(client_id)))
+        while controller.queue_depth() < len(tasks):
+            await asyncio.sleep(0)
+    controller.release(acquired_at)
+    await asyncio.gather(*tasks)
+
+    assert served == ['premium', 'free-1', 'free-2']
+    assert controller.active == 0
+
+
+async def test_a_full_queue_rejects_with_a_503():
+    controller = AdmissionController(max_concurrency=1, max_queue=1)
+    await controller.acquire()
+    waiting = await queued(controller)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire()
+    assert rejected.value.status_code == 503
+    assert controller.rejected == 1
+    waiting.cancel()
+
+
+async def test_a_client_over_its_queue_share_gets_a_429():
+    controller = AdmissionController(max_concurrency=1, max_queued_per_client=1)
+    await controller.acquire('greedy')
+    waiting = await queued(controller, 'greedy')
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire('greedy')
+    assert rejected.value.status_code == 429
+    # Other clients still get in the queue
+    other = await queued(controller, 'polite')
+    assert controller.queue_depth() == 2
+    waiting.cancel()
+    other.cancel()
+
+
+async def test_retry_after_follows_the_service_time_and_the_backlog():
+    controller = AdmissionController(max_concurrency=2, max_queue=1)
+    assert controller.retry_after() == 1
+
+    for _ in range(2):
+        controller.release(await controller.acquire() - 4)
+    # 4 seconds per analysis, one queued slot over 2 concurrent analyses
+    assert controller.retry_after() == 2
+
+    await controller.acquire()
+    await controller.acquire()
+    waiting = await queued(controller)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire()
+    assert rejected.value.retry_after == 4
+    waiting.cancel()
+
+
+async def test_requests_give_up_after_the_max_queue_time():
+    controller = AdmissionController(max_concurrency=1, max_queue_time=0.05)
+    acquired_at = await controller.acquire()
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire()
+    assert rejected.value.status_code == 503
+    assert controller.timed_out == 1
+    assert controller.queue_depth() == 0
+
+    # The slot is not lost to the request that gave up
+    controller.release(acquired_at)
+    assert controller.active == 0
+
+
+async def test_a_slot_handed_to_a_cancelled_request_passes_to_the_next_one():
+    controller = AdmissionController(max_concurrency=1)
+    acquired_at = await controller.acquire()
+    cancelled = await queued(controller)
+    next_in_line = await queued(controller)
+
+    # The slot goes to the first waiter, which is cancelled before it resumes
+    controller.release(acquired_at)
+    cancelled.cancel()
+    try:
+        acquired_at = await cancelled
+    except asyncio.CancelledError:
+        pass
+    else:
+        # Before Python 3.12, wait_for returns the result of a wait that finished as it was cancelled
+        controller.release(acquired_at)
+    await asyncio.wait_for(next_in_line, 1)
+
+    assert controller.active == 1
+    assert controller.queue_depth() == 0
+
+
+async def test_queue_depth_and_wait_time_are_exported_as_metrics():
+    admission._wait_times.append(0.5)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        response = await client.get('/metrics')
+    lines = response.text.splitlines()
+    assert f'admission_queue_depth {admission.queue_depth()}' in lines
+    assert f'admission_active {admission.active}' in lines
+    assert f'admission_average_wait_seconds {admission.average_wait()}' in lines
+    admission._wait_times.clear()
@@ -0,0 +1,23 @@
+import httpx
+import pytest
+
+from app import app
+from support import TEXT
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        yield client
+
+
+@pytest.mark.parametrize('path', ['/analyze', '/analyze/stream'])
+async def test_empty_or_unknown_techniques_are_rejected(client, path):
+    response = await client.post(path, json={'text': TEXT, 'techniques': []})
+    assert response.status_code == 422
+    assert response.json()['detail'] == 'At least one technique must be requested'
+
+    response = await client.post(path, json={'text': TEXT, 'techniques': ['no_such_technique']})
+    assert response.status_code == 422
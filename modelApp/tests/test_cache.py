@@ -0,0 +1,133 @@
+import time
+import asyncio
+
+import pytest
+
+from cache import AnalysisCache, LRUCache, content_key
+from singleflight import SingleFlight
+from support import TEXT
+
+pytestmark = pytest.mark.anyio
+
+
+def test_content_key_ignores_whitespace_and_unicode_form():
+    assert content_key('Café  au\nlait', 'v1') == content_key('Café au lait', 'v1')
+    assert content_key('text', 'v1') != content_key('text', 'v2')
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(max_size=2, ttl=10)
+    cache.set('a', '1', created_at=time.time() - 11)
+    assert cache.get('a') is None
+
+
+async def test_analysis_cache_persists_to_sqlite(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    await AnalysisCache(path=path).set('key', {'score': 1})
+    # A new process only has the disk tier
+    cache = AnalysisCache(path=path)
+    assert await cache.get('key') == {'score': 1}
+    assert await cache.get('other') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+async def test_singleflight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return 'done'
+
+    results = await asyncio.gather(*[flight.do('key', work) for _ in range(5)])
+    assert results == ['done'] * 5
+    assert runs == 1
+    assert flight.coalesced == 4
+    assert flight.in_flight() == 0
+
+
+async def test_singleflight_propagates_failures_to_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    results = await asyncio.gather(*[flight.do('key', fail) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.started == 1
+    assert flight.in_flight() == 0
+
+
+async def test_singleflight_serves_the_other_waiters_when_one_is_cancelled():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return 'done'
+
+    waiters = [asyncio.ensure_future(flight.do('key', work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == ['done', 'done']
+    assert flight.started == 1
+
+
+async def test_singleflight_cancels_work_once_every_waiter_is_gone():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiters = [asyncio.ensure_future(flight.do('key', work)) for _ in range(2)]
+    await started.wait()
+    waiters[0].cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()
+    waiters[1].cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flight.in_flight() == 0
+
+    async def again():
+        return 'fresh'
+
+    # A new caller starts new work instead of joining the cancelled task
+    assert await flight.do('key', again) == 'fresh'
+
+
+async def test_identical_requests_share_one_analysis(system):
+    results = await asyncio.gather(*[system.analyze_text(TEXT) for _ in range(3)])
+    calls = system.argument_agent.llm.calls
+    assert results[0] == results[1] == results[2]
+    assert system.inflight.coalesced == 2
+
+    # Served from the result cache afterwards, without calling the model
+    assert await system.analyze_text(TEXT) == results[0]
+    assert system.argument_agent.llm.calls == calls
@@ -0,0 +1,127 @@
+import pytest
+
+from app import ManipulationAnalysisAgent
+from support import TEXT, fake_model
+
+pytestmark = pytest.mark.anyio
+
+ARGUMENTS = {
+    'main_hypothesis': 'Taxes should be lowered for every family.',
+    'arguments': [
+        {'id': 'A1', 'statement': 'Experts say growth will follow within a year.'},
+        {'id': 'A2', 'statement': 'Everyone agrees that the current system is broken.'},
+        {'id': 'A3', 'statement': 'Either we act now or the economy collapses.'},
+    ],
+}
+
+
+def screening_model_answers(agent: ManipulationAnalysisAgent, monkeypatch, answer) -> None:
+    """Make the screening call parse to the given answer, or raise it when it is an exception"""
+    async def invoke_json(prompt, inputs, schema=dict):
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(agent, '_invoke_json', invoke_json)
+
+
+@pytest.fixture
+def cascade(system):
+    system.screening_agent = ManipulationAnalysisAgent(model='screening-model')
+    system.screening_agent.llm = fake_model('screening-model')
+    return system
+
+
+@pytest.fixture
+def escalated(cascade, monkeypatch) -> dict:
+    """The arguments the strong model was sent, by technique name"""
+    sent = {}
+    agent = cascade.manipulation_agent
+    analyze, analyze_group = agent.analyze, agent.analyze_group
+    names = {definition: name for name, definition in cascade.get_manipulation_tasks().items()}
+
+    async def analyze_one(definition, text, arguments):
+        sent[names[definition]] = arguments
+        return await analyze(definition, text, arguments)
+
+    async def analyze_several(group, text, arguments):
+        sent.update({name: arguments for name in group})
+        return await analyze_group(group, text, arguments)
+
+    monkeypatch.setattr(agent, 'analyze', analyze_one)
+    monkeypatch.setattr(agent, 'analyze_group', analyze_several)
+    return sent
+
+
+def two_techniques(system) -> dict:
+    return dict(list(system.get_manipulation_tasks().items())[:2])
+
+
+async def test_screen_returns_the_arguments_not_cleared(monkeypatch):
+    agent = ManipulationAnalysisAgent(model='screening-model')
+    screening_model_answers(agent, monkeypatch, {
+        'first': [{'argument_id': 'A1', 'verdict': 'no'}, {'argument_id': 'A2', 'verdict': 'Uncertain'}],
+        'second': [{'argument_id': 'A1', 'verdict': 'No'}, {'argument_id': 'A2', 'verdict': 'no'},
+                   {'argument_id': 'A3', 'verdict': 'no'}],
+        'third': 'no',
+    })
+    flagged = await agent.screen(
+        {'first': 'First definition', 'second': 'Second definition', 'third': 'Third definition', 'fourth': 'Fourth'},
+        TEXT, 'arguments', ['A1', 'A2', 'A3']
+    )
+    # Arguments the model did not answer for are not cleared
+    assert flagged == {'first': {'A2', 'A3'}, 'second': set(), 'third': None, 'fourth': None}
+
+
+async def test_screen_gives_no_answer_when_the_call_fails(monkeypatch):
+    agent = ManipulationAnalysisAgent(model='screening-model')
+    screening_model_answers(agent, monkeypatch, RuntimeError('quota exhausted'))
+    flagged = await agent.screen({'first': 'First definition'}, TEXT, 'arguments', ['A1'])
+    assert flagged == {'first': None}
+
+
+async def test_only_the_arguments_not_cleared_are_escalated(cascade, escalated, monkeypatch):
+    group = two_techniques(cascade)
+    cleared, flagged = group
+    screening_model_answers(cascade.screening_agent, monkeypatch, {
+        cleared: [{'argument_id': argument_id, 'verdict': 'no'} for argument_id in ('A1', 'A2', 'A3')],
+        flagged: [{'argument_id': 'A1', 'verdict': 'no'}, {'argument_id': 'A2', 'verdict': 'yes'}],
+    })
+
+    results = await cascade._analyze_manipulation_group(group, TEXT, ARGUMENTS)
+
+    assert results[cleared] == {'arguments': [], 'model': 'screening-model'}
+    assert results[flagged]['model'] == cascade.manipulation_agent.model
+    assert list(escalated) == [flagged]
+    assert 'Experts say growth' not in escalated[flagged]
+    assert 'Everyone agrees' in escalated[flagged] and 'Either we act now' in escalated[flagged]
+    assert (cascade.screened_techniques, cascade.escalated_techniques) == (2, 1)
+
+
+@pytest.mark.parametrize('answer', [
+    {'error': 'Failed to parse JSON response', 'raw_response': 'Sorry'},
+    RuntimeError('quota exhausted'),
+], ids=['unparseable', 'failed call'])
+async def test_everything_is_escalated_when_the_screening_is_unusable(cascade, escalated, monkeypatch, answer):
+    group = two_techniques(cascade)
+    screening_model_answers(cascade.screening_agent, monkeypatch, answer)
+
+    results = await cascade._analyze_manipulation_group(group, TEXT, ARGUMENTS)
+
+    assert set(escalated) == set(group)
+    for name in group:
+        assert results[name]['model'] == cascade.manipulation_agent.model
+        for argument in ARGUMENTS['arguments']:
+            assert argument['statement'] in escalated[name]
+
+
+async def test_the_analysis_records_the_model_behind_each_technique(cascade, escalated):
+    result = await cascade.analyze_text(TEXT)
+    assert result['not_evaluated_techniques'] == []
+    assert escalated
+    for name in cascade.resolve_techniques(None):
+        if name in escalated:
+            assert result['models'][name] == cascade.manipulation_agent.model
+        else:
+            assert result['models'][name] in ('screening-model', 'prefilter')
+    assert cascade.escalated_techniques == len(escalated)
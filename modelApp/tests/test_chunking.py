@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from deadline import Deadline
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_failed_chunk_cancels_the_other_chunks(system, monkeypatch):
+    system.chunk_size = 100
+    text = ' '.join(f'Sentence {i} of a long article about taxes and growth.' for i in range(30))
+    cancelled = []
+
+    async def analyze_chunk(chunk, deadline, techniques):
+        if chunk.startswith('Sentence 0 '):
+            raise TimeoutError('Argument analysis missed its deadline')
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(chunk)
+            raise
+
+    monkeypatch.setattr(system, '_analyze_raw_single', analyze_chunk)
+    with pytest.raises(TimeoutError, match='missed its deadline'):
+        await asyncio.wait_for(system._analyze_raw(text, Deadline()), 1)
+    assert cancelled
+
+
+def fail_argument_stage(system, monkeypatch, chunk_start: str, times: int) -> None:
+    """The argument stage of the chunk starting with chunk_start returns a parse error the first times calls"""
+    argument_stage = system._argument_stage
+    failures = []
+
+    async def failing_argument_stage(text):
+        if text.startswith(chunk_start) and len(failures) < times:
+            failures.append(text)
+            return {'error': 'Failed to parse JSON response', 'raw_response': 'Sorry'}
+        return await argument_stage(text)
+
+    monkeypatch.setattr(system, '_argument_stage', failing_argument_stage)
+
+
+def long_text(system) -> str:
+    """Chunks of two sentences, the fake model takes the first as thesis and the second as argument"""
+    system.chunk_size = 150
+    topics = ['taxes', 'schools', 'roads', 'hospitals', 'farms', 'pensions', 'trains', 'parks', 'prisons']
+    return ' '.join(f'Sentence {i} says {topic} need {i + 2} more years of funding.' for i, topic in enumerate(topics))
+
+
+async def test_failed_chunk_is_retried(system, monkeypatch):
+    text = long_text(system)
+    fail_argument_stage(system, monkeypatch, 'Sentence 2 ', times=1)
+    result = await system.analyze_text(text)
+    assert result['not_evaluated_techniques'] == []
+    assert any('Sentence 3 ' in argument['statement'] for argument in result['arguments'])
+
+
+async def test_chunk_failing_again_leaves_a_partial_uncached_analysis(system, monkeypatch):
+    text = long_text(system)
+    fail_argument_stage(system, monkeypatch, 'Sentence 2 ', times=2)
+    result = await system.analyze_text(text)
+    techniques = system.resolve_techniques(None)
+    assert result['not_evaluated_techniques'] == sorted(techniques)
+    assert not any('Sentence 3 ' in argument['statement'] for argument in result['arguments'])
+    assert await system.cache.get(system.result_key(text, techniques)) is None
+
+
+async def test_stream_of_a_long_text_replays_the_chunked_analysis(system, monkeypatch):
+    text = long_text(system)
+    chunked = []
+    analyze_chunked = system._analyze_raw_chunked
+
+    async def spy(*args):
+        chunked.append(args[0])
+        return await analyze_chunked(*args)
+
+    monkeypatch.setattr(system, '_analyze_raw_chunked', spy)
+    events = [event async for event in system.analyze_text_stream(text)]
+    techniques = system.resolve_techniques(None)
+    cached = await system.cache.get(system.result_key(text, techniques))
+    assert cached is not None
+    assert chunked == [text]
+    assert events == system._analysis_to_events(cached, techniques)
+    assert any('Sentence 3 ' in argument['statement'] for argument in events[0]['arguments'])
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from disconnect import ClientDisconnected, DisconnectWatcher, tracked_call
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRequest:
+    """The part of a Starlette request the watcher polls"""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+async def model_call(seconds: float) -> str:
+    await asyncio.sleep(seconds)
+    return 'response'
+
+
+async def test_the_result_is_returned_while_the_client_stays():
+    watcher = DisconnectWatcher(poll_interval=0.01)
+
+    async def work():
+        return await tracked_call(model_call(0.03))
+
+    assert await watcher.run(FakeRequest(), work) == 'response'
+    assert watcher.stats() == {'disconnects': 0, 'wasted_calls': 0, 'saved_calls': 0}
+
+
+async def test_a_disconnect_cancels_the_work_and_counts_the_calls():
+    watcher = DisconnectWatcher(poll_interval=0.01)
+    request = FakeRequest()
+    cancelled = asyncio.Event()
+
+    async def work():
+        await tracked_call(model_call(0))
+        request.disconnected = True
+        try:
+            await asyncio.gather(tracked_call(model_call(10)), tracked_call(model_call(10)))
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(ClientDisconnected):
+        await asyncio.wait_for(watcher.run(request, work), 1)
+    assert cancelled.is_set()
+    # The call answered before the disconnect was wasted, the two cut short were saved
+    assert watcher.stats() == {'disconnects': 1, 'wasted_calls': 1, 'saved_calls': 2}
+
+
+async def test_shared_work_survives_the_disconnect_of_one_of_its_clients():
+    watcher = DisconnectWatcher(poll_interval=0.01)
+    flight = SingleFlight()
+    leaving, staying = FakeRequest(), FakeRequest()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        return await tracked_call(model_call(0.1))
+
+    first = asyncio.ensure_future(watcher.run(leaving, lambda: flight.do('key', work)))
+    second = asyncio.ensure_future(watcher.run(staying, lambda: flight.do('key', work)))
+    await asyncio.sleep(0.02)
+    leaving.disconnected = True
+
+    with pytest.raises(ClientDisconnected):
+        await first
+    assert await asyncio.wait_for(second, 1) == 'response'
+    assert runs == 1
+    assert watcher.stats() == {'disconnects': 1, 'wasted_calls': 0, 'saved_calls': 0}
@@ -0,0 +1,83 @@
+import time
+import asyncio
+
+import pytest
+
+from documents import DocumentStore, plan_regions
+from support import TEXT
+
+pytestmark = pytest.mark.anyio
+
+
+def test_unchanged_paragraphs_keep_their_region():
+    prior = [{'paragraphs': ['First.', 'Second.'], 'raw': {'not_evaluated': []}}]
+    regions = plan_regions(['First.', 'Second.', 'Third.'], prior, max_chars=100)
+    assert regions[0] is prior[0]
+    assert regions[1] == {'paragraphs': ['Third.'], 'raw': None}
+
+
+def test_document_store_evicts_the_least_recently_analyzed():
+    store = DocumentStore(':memory:', max_documents=2)
+    for document_id in ('a', 'b', 'c'):
+        store.set(document_id, 'v1', [{'paragraphs': [document_id], 'raw': None}])
+        time.sleep(0.001)
+    assert store.get('a', 'v1') == []
+    assert store.get('b', 'v1') and store.get('c', 'v1')
+
+
+async def test_document_results_are_cached_apart_from_text_results(system):
+    document = await system.analyze_document('doc', TEXT)
+    techniques = system.resolve_techniques(None)
+    assert await system.cache.get(system.result_key(TEXT, techniques)) is None
+    assert await system.cache.get(system.document_result_key('doc', TEXT, techniques)) == document
+
+    # Analyses merged from regions of another size get other keys
+    key = system.document_result_key('doc', TEXT, techniques)
+    system.document_region_size = 10
+    assert system.document_result_key('doc', TEXT, techniques) != key
+
+
+async def test_failed_region_cancels_the_other_regions(system, monkeypatch):
+    system.document_region_size = 10
+    cancelled = []
+
+    async def complete_region(text, raw_analysis, techniques):
+        if text.startswith('Taxes'):
+            raise TimeoutError('Argument analysis missed its deadline')
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(text)
+            raise
+
+    monkeypatch.setattr(system, 'complete_raw', complete_region)
+    with pytest.raises(Exception, match='missed its deadline'):
+        await asyncio.wait_for(system.analyze_document('doc', TEXT.replace('. ', '.\n\n')), 1)
+    assert cancelled
+
+
+async def test_failed_region_is_not_cached_and_analyzed_again(system, monkeypatch):
+    system.document_region_size = 10
+    text = TEXT.replace('. ', '.\n\n')
+    argument_stage = system._argument_stage
+    failing = ['Experts']
+
+    async def failing_argument_stage(region_text):
+        if failing and region_text.startswith(failing[0]):
+            return {'error': 'Failed to parse JSON response', 'raw_response': 'Sorry'}
+        return await argument_stage(region_text)
+
+    monkeypatch.setattr(system, '_argument_stage', failing_argument_stage)
+    techniques = system.resolve_techniques(None)
+    key = system.document_result_key('doc', text, techniques)
+    result = await system.analyze_document('doc', text)
+    assert result['not_evaluated_techniques']
+    assert await system.cache.get(key) is None
+    regions = system.documents.get('doc', f"{system.prompts_version}:{','.join(techniques)}")
+    assert [region['raw'] is None for region in regions] == [False, True, False, False]
+
+    # The next update analyzes the failed region again, and is complete
+    failing.clear()
+    result = await system.analyze_document('doc', text)
+    assert result['not_evaluated_techniques'] == []
+    assert await system.cache.get(key) == result
@@ -0,0 +1,39 @@
+import pytest
+
+from backends import FakeChatModel
+from support import TEXT
+
+pytestmark = pytest.mark.anyio
+
+
+def answer_groups_with(monkeypatch, change) -> None:
+    """Pass the responses of the fake model to grouped technique prompts through change"""
+    respond = FakeChatModel._respond
+
+    def respond_changed(self, prompt, rng):
+        response = respond(self, prompt, rng)
+        if 'technique name listed above' in prompt and 'Screen the text' not in prompt:
+            response = change(response)
+        return response
+
+    monkeypatch.setattr(FakeChatModel, '_respond', respond_changed)
+
+
+async def test_extra_keys_of_a_grouped_response_are_dropped(system, monkeypatch):
+    system.technique_group_size = 10
+    answer_groups_with(monkeypatch, lambda response: {
+        **response, 'main_thesis': 'Taxes should be lowered', 'notes': {'arguments': []}
+    })
+    result = await system.analyze_text(TEXT)
+    assert result['not_evaluated_techniques'] == []
+    assert set(result['arguments'][0]['manipulations']) == set(system.resolve_techniques(None))
+
+
+async def test_technique_missing_from_a_grouped_response_is_not_evaluated(system, monkeypatch):
+    system.technique_group_size = 10
+    missing = system.resolve_techniques(None)[0]
+    answer_groups_with(monkeypatch, lambda response: {
+        name: result for name, result in response.items() if name != missing
+    })
+    result = await system.analyze_text(TEXT)
+    assert result['not_evaluated_techniques'] == [missing]
@@ -0,0 +1,116 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cache import AnalysisCache
+from ingest import FetchError, URLFetcher, extract_main_text, parse_networks
+
+pytestmark = pytest.mark.anyio
+
+ARTICLE = (
+    '<html><body><nav><a href="/">Home</a> <a href="/world">World</a></nav>'
+    '<article><h1>Taxes</h1><p>Taxes should be lowered for every family in the country.</p>'
+    '<p>Experts say growth will follow within a year of the cut.</p></article>'
+    '<footer>Subscribe to our newsletter for more articles like this one.</footer></body></html>'
+)
+
+
+class Handler(BaseHTTPRequestHandler):
+    routes = {
+        '/redirect': '/article',
+        '/metadata': 'http://169.254.169.254/latest/meta-data/',
+        '/loop': '/loop',
+    }
+
+    def do_GET(self):
+        if self.path in self.routes:
+            self.send_response(302)
+            self.send_header('Location', self.routes[self.path])
+            self.end_headers()
+            return
+        if self.path == '/article' and self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        content_type, body = {
+            '/article': ('text/html; charset=utf-8', ARTICLE.encode('utf-8')),
+            '/image': ('image/png', b'\x89PNG'),
+            '/large': ('text/html', b'<p>' + b'word ' * 1000 + b'</p>'),
+        }[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if self.path == '/article':
+            self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    """Local HTTP server, its base URL"""
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    thread.join()
+
+
+@pytest.fixture
+async def fetcher():
+    # The local server is allowed, other private addresses are not, and pages are always revalidated
+    fetcher = URLFetcher(AnalysisCache(), fresh_seconds=0, max_bytes=1000, allowed_networks=parse_networks('127.0.0.1'))
+    yield fetcher
+    await fetcher.close()
+
+
+def test_extract_main_text_drops_page_furniture():
+    assert extract_main_text(ARTICLE) == (
+        'Taxes\n\nTaxes should be lowered for every family in the country.\n\n'
+        'Experts say growth will follow within a year of the cut.'
+    )
+
+
+async def test_unchanged_page_is_revalidated_with_a_conditional_get(server, fetcher):
+    page = await fetcher.get_text(f'{server}/article')
+    assert page['etag'] == '"v1"'
+    assert (await fetcher.get_text(f'{server}/article'))['text'] == page['text']
+    assert fetcher.fetches == 2
+    assert fetcher.not_modified == 1
+
+
+async def test_redirects_are_followed(server, fetcher):
+    page = await fetcher.get_text(f'{server}/redirect')
+    assert page['url'] == f'{server}/article'
+
+
+@pytest.mark.parametrize('path, status_code', [('/image', 415), ('/large', 413), ('/loop', 502)])
+async def test_pages_that_are_not_articles_are_rejected(server, fetcher, path, status_code):
+    with pytest.raises(FetchError) as error:
+        await fetcher.get_text(f'{server}{path}')
+    assert error.value.status_code == status_code
+
+
+async def test_redirect_to_a_private_address_is_blocked(server, fetcher):
+    with pytest.raises(FetchError, match='public address') as error:
+        await fetcher.get_text(f'{server}/metadata')
+    assert error.value.status_code == 422
+    assert fetcher.blocked == 1
+
+
+@pytest.mark.parametrize('url', [
+    'http://169.254.169.254/latest/meta-data/', 'http://localhost/', 'http://10.0.0.1/', 'http://[::1]/',
+])
+async def test_private_addresses_are_blocked(url):
+    fetcher = URLFetcher(AnalysisCache())
+    try:
+        with pytest.raises(FetchError, match='public address'):
+            await fetcher.get_text(url)
+    finally:
+        await fetcher.close()
+
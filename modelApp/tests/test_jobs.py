@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobManager, JobStore
+from support import TEXT
+
+pytestmark = pytest.mark.anyio
+
+
+async def finished(manager: JobManager, job_id: str) -> dict:
+    for _ in range(200):
+        job = await manager.get(job_id)
+        if job['status'] not in (QUEUED, RUNNING):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f'job {job_id} still {job["status"]}')
+
+
+@pytest.fixture
+async def manager(system):
+    manager = JobManager(system, JobStore(':memory:'), workers=2, max_attempts=3)
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+def fail_first_calls(monkeypatch, target, name: str, failures: int, fail) -> None:
+    """The first failures calls of target.name are answered by fail instead"""
+    original = getattr(target, name)
+    calls = []
+
+    async def failing(*args, **kwargs):
+        calls.append(args)
+        if len(calls) <= failures:
+            return await fail(*args, **kwargs)
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(target, name, failing)
+
+
+async def test_submitted_job_is_analyzed(manager):
+    job_id, = await manager.submit([TEXT])
+    job = await finished(manager, job_id)
+    assert job['status'] == DONE
+    assert job['attempts'] == 1
+    assert job['result']['not_evaluated_techniques'] == []
+    assert 'partial' not in job
+    assert await manager.get('unknown') is None
+
+
+async def test_queued_job_is_cancelled(system):
+    manager = JobManager(system, JobStore(':memory:'), workers=0)
+    await manager.start()
+    job_id, = await manager.submit([TEXT])
+    assert (await manager.cancel(job_id))['status'] == CANCELLED
+    await manager.stop()
+
+
+async def test_failed_argument_stage_is_retried(system, manager, monkeypatch):
+    async def parse_error(text):
+        return {'error': 'Failed to parse JSON response', 'raw_response': 'Sorry'}
+
+    fail_first_calls(monkeypatch, system, '_argument_stage', 1, parse_error)
+    job = await finished(manager, (await manager.submit([TEXT]))[0])
+    assert job['status'] == DONE
+    assert job['attempts'] == 2
+
+
+async def test_raising_attempt_is_retried_until_max_attempts(system, manager, monkeypatch):
+    async def timeout(*args):
+        raise TimeoutError('Argument analysis missed its deadline')
+
+    fail_first_calls(monkeypatch, system, 'complete_raw', 2, timeout)
+    job = await finished(manager, (await manager.submit([TEXT]))[0])
+    assert (job['status'], job['attempts']) == (DONE, 3)
+
+    fail_first_calls(monkeypatch, system, 'complete_raw', 3, timeout)
+    job = await finished(manager, (await manager.submit(['Another text to analyze. It is long enough.']))[0])
+    assert (job['status'], job['attempts']) == (FAILED, 3)
+    assert 'missed its deadline' in job['error']
+
+
+async def test_unfinished_jobs_are_resumed_on_restart(system):
+    store = JobStore(':memory:')
+    queued, running = store.create([TEXT, TEXT + ' Again.'])
+    store.update(running, status=RUNNING)
+
+    manager = JobManager(system, store, workers=2)
+    await manager.start()
+    try:
+        assert (await finished(manager, queued))['status'] == DONE
+        assert (await finished(manager, running))['status'] == DONE
+    finally:
+        await manager.stop()
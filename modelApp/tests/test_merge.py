@@ -0,0 +1,62 @@
+from alignment import ArgumentIndex
+from chunking import merge_raw_analyses
+
+ARGUMENTS = [
+    {'id': 'A1', 'statement': 'Experts say growth will follow within a year.'},
+    {'id': 'A2', 'statement': 'Either we act now or the economy collapses.'},
+]
+FINDING = {'instance': 'Experts say', 'explanation': 'Unnamed experts.'}
+
+
+def finding_for(argument_id, argument_text: str) -> dict:
+    return {
+        'argument_id': argument_id, 'argument_text': argument_text,
+        'contains_manipulation': True, 'manipulations': [FINDING],
+    }
+
+
+def raw_analysis(*findings: dict) -> dict:
+    return {
+        'argument_analysis': {'main_hypothesis': 'Taxes should be lowered.', 'arguments': [dict(a) for a in ARGUMENTS]},
+        'not_evaluated': [],
+        'unspecified_authority_fallacy': {'arguments': list(findings), 'model': 'fake'},
+    }
+
+
+def test_argument_index_matches_by_id_statement_and_fuzzy_statement():
+    index = ArgumentIndex(ARGUMENTS)
+    assert index.find('A2', '')['id'] == 'A2'
+    assert index.find(None, 'EXPERTS say growth will follow, within a year')['id'] == 'A1'
+    assert index.find('A9', 'Experts say growth follows within a year.')['id'] == 'A1'
+    assert index.find('A9', 'Something else entirely') is None
+    assert ArgumentIndex(ARGUMENTS, fuzzy_cutoff=None).find(None, 'Experts say growth follows within a year.') is None
+
+
+def test_argument_index_ignores_ids_and_texts_that_are_not_strings():
+    index = ArgumentIndex(ARGUMENTS)
+    assert index.find(['A1'], 'Either we act now or the economy collapses.')['id'] == 'A2'
+    assert index.find({'id': 'A1'}, ['text']) is None
+
+
+def test_findings_are_merged_into_their_arguments_or_reported_unmatched(system):
+    analysis = system.raw_data_to_api_format(raw_analysis(
+        finding_for('A1', ''),
+        finding_for(['A2'], 'either we act now, or the economy collapses'),
+        finding_for({'id': 1}, 'Nothing like any argument of the text'),
+        finding_for(None, ['not', 'a', 'string']),
+    ))
+    manipulations = [argument['manipulations']['unspecified_authority_fallacy'] for argument in analysis['arguments']]
+    assert manipulations == [[FINDING], [FINDING]]
+    assert [finding['argument_text'] for finding in analysis['unmatched_findings']] == [
+        'Nothing like any argument of the text', ''
+    ]
+
+
+def test_chunk_merge_ignores_ids_that_are_not_strings():
+    merged = merge_raw_analyses([
+        raw_analysis(finding_for('A1', ''), finding_for(['A2'], 'Either we act now or the economy collapses.')),
+        raw_analysis(finding_for({'id': 'A1'}, 'Experts say growth will follow within a year.')),
+    ])
+    assert [argument['id'] for argument in merged['argument_analysis']['arguments']] == ['A1', 'A2']
+    findings = merged['unspecified_authority_fallacy']['arguments']
+    assert [finding.get('argument_id') for finding in findings] == ['A1', None, None]
@@ -0,0 +1,49 @@
+import pytest
+
+from support import TEXT
+
+pytestmark = pytest.mark.anyio
+
+
+def fail_one_technique(system, monkeypatch) -> list:
+    """Make the first technique sent to the model come back as unparseable, returns its name"""
+    failed = []
+    agent = system.manipulation_agent
+    analyze, analyze_group = agent.analyze, agent.analyze_group
+
+    def with_failure(results: dict) -> dict:
+        if not failed:
+            failed.append(next(iter(results)))
+        return {
+            name: {'error': 'Failed to parse JSON response', 'raw_response': 'Sorry'} if name in failed else result
+            for name, result in results.items()
+        }
+
+    async def analyze_one(definition, text, arguments):
+        name = next(name for name, known in system.get_manipulation_tasks().items() if known == definition)
+        return with_failure({name: await analyze(definition, text, arguments)})[name]
+
+    async def analyze_several(group, text, arguments):
+        return with_failure(await analyze_group(group, text, arguments))
+
+    monkeypatch.setattr(agent, 'analyze', analyze_one)
+    monkeypatch.setattr(agent, 'analyze_group', analyze_several)
+    return failed
+
+
+async def test_unparseable_technique_is_not_evaluated_and_not_cached(system, monkeypatch):
+    failed = fail_one_technique(system, monkeypatch)
+    result = await system.analyze_text(TEXT)
+    assert failed
+    assert result['not_evaluated_techniques'] == failed
+    assert all(argument['manipulations'][failed[0]] == [] for argument in result['arguments'])
+    techniques = system.resolve_techniques(None)
+    assert await system.cache.get(system.result_key(TEXT, techniques)) is None
+
+
+async def test_streamed_unparseable_technique_is_not_evaluated(system, monkeypatch):
+    failed = fail_one_technique(system, monkeypatch)
+    events = [event async for event in system.analyze_text_stream(TEXT)]
+    assert failed
+    assert failed[0] not in [event['technique'] for event in events if event['event'] == 'technique']
+    assert events[-1]['not_evaluated_techniques'] == failed
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from parsing import TECHNIQUE_SCHEMA, extract_json, parse_json, repair_json, validate
+
+
+def test_extract_json_from_fenced_response_with_preamble():
+    response = 'Here is the analysis:\n```json\n{"a": [1, 2]}\n```\nHope it helps {"not": "this"}'
+    assert extract_json(response) == '{"a": [1, 2]}'
+
+
+def test_extract_json_keeps_braces_inside_strings():
+    assert extract_json('Sure: {"a": "}{"} trailing') == '{"a": "}{"}'
+
+
+def test_repair_trailing_commas_and_python_literals():
+    value = json.loads(repair_json('{"a": [1, 2,], "b": True, "c": None,}'))
+    assert value == {'a': [1, 2], 'b': True, 'c': None}
+
+
+def test_repair_truncated_response():
+    value, repaired = parse_json('```json\n{"arguments": [{"argument_id": "A1", "manipulations": [{"instance": "Experts s')
+    assert repaired
+    assert value['arguments'][0]['argument_id'] == 'A1'
+
+
+def test_truncated_value_is_cut_back_to_the_last_complete_one():
+    value, _ = parse_json('{"arguments": [{"id": "A1"}, {"id": "A2", "statement": tru')
+    assert value['arguments'][0] == {'id': 'A1'}
+
+
+def test_unparseable_response_raises():
+    with pytest.raises(ValueError):
+        parse_json('Sorry, I cannot help with that.')
+
+
+def test_validate_reports_the_first_mismatch():
+    assert validate({'arguments': [{'manipulations': []}]}, TECHNIQUE_SCHEMA) is None
+    # manipulations is optional, its items are not
+    assert validate({'arguments': [{}]}, TECHNIQUE_SCHEMA) is None
+    problem = validate({'arguments': [{'manipulations': [{'instance': 'x'}]}]}, TECHNIQUE_SCHEMA)
+    assert problem == '$.arguments[0].manipulations[0].explanation is missing'
+    assert validate({'arguments': {}}, TECHNIQUE_SCHEMA) == '$.arguments should be a list'
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from support import TEXT
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def pipelined(system):
+    system.pipelined = True
+    return system
+
+
+def count_span_calls(system, monkeypatch) -> list:
+    """Record the techniques sent to the model at sentence level"""
+    calls = []
+    analyze_spans = system._analyze_spans
+
+    async def counted(name, definition, numbered_sentences):
+        calls.append(name)
+        return await analyze_spans(name, definition, numbered_sentences)
+
+    monkeypatch.setattr(system, '_analyze_spans', counted)
+    return calls
+
+
+def fail_argument_stage(system, monkeypatch, delay: float) -> None:
+    async def failing_argument_stage(text):
+        await asyncio.sleep(delay)
+        return {'error': 'Failed to parse JSON response', 'raw_response': 'Sorry'}
+
+    monkeypatch.setattr(system, '_argument_stage', failing_argument_stage)
+
+
+async def test_pipelined_analysis_aligns_the_findings_to_the_arguments(pipelined):
+    result = await pipelined.analyze_text(TEXT)
+    assert result['not_evaluated_techniques'] == []
+    assert result['arguments']
+    assert set(result['models'].values()) <= {pipelined.manipulation_agent.model, 'prefilter'}
+
+
+@pytest.mark.parametrize('delay', [0, 0.05], ids=['before the spans', 'after the spans'])
+async def test_failed_argument_stage_leaves_every_technique_not_evaluated(pipelined, monkeypatch, delay):
+    span_calls = count_span_calls(pipelined, monkeypatch)
+    fail_argument_stage(pipelined, monkeypatch, delay)
+
+    raw = await pipelined._analyze_raw(TEXT)
+    techniques = pipelined.resolve_techniques(None)
+    assert raw == {'argument_analysis': raw['argument_analysis'], 'not_evaluated': techniques}
+    assert 'error' in raw['argument_analysis']
+    if delay:
+        assert span_calls
+
+    with pytest.raises(Exception, match='Argument analysis failed'):
+        await pipelined.analyze_text(TEXT)
+    assert await pipelined.cache.get(pipelined.result_key(TEXT, techniques)) is None
+
+
+async def test_stream_replays_the_pipelined_analysis(pipelined, monkeypatch):
+    span_calls = count_span_calls(pipelined, monkeypatch)
+    events = [event async for event in pipelined.analyze_text_stream(TEXT)]
+    assert span_calls
+    assert events[0]['event'] == 'arguments'
+    assert events[-1] == {'event': 'score', 'score': events[-1]['score'], 'not_evaluated_techniques': []}
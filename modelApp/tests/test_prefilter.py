@@ -0,0 +1,57 @@
+import pytest
+
+from prefilter import PreFilter, LexicalScreener, TECHNIQUE_CUES
+from techniques import TECHNIQUES
+
+
+def definition_examples(definition: str) -> list:
+    """The quoted examples of a technique definition"""
+    lines = definition.split('Examples:')[1].split('Counter:')[0].strip().splitlines()
+    return [line[line.index("'") + 1:line.rindex("'")] for line in (line.strip() for line in lines)]
+
+
+@pytest.mark.parametrize('name', TECHNIQUES)
+def test_every_definition_example_is_worth_calling(name):
+    screener = LexicalScreener()
+    examples = definition_examples(TECHNIQUES[name])
+    assert len(examples) == 2
+    for example in examples:
+        assert screener.worth_calling(name, example), example
+
+
+def test_lexical_screener_needs_threshold_distinct_cues():
+    screener = LexicalScreener(threshold=2)
+    assert not screener.worth_calling('ad_populum', 'Everyone agrees. Everyone!')
+    assert screener.worth_calling('ad_populum', 'Everyone agrees, most people say so.')
+    # Techniques with no cues are always called
+    assert 'hasty_generalization' not in TECHNIQUE_CUES
+    assert screener.worth_calling('hasty_generalization', 'It snowed.')
+
+
+class Screener:
+    def worth_calling(self, technique: str, text: str) -> bool:
+        return technique in text
+
+
+def test_screen_splits_techniques_and_counts_skips():
+    prefilter = PreFilter(Screener(), 'test')
+    assert prefilter.screen('about a b', ['a', 'b', 'c']) == (['a', 'b'], ['c'])
+    assert prefilter.screen('about a', ['a', 'c']) == (['a'], ['c'])
+    assert prefilter.stats() == {
+        'a': {'screened': 2, 'skipped': 0, 'skip_rate': 0.0},
+        'b': {'screened': 1, 'skipped': 0, 'skip_rate': 0.0},
+        'c': {'screened': 2, 'skipped': 2, 'skip_rate': 1.0},
+    }
+
+
+def test_no_screener_calls_every_technique():
+    prefilter = PreFilter()
+    assert prefilter.screen('text', ['a', 'b']) == (['a', 'b'], [])
+    assert prefilter.stats() is None
+
+
+def test_lexical_prefilter_spec_changes_with_the_cues(monkeypatch):
+    monkeypatch.setenv('PREFILTER', 'lexical')
+    spec = PreFilter.from_env().spec
+    monkeypatch.setenv('PREFILTER_THRESHOLD', '2')
+    assert PreFilter.from_env().spec != spec
@@ -0,0 +1,86 @@
+import httpx
+import pytest
+
+import app as service
+from app import TextAnalysisSystem
+from prompting import PromptBuilder, TokenBudget, TokenBudgetExceeded, token_budget
+from support import TEXT
+
+pytestmark = pytest.mark.anyio
+
+ARGUMENTS = {
+    'main_hypothesis': 'Taxes should be lowered for every family.',
+    'arguments': [
+        {'id': 'A1', 'statement': 'Experts say growth will follow   within a year.'},
+        {'id': 'A2', 'statement': 'Either we act now or the economy collapses.'},
+    ],
+}
+
+
+def test_budget_refuses_a_prompt_that_does_not_fit():
+    budget = TokenBudget(100)
+    budget.charge(60)
+    with pytest.raises(TokenBudgetExceeded, match='prompt of 50 tokens exceeds the token budget, 40 of 100 left'):
+        budget.charge(50)
+    budget.charge(40)
+    assert budget.used == 100
+
+
+def test_nested_blocks_share_the_outer_budget():
+    with token_budget(0) as unlimited:
+        assert unlimited is None
+    with token_budget(100) as outer:
+        with token_budget(50) as inner:
+            assert inner is outer
+
+
+def test_compact_prompt_inputs():
+    builder = PromptBuilder()
+    definition = '\n    - Name: what it is.\n            Examples: \'one\'\n            Counter: ask why'
+    assert builder.definition(definition) == "- Name: what it is.\nExamples: 'one'"
+    assert builder.encode_arguments(ARGUMENTS) == (
+        'Thesis: Taxes should be lowered for every family.\n'
+        'A1: Experts say growth will follow within a year.\n'
+        'A2: Either we act now or the economy collapses.'
+    )
+    assert PromptBuilder(arguments='full').encode_arguments(ARGUMENTS) == str(ARGUMENTS)
+
+
+def test_relevant_context_keeps_the_sentences_of_the_arguments():
+    builder = PromptBuilder(context='relevant', context_window=0)
+    text = 'Taxes should be lowered for every family. The weather was nice. Either we act now or the economy collapses.'
+    assert builder.relevant_context(text, {**ARGUMENTS, 'arguments': ARGUMENTS['arguments'][1:]}) == (
+        'Taxes should be lowered for every family. [...] Either we act now or the economy collapses.'
+    )
+
+
+async def argument_tokens(text: str) -> int:
+    """Tokens the argument stage of a text is charged"""
+    with token_budget(10 ** 9) as budget:
+        await TextAnalysisSystem()._argument_stage(text)
+    return budget.used
+
+
+async def test_techniques_over_the_budget_are_not_evaluated(system):
+    system.token_budget = await argument_tokens(TEXT) + 1
+    result = await system.analyze_text(TEXT)
+    assert result['not_evaluated_techniques'] == system.resolve_techniques(None)
+
+
+async def test_argument_stage_over_the_budget_is_a_413(monkeypatch):
+    monkeypatch.setattr(service.analysis_system, 'token_budget', 10)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app), base_url='http://test') as client:
+        response = await client.post('/analyze', json={'text': TEXT})
+    assert response.status_code == 413
+    assert 'exceeds the token budget' in response.json()['detail']
+
+
+async def test_each_document_region_has_its_own_budget(system):
+    system.document_region_size = 10
+    text = TEXT.replace('. ', '.\n\n')
+    regions = text.split('\n\n')
+    largest = max([await argument_tokens(region) for region in regions])
+    # Enough for the argument stage of any region, not for all of them
+    system.token_budget = largest + 1
+    result = await system.analyze_document('doc', text)
+    assert len(result['arguments']) >= len(regions)
@@ -0,0 +1,89 @@
+import time
+import asyncio
+
+import pytest
+
+from ratelimit import AdaptiveConcurrency, ModelRateLimiter
+from support import fake_model
+
+pytestmark = pytest.mark.anyio
+
+
+def limiter(max_concurrency: int = 8) -> ModelRateLimiter:
+    # Buckets large enough not to pace the calls, retried at once
+    return ModelRateLimiter(
+        'fake', requests_per_minute=600_000, tokens_per_minute=10 ** 9,
+        max_concurrency=max_concurrency, max_retries=10, backoff=0.001
+    )
+
+
+async def run_calls(rate_limiter: ModelRateLimiter, llm, calls: int, concurrency: int = 16) -> list:
+    pending = iter(range(calls))
+    results = []
+
+    async def worker():
+        for i in pending:
+            results.append(await rate_limiter.call(lambda i=i: llm.ainvoke(f'call {i}')))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def test_quota_errors_back_off_then_recover():
+    rate_limiter = limiter(max_concurrency=8)
+    throttling = fake_model(throttle_rate=0.3)
+
+    results = await run_calls(rate_limiter, throttling, 60)
+    assert len(results) == 60
+    assert rate_limiter.throttled > 0
+    assert rate_limiter.retries >= rate_limiter.throttled
+    assert rate_limiter.concurrency.limit < 8
+
+    # Once the quota errors stop, the limit grows back to the configured maximum and no further
+    await run_calls(rate_limiter, fake_model(), 300)
+    assert rate_limiter.concurrency.limit == 8
+
+
+async def test_concurrent_quota_errors_cut_the_limit_once():
+    concurrency = AdaptiveConcurrency(initial=16, maximum=16)
+    started_at = time.monotonic()
+    for _ in range(16):
+        await concurrency.acquire()
+    # Every call in flight when the quota ran out is rejected
+    for _ in range(16):
+        await concurrency.release(started_at, throttled=True)
+    assert concurrency.limit == 8
+    assert concurrency.decreases == 1
+
+
+async def test_latency_noise_does_not_shrink_the_limit():
+    rate_limiter = limiter(max_concurrency=16)
+    await run_calls(rate_limiter, fake_model(latency='lognormal:0.05,0.5'), 300)
+    assert rate_limiter.throttled == 0
+    assert rate_limiter.concurrency.decreases == 0
+    assert rate_limiter.concurrency.limit == 16
+
+
+async def test_sustained_latency_rise_shrinks_the_limit():
+    concurrency = AdaptiveConcurrency(initial=16, maximum=16, latency_window=10)
+    for latency in [0.1] * 20 + [0.5] * 20:
+        await concurrency.acquire()
+        await concurrency.release(time.monotonic(), latency=latency, kind='technique:0')
+    assert concurrency.decreases == 1
+    assert concurrency.limit == 8
+
+
+async def test_a_single_slow_window_is_not_congestion():
+    concurrency = AdaptiveConcurrency(initial=16, maximum=16, latency_window=10)
+    for latency in [0.1] * 20 + [0.5] * 10 + [0.1] * 10:
+        await concurrency.acquire()
+        await concurrency.release(time.monotonic(), latency=latency, kind='technique:0')
+    assert concurrency.decreases == 0
+
+
+async def test_slow_calls_of_another_kind_are_not_congestion():
+    concurrency = AdaptiveConcurrency(initial=16, maximum=16, latency_window=10)
+    for latency, kind in [(0.1, 'technique:0')] * 20 + [(2.0, 'argument:1')] * 20:
+        await concurrency.acquire()
+        await concurrency.release(time.monotonic(), latency=latency, kind=kind)
+    assert concurrency.decreases == 0
@@ -0,0 +1,66 @@
+import hashlib
+
+from simhash import BITS, NearDuplicateIndex, hamming_distance, simhash
+from support import TEXT
+from techniques import TECHNIQUES
+
+
+def column_majority(hashes: list) -> int:
+    """The fingerprint from its definition, a bit is set when most hashes have it set"""
+    return sum(1 << bit for bit in range(BITS) if sum(h >> bit & 1 for h in hashes) * 2 > len(hashes))
+
+
+def test_simhash_sets_the_bits_most_shingles_have():
+    words = TEXT.lower().replace('.', '').replace(',', '').split()
+    shingles = [' '.join(words[i:i + 3]) for i in range(len(words) - 2)]
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingles]
+    assert simhash(TEXT) == column_majority(hashes)
+    assert simhash('') == simhash('   ')
+
+
+def test_small_edits_keep_the_fingerprint_close():
+    article = ' '.join(f'Paragraph {i} argues that {TEXT}' for i in range(10))
+    edited = article + ' Subscribe to our newsletter.'
+    assert hamming_distance(simhash(article), simhash(edited)) <= 3
+
+    index = NearDuplicateIndex(max_distance=3)
+    index.add(simhash(article), 'key', 'scope')
+    assert index.find(simhash(edited), 'scope') == 'key'
+    assert index.find(simhash(edited), 'other scope') is None
+
+
+HEADERS = [
+    'Home | World | Politics | Sign in | Subscribe for unlimited access',
+    'BREAKING NEWS Menu Search Log in Newsletter Live updates',
+    'From our wire service, updated 2 hours ago, 5 min read',
+]
+FOOTERS = [
+    'Copyright 2024 The Daily Planet. All rights reserved. Privacy policy.',
+    'Reporting by staff writers; editing by the news desk. Read more',
+    'Sign up for our morning briefing. Follow us. Advertise with us.',
+]
+
+
+def wire_copy(story: str, header: int, footer: int, edit: int) -> str:
+    """The story as published by another site: its own header and footer, and 3 words edited"""
+    words = story.split()
+    for position in (edit * 37 + 11, edit * 91 + 200, edit * 53 + 400):
+        words[position % len(words)] = 'changed'
+    return f"{HEADERS[header]}\n\n{' '.join(words)}\n\n{FOOTERS[footer]}"
+
+
+def test_wire_copies_of_a_story_are_found_and_other_stories_are_not():
+    story = ' '.join(' '.join(TECHNIQUES.values()).split())
+    index = NearDuplicateIndex()
+    index.add(simhash(wire_copy(story, 0, 0, 0)), 'story')
+
+    copies = [
+        wire_copy(story, header, footer, edit)
+        for header in range(3) for footer in range(3) for edit in range(1, 4)
+    ]
+    found = [index.find(simhash(copy)) for copy in copies]
+    assert found.count('story') >= 25
+
+    # Stories on the same subject, with the boilerplate of the site
+    for definition in TECHNIQUES.values():
+        assert index.find(simhash(f'{HEADERS[0]}\n\n{definition}\n\n{FOOTERS[0]}')) is None
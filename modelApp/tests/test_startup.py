@@ -0,0 +1,76 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+import app as service
+from startup import Startup
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def startup(monkeypatch) -> Startup:
+    """A service startup that has not warmed up yet"""
+    startup = Startup(time.perf_counter())
+    startup.imported()
+    monkeypatch.setattr(service, 'startup', startup)
+    return startup
+
+
+async def ready_status() -> int:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app), base_url='http://test') as client:
+        return (await client.get('/ready')).status_code
+
+
+async def test_ready_once_every_warm_up_step_completed(startup):
+    warm = asyncio.Event()
+
+    async def build_clients():
+        await warm.wait()
+
+    startup.start([('clients', build_clients), ('prompts', lambda: asyncio.sleep(0))])
+    assert await ready_status() == 503
+
+    warm.set()
+    await startup._task
+    assert await ready_status() == 200
+    assert list(startup.stats()['steps']) == ['clients', 'prompts']
+    assert startup.stats()['ready_seconds'] >= startup.stats()['import_seconds']
+
+
+async def test_a_failed_warm_up_step_leaves_the_service_unready(startup):
+    async def build_clients():
+        raise RuntimeError('missing API key')
+
+    later_steps = []
+
+    async def render_prompts():
+        later_steps.append('prompts')
+
+    startup.start([('clients', build_clients), ('prompts', render_prompts)])
+    await startup._task
+
+    assert await ready_status() == 503
+    assert startup.stats()['error'] == 'clients: missing API key'
+    assert later_steps == []
+
+
+async def test_unready_again_while_shutting_down(startup):
+    startup.start([])
+    await startup._task
+    assert await ready_status() == 200
+
+    await startup.stop()
+    assert await ready_status() == 503
+    assert startup.stats()['stopping']
+
+
+async def test_shutdown_cancels_a_warm_up_still_running(startup):
+    startup.start([('clients', lambda: asyncio.sleep(10))])
+    await asyncio.sleep(0)
+    await startup.stop()
+    with pytest.raises(asyncio.CancelledError):
+        await startup._task
+    assert not startup.is_ready()
@@ -0,0 +1,56 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+from logger import get_logger
+
+log = get_logger()
+
+# OpenTelemetry is optional, spans are no-ops unless it is installed and TRACING is enabled
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+_tracer = None
+
+
+def setup_tracing() -> None:
+    """
+    Enable tracing when TRACING is set. Spans are exported to the OTLP collector of
+    OTEL_EXPORTER_OTLP_ENDPOINT when set, otherwise appended as JSON to TRACING_FILE
+    (default traces.jsonl).
+    """
+    global _tracer
+    if os.getenv('TRACING', 'false').lower() not in ('1', 'true', 'yes'):
+        return
+    if trace is None:
+        log.error('TRACING is enabled but opentelemetry is not installed')
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT'):
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    else:
+        exporter = ConsoleSpanExporter(
+            out=open(os.getenv('TRACING_FILE', 'traces.jsonl'), 'a'),
+            formatter=lambda span: span.to_json(indent=None) + '\n'
+        )
+    provider = TracerProvider(resource=Resource.create({'service.name': 'model-service'}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer('modelApp')
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """Open a tracing span around a block, a no-op when tracing is disabled."""
+    if _tracer is None:
+        yield
+        return
+    with _tracer.start_as_current_span(name, attributes={key: value for key, value in attributes.items() if value}):
+        yield